@@ -0,0 +1,23 @@
+"""Convert PostGIS tables to OpenStreetMap elements: .osm / .osm.pbf files (see cli.py,
+or python -m postgis_to_osm), or a stream of Node, Way and Relation records (elements())."""
+
+from . import osm_elements
+from .run_context import DatabaseConnectionError
+
+# Records yielded by elements() (see osm_elements.py)
+Node = osm_elements.Node
+Way = osm_elements.Way
+Relation = osm_elements.Relation
+
+__all__ = ['Node', 'Way', 'Relation', 'DatabaseConnectionError', 'elements']
+
+def elements(connection, table, osm_config=None, config=None):
+    """Convert a table and yield its elements instead of writing a file: Node, Way and
+    Relation records (namedtuples), nodes first, then ways, then relations.
+    connection: an open psycopg2 connection to the database of the table, left open.
+    table: 'schemaname.tablename' or (schemaname, tablename).
+    osm_config: settings of [osm_file_config] to use instead of the ones of
+    my_preferences.config (or of config, a ConfigParser), e.g. {'conversion_engine': 'client'}.
+    Elements are streamed from the staging schema itersize rows at a time, so that a
+    table of any size goes through without an .osm file."""
+    return osm_elements.elements(connection, table, osm_config, config)
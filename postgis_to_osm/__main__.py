@@ -0,0 +1,5 @@
+"""python -m postgis_to_osm: the command line of cli.py."""
+
+from . import cli
+
+cli.main()
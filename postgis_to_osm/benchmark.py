@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from psycopg2 import sql
+
+from . import update_table_config
+from . import cli
+from . import output_cache
+from . import run_context
+
+# Schema holding the synthetic tables (one per dataset kind and size: <kind>_<rows>)
+BENCHMARK_SCHEMA = 'postgis_to_osm_benchmark'
+
+# Row counts measured when none are given (--rows accepts anything from 1k to 10M)
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+# Vertices of every synthetic linestring
+LINESTRING_VERTICES = 200
+
+# Staging tables whose size is recorded after every stage (id indexes included)
+STAGING_TABLES = ['nodes', 'ways', 'relations']
+
+# Synthetic datasets: column type of the geometry and the expression that builds row i of n.
+# random() is seeded before every table, so the same kind and size always holds the same rows
+DATASETS = {
+    # Scattered points
+    'points': ('geometry(Point, 4326)', """
+        ST_SetSRID(ST_MakePoint(-60 + random() * 20, -30 + random() * 20), 4326)
+    """),
+    # Square cells of a grid: every inner edge is shared by two polygons
+    'grid_polygons': ('geometry(Polygon, 4326)', """
+        ST_MakeEnvelope(
+            -60 + (i % side) * 0.001, -30 + (i / side) * 0.001,
+            -60 + (i % side + 1) * 0.001, -30 + (i / side + 1) * 0.001,
+            4326
+        )
+    """),
+    # Long wavy linestrings
+    'linestrings': ('geometry(LineString, 4326)', """
+        ST_SetSRID(ST_MakeLine(ARRAY(
+            SELECT ST_MakePoint(x0 + k * 0.0001, y0 + 0.0001 * sin(k / 10.0))
+            FROM generate_series(0, {vertices} - 1) AS k
+        )), 4326)
+    """),
+    # Two squares with a hole each
+    'multipolygons_with_holes': ('geometry(MultiPolygon, 4326)', """
+        ST_Multi(ST_Collect(
+            ST_MakePolygon(
+                ST_ExteriorRing(ST_MakeEnvelope(x0, y0, x0 + 0.01, y0 + 0.01, 4326)),
+                ARRAY[ST_ExteriorRing(ST_MakeEnvelope(x0 + 0.004, y0 + 0.004, x0 + 0.006, y0 + 0.006, 4326))]
+            ),
+            ST_MakePolygon(
+                ST_ExteriorRing(ST_MakeEnvelope(x0 + 0.02, y0, x0 + 0.03, y0 + 0.01, 4326)),
+                ARRAY[ST_ExteriorRing(ST_MakeEnvelope(x0 + 0.024, y0 + 0.004, x0 + 0.026, y0 + 0.006, 4326))]
+            )
+        ))
+    """),
+    # A point, a linestring and a polygon in one collection
+    'geometry_collections': ('geometry(GeometryCollection, 4326)', """
+        ST_Collect(ARRAY[
+            ST_SetSRID(ST_MakePoint(x0, y0), 4326),
+            ST_SetSRID(ST_MakeLine(ST_MakePoint(x0, y0 + 0.001), ST_MakePoint(x0 + 0.002, y0 + 0.001)), 4326),
+            ST_MakeEnvelope(x0 + 0.003, y0, x0 + 0.004, y0 + 0.001, 4326)
+        ])
+    """),
+}
+
+def table_name(kind, rows):
+    return f"{kind}_{rows}"
+
+def create_dataset(connection, kind, rows, regenerate=False):
+    # Synthetic table <kind>_<rows> in BENCHMARK_SCHEMA, with a primary key, a few tag
+    # columns and a GiST index, analyzed. An existing table is kept unless regenerate
+    geometry_type, expression = DATASETS[kind]
+    table = sql.Identifier(BENCHMARK_SCHEMA, table_name(kind, rows))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table.as_string(cursor),))
+        if cursor.fetchone()[0] and not regenerate:
+            connection.commit()
+            return False
+
+        cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {};").format(sql.Identifier(BENCHMARK_SCHEMA)))
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(table))
+        cursor.execute(sql.SQL("""
+            CREATE TABLE {} (
+                id BIGINT PRIMARY KEY,
+                name TEXT,
+                category TEXT,
+                geom {}
+            );
+        """).format(table, sql.SQL(geometry_type)))
+        cursor.execute("SELECT setseed(0.42);")
+        cursor.execute(sql.SQL("""
+            INSERT INTO {table} (id, name, category, geom)
+            SELECT i, {kind} || ' ' || i, (ARRAY['primary', 'secondary', 'residential'])[1 + i % 3],
+                   {expression}
+            FROM (
+                SELECT i, ceil(sqrt({rows}))::BIGINT AS side,
+                       -60 + random() * 20 AS x0, -30 + random() * 20 AS y0
+                FROM generate_series(0, {rows} - 1) AS i
+            ) AS s;
+        """).format(
+            table=table,
+            kind=sql.Literal(kind),
+            expression=sql.SQL(expression.format(vertices=LINESTRING_VERTICES)),
+            rows=sql.Literal(rows),
+        ))
+        cursor.execute(sql.SQL("CREATE INDEX ON {} USING GIST (geom);").format(table))
+        # Planner statistics, as a table in use would have them
+        cursor.execute(sql.SQL("ANALYZE {};").format(table))
+    connection.commit()
+    return True
+
+def staging_sizes(connection, staging_schema):
+    # Rows and size on disk (indexes included) of the staging tables
+    sizes = {}
+    with connection.cursor() as cursor:
+        for staging_table in STAGING_TABLES:
+            table = sql.Identifier(staging_schema, staging_table)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table.as_string(cursor),))
+            if not cursor.fetchone()[0]:
+                continue
+            cursor.execute(
+                sql.SQL("SELECT count(*), pg_total_relation_size(%s::regclass) FROM {};").format(table),
+                (table.as_string(cursor),)
+            )
+            rows, size = cursor.fetchone()
+            sizes[staging_table] = {'rows': rows, 'bytes': size}
+    connection.commit()
+    return sizes
+
+def peak_rss_kb(result):
+    # Peak resident set size of the run, in KB: of this process (the largest of its stages,
+    # see run_metrics.reset_peak_rss) and of the processes it waited for (tiles, writers)
+    stage_peaks = [stage['peak_rss_kb'] for stage in result['stages'].values() if stage['peak_rss_kb']]
+    return {
+        'self': max(stage_peaks + [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]),
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+def stage_recorder(context, staging_schema, rows, result):
+    # Stage listener of the run (see run_metrics.RunMetrics.add_stage_listener): wall time,
+    # rows per second and peak RSS of this process during each stage (None where it cannot
+    # be measured per stage, see run_metrics.reset_peak_rss; the peak of the run is still
+    # given), and the staging tables as the stage left them
+    def record(name, measured):
+        seconds = measured['seconds']
+        result['stages'][name] = {
+            'seconds': seconds,
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_kb': measured['peak_rss_kb'],
+            'staging': staging_sizes(context.connection(), staging_schema),
+        }
+    return record
+
+def run_one(databasename, schemaname, tablename, result_file):
+    # One pipeline run, in a process of its own so that its peak RSS is its own.
+    # The output cache is turned off: every run converts the table
+    config = update_table_config.load_config()
+    if 'cache' not in config:
+        config['cache'] = {}
+    config['cache']['enabled'] = 'no'
+
+    with run_context.RunContext(databasename, config) as context:
+        connection = context.connection()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("SELECT count(*) FROM {};").format(sql.Identifier(schemaname, tablename))
+            )
+            rows = cursor.fetchone()[0]
+        connection.commit()
+
+        result = {'table': f"{schemaname}.{tablename}", 'rows': rows, 'stages': {}}
+        context.metrics.add_stage_listener(
+            stage_recorder(context, cli.staging_schema_name(schemaname, tablename), rows, result)
+        )
+
+        started = time.monotonic()
+        cli.execute_scripts(databasename, schemaname, tablename, context)
+        seconds = time.monotonic() - started
+
+    result['seconds'] = round(seconds, 3)
+    result['rows_per_second'] = round(rows / seconds, 1) if seconds > 0 else None
+    result['peak_rss_kb'] = peak_rss_kb(result)
+    result['output'] = {
+        os.path.basename(path): os.path.getsize(path)
+        for path in cli.output_file_paths(
+            databasename, [(schemaname, tablename)], context.osm_config
+        )
+        if os.path.isfile(path)
+    }
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+def run_dataset(databasename, kind, rows):
+    # Runs run_one in a new interpreter and returns its result
+    with tempfile.TemporaryDirectory() as folder:
+        result_file = os.path.join(folder, 'result.json')
+        completed = subprocess.run([
+            sys.executable, '-m', __spec__.name, databasename,
+            '--run-one', f"{BENCHMARK_SCHEMA}.{table_name(kind, rows)}",
+            '--result-file', result_file,
+        ])
+        if completed.returncode != 0 or not os.path.isfile(result_file):
+            return {'kind': kind, 'rows': rows, 'error': f"exit status {completed.returncode}"}
+        with open(result_file, encoding='utf-8') as f:
+            result = json.load(f)
+    result['kind'] = kind
+    return result
+
+def compare(results, previous_file):
+    # Time of every dataset and stage against a previous results file (ratio > 1: slower)
+    with open(previous_file, encoding='utf-8') as f:
+        previous = {(r['kind'], r['rows']): r for r in json.load(f)['results'] if 'error' not in r}
+    for result in results:
+        before = previous.get((result['kind'], result['rows']))
+        if before is None or 'error' in result:
+            continue
+        print(f"{result['kind']} {result['rows']}: total {result['seconds'] / max(before['seconds'], 0.001):.2f}x")
+        for name, stage in result['stages'].items():
+            if name in before['stages']:
+                ratio = stage['seconds'] / max(before['stages'][name]['seconds'], 0.001)
+                print(f"  {name}: {ratio:.2f}x")
+
+def default_results_file():
+    # databases/benchmarks/<timestamp>.json, next to the output files
+    folder = os.path.join(os.getcwd(), 'databases', 'benchmarks')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark postgis_to_osm on synthetic tables of a local PostGIS database."
+    )
+    parser.add_argument('databasename')
+    parser.add_argument('--kinds', default=','.join(DATASETS),
+                        help=f"comma separated dataset kinds (default: all: {', '.join(DATASETS)})")
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)),
+                        help="comma separated row counts (default: %(default)s)")
+    parser.add_argument('--regenerate', action='store_true', help="create the synthetic tables again")
+    parser.add_argument('--output', help="results file (default: databases/benchmarks/<timestamp>.json)")
+    parser.add_argument('--compare', help="previous results file to compare the times with")
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run_one:
+        schemaname, tablename = arguments.run_one.split('.')
+        run_one(arguments.databasename, schemaname, tablename, arguments.result_file)
+        return
+
+    kinds = [kind.strip() for kind in arguments.kinds.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in DATASETS]
+    if unknown:
+        parser.error(f"unknown dataset kinds: {', '.join(unknown)}")
+    row_counts = [int(rows) for rows in arguments.rows.split(',') if rows.strip()]
+
+    config = update_table_config.load_config()
+    with run_context.RunContext(arguments.databasename, config) as context:
+        connection = context.connection()
+        for kind in kinds:
+            for rows in row_counts:
+                started = time.monotonic()
+                if create_dataset(connection, kind, rows, arguments.regenerate):
+                    print(f"{table_name(kind, rows)}: generated in {time.monotonic() - started:.1f}s")
+
+    results = []
+    for kind in kinds:
+        for rows in row_counts:
+            result = run_dataset(arguments.databasename, kind, rows)
+            results.append(result)
+            if 'error' in result:
+                print(f"{table_name(kind, rows)}: failed ({result['error']})")
+            else:
+                print(f"{table_name(kind, rows)}: {result['seconds']:.1f}s, {result['rows_per_second']:.0f} rows/s")
+
+    results_file = arguments.output or default_results_file()
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'code_version': output_cache.code_version(),
+            'osm_file_config': update_table_config.get_osm_file_config(config),
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {results_file}")
+
+    if arguments.compare:
+        compare(results, arguments.compare)
+
+if __name__ == "__main__":
+    main()
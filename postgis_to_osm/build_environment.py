@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import functools
+import hashlib
+import os
+import re
+import sys
+from psycopg2 import sql as psql
+
+from . import run_context
+
+# The SQL files are written against the postgis_to_osm schema. Every run installs
+# its tables into its own staging schema (see cli.py), so that several runs
+# can work side by side on one database
+STAGING_SCHEMA = 'postgis_to_osm'
+
+# SQL files installed into the staging schema of every run: its tables. The others
+# (extensions and functions) are the function bundle, installed once per version into
+# a schema that all the runs share: <prefix><hash of the bundle>
+TABLE_FILES = ['create_schema_and_tables.sql']
+FUNCTION_SCHEMA_PREFIX = 'postgis_to_osm_functions_'
+
+# Schema references in the SQL files: qualified names (group 1: the object) and the schema itself
+SCHEMA_REFERENCE = re.compile(r"\bpostgis_to_osm(?:\.(\w+)|(?=\s*;|\s+CASCADE))")
+
+# Objects the function bundle defines: its functions, types and own tables
+BUNDLE_OBJECT = re.compile(
+    r"\b(?:FUNCTION|TABLE|TYPE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?postgis_to_osm\.(\w+)", re.IGNORECASE
+)
+
+def staging_schema_name(schema_name, table_name):
+    # Staging schema of a run: one per source table, so that runs on different tables
+    # can work side by side on one database and a rerun finds its own checkpoints
+    slug = re.sub(r'[^a-z0-9_]', '_', f"{schema_name}_{table_name}".lower())[:32]
+    digest = hashlib.md5(f"{schema_name}.{table_name}".encode('utf-8')).hexdigest()[:8]
+    return f"postgis_to_osm_{slug}_{digest}"
+
+def find_sql_files(base_dir="sql"):
+    # SQL files of the package (package data, see pyproject.toml)
+    sql_dir = os.path.join(os.path.dirname(__file__), base_dir)
+    sql_dir = os.path.normpath(sql_dir)  # Normalize path to handle OS-specific separator issues
+    
+    if not os.path.isdir(sql_dir):
+        raise RuntimeError(f"SQL directory '{sql_dir}' does not exist.")
+
+    sql_files = [
+        os.path.join(sql_dir, f)
+        for f in os.listdir(sql_dir)
+        if f.endswith(".sql")
+    ]
+    
+    # Sort the files alphabetically by name (this ensures proper execution order)
+    sql_files.sort()
+    return sql_files
+
+def bundle_files(sql_files):
+    return [f for f in sql_files if os.path.basename(f) not in TABLE_FILES]
+
+def table_files(sql_files):
+    return [f for f in sql_files if os.path.basename(f) in TABLE_FILES]
+
+def bundle_objects(sql_files):
+    # Names of the functions (and tables) of the function bundle
+    names = set()
+    for sql_file in bundle_files(sql_files):
+        with open(sql_file, 'r', encoding='utf-8') as f:
+            names.update(BUNDLE_OBJECT.findall(f.read()))
+    return frozenset(names)
+
+@functools.lru_cache(maxsize=None)
+def function_schema_name():
+    # Shared schema of the functions of the current SQL files (the files do not change
+    # while the process runs)
+    return FUNCTION_SCHEMA_PREFIX + bundle_hash(bundle_files(find_sql_files()))[:16]
+
+def staged_sql(sql, staging_schema, function_schema, objects):
+    # Point the postgis_to_osm references of a SQL file to the schemas of the run: the
+    # objects of the bundle to the function schema, the others to the staging schema.
+    # Without staging schema (files of the bundle) they are left unqualified, so that
+    # the shared functions use the tables of the run that calls them (see use_schemas)
+    def reference(match):
+        name = match.group(1)
+        if name is None:
+            return staging_schema or function_schema
+        if name in objects:
+            return f"{function_schema}.{name}"
+        return f"{staging_schema}.{name}" if staging_schema else name
+    return SCHEMA_REFERENCE.sub(reference, sql)
+
+def run_sql_files(conn, sql_files, staging_schema, function_schema, objects):
+    # Raises RuntimeError on the first file that fails, with the connection rolled back
+    # and left open (it may be the connection of a caller, see osm_elements.py)
+    cursor = conn.cursor()
+    for sql_file in sql_files:
+        #print(f"Running: {sql_file}")
+        try:
+            with open(sql_file, 'r', encoding='utf-8') as f:
+                sql = staged_sql(f.read(), staging_schema, function_schema, objects)
+                cursor.execute(sql)
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            cursor.close()
+            raise RuntimeError(f"Error executing '{sql_file}': {e}") from e
+    cursor.close()
+    #print("All SQL scripts executed successfully.")
+
+def bundle_hash(sql_files):
+    # Hash of the SQL files (names and contents): a different hash means they changed
+    digest = hashlib.sha256()
+    for sql_file in sql_files:
+        digest.update(os.path.basename(sql_file).encode('utf-8') + b'\0')
+        with open(sql_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def install_functions(conn, sql_files):
+    # Function bundle of the current SQL files, installed by the first run that needs it.
+    # Runs starting together wait for each other: the bundle is installed once
+    function_schema = function_schema_name()
+    bundle_table = psql.Identifier(function_schema, 'bundle')
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s));", (function_schema,))
+        try:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (bundle_table.as_string(conn),))
+            installed = cursor.fetchone()[0]
+            if installed:
+                cursor.execute(psql.SQL("SELECT EXISTS (SELECT 1 FROM {});").format(bundle_table))
+                installed = cursor.fetchone()[0]
+            conn.commit()
+            if not installed:
+                # Function bodies use the staging tables of the run that calls them:
+                # there are none to check them against yet
+                cursor.execute("SET check_function_bodies = off;")
+                conn.commit()
+                try:
+                    run_sql_files(conn, bundle_files(sql_files), None, function_schema, bundle_objects(sql_files))
+                finally:
+                    cursor.execute("RESET check_function_bodies;")
+                    conn.commit()
+                cursor.execute(
+                    psql.SQL("INSERT INTO {} (bundle_hash) VALUES (%s);").format(bundle_table),
+                    (bundle_hash(bundle_files(sql_files)),)
+                )
+                conn.commit()
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s));", (function_schema,))
+            conn.commit()
+    return function_schema
+
+def install_tables(conn, sql_files, staging_schema=STAGING_SCHEMA):
+    # Staging tables of a run (or of a tile, see convert_table_to_osm_structure.py)
+    run_sql_files(conn, table_files(sql_files), staging_schema, function_schema_name(), bundle_objects(sql_files))
+
+def use_schemas(conn, staging_schema=STAGING_SCHEMA):
+    # search_path of the connection: the staging schema of the run first, so that the
+    # shared functions find its tables, then the function schema and the default path
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT set_config('search_path', format('%%I, %%I, ', %s, %s) || reset_val, FALSE)
+            FROM pg_settings
+            WHERE name = 'search_path';
+        """, (staging_schema, function_schema_name()))
+    conn.commit()
+
+def lock_staging_schema(conn, staging_schema=STAGING_SCHEMA):
+    # Session lock on the staging schema, held for the life of the run (it goes with the
+    # connection, see unlock_staging_schema): two runs on the same table would clobber
+    # each other's staging tables. Raises RuntimeError at once when another run holds it
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s));", (staging_schema,))
+        locked = cursor.fetchone()[0]
+    conn.commit()
+    if not locked:
+        raise RuntimeError(f"Another run is using the staging schema {staging_schema}")
+
+def unlock_staging_schema(conn, staging_schema=STAGING_SCHEMA):
+    # Only needed on connections that outlive the run (see osm_elements.py)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(hashtext(%s));", (staging_schema,))
+    conn.commit()
+
+def installed_bundle_hash(conn, staging_schema=STAGING_SCHEMA):
+    # Hash recorded by the run that installed the staging schema (None: not installed)
+    environment_table = psql.Identifier(staging_schema, 'environment')
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (environment_table.as_string(conn),))
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(psql.SQL("SELECT bundle_hash FROM {} LIMIT 1;").format(environment_table))
+        row = cursor.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+def record_bundle_hash(conn, current_hash, staging_schema=STAGING_SCHEMA):
+    environment_table = psql.Identifier(staging_schema, 'environment')
+    with conn.cursor() as cursor:
+        cursor.execute(psql.SQL("DELETE FROM {};").format(environment_table))
+        cursor.execute(psql.SQL("INSERT INTO {} (bundle_hash) VALUES (%s);").format(environment_table), (current_hash,))
+    conn.commit()
+
+def reset_environment(conn, staging_schema=STAGING_SCHEMA):
+    # Installed environment is current: empty the staging tables and restart the sequences
+    # instead of rebuilding the schema, unless they hold an unfinished conversion or the
+    # state of incremental runs (same rule as create_schema_and_tables.sql)
+    with conn.cursor() as cursor:
+        cursor.execute(psql.SQL("""
+            SELECT {}.reset_staging()
+            WHERE NOT EXISTS (SELECT 1 FROM {} WHERE NOT finished)
+              AND NOT EXISTS (SELECT 1 FROM {});
+        """).format(
+            psql.Identifier(function_schema_name()),
+            psql.Identifier(staging_schema, 'checkpoints'),
+            psql.Identifier(staging_schema, 'source_rows')
+        ))
+    conn.commit()
+
+def run(context, staging_schema=STAGING_SCHEMA):
+    # Stage of a run (see run_context.py), on the connection of the run. Raises
+    # RuntimeError when another run uses the staging schema or the SQL files cannot be
+    # installed
+    conn = context.connection()
+    lock_staging_schema(conn, staging_schema)
+
+    sql_files = find_sql_files()
+    current_hash = bundle_hash(sql_files)
+    # Extensions and functions: only the first run of a version of the SQL files creates them
+    install_functions(conn, sql_files)
+    use_schemas(conn, staging_schema)
+    if installed_bundle_hash(conn, staging_schema) == current_hash:
+        # Same SQL files as the last run on the table: no table to create
+        reset_environment(conn, staging_schema)
+    else:
+        install_tables(conn, sql_files, staging_schema)
+        record_bundle_hash(conn, current_hash, staging_schema)
+
+def main(databasename, staging_schema=STAGING_SCHEMA):
+    #print(f"Building environment for {databasename}")
+    with run_context.RunContext(databasename) as context:
+        try:
+            run(context, staging_schema)
+        except RuntimeError as error:
+            print(error)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1])  # Run main if executed directly
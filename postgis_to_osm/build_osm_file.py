@@ -0,0 +1,623 @@
+import psycopg2
+import bz2
+import collections
+import gzip
+import io
+import json
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from psycopg2 import sql
+
+from . import build_environment
+from . import build_osm_pbf
+from . import run_context
+
+# Staging schema of the run (see build_environment.py)
+STAGING_SCHEMA = 'postgis_to_osm'
+
+# Rows fetched per round trip by the server-side cursors (config: itersize)
+DEFAULT_ITERSIZE = 10000
+
+# Output file buffer
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Processes writing parts of the file at the same time (config: workers)
+DEFAULT_WORKERS = 1
+
+# Staging coordinates are integers in units of 100 nanodegrees (1e-7 degrees)
+COORDINATE_SCALE = 10000000
+
+# Sections of the file body, in output order: render function and columns of each
+SECTIONS = {
+    'nodes': ('render_node', ['id', 'action', 'lat', 'lon', 'tags']),
+    'ways': ('render_way', ['id', 'action', 'nds', 'tags']),
+    'relations': ('render_relation', ['id', 'action', 'member_types', 'member_refs', 'member_roles', 'tags']),
+}
+
+# File format (config: output_format): 'xml' (.osm) or 'pbf' (.osm.pbf)
+DEFAULT_OUTPUT_FORMAT = 'xml'
+
+# Compressed output (config: compression): the extension is added to the file name
+COMPRESSIONS = {'gz': gzip, 'bz2': bz2, 'xz': lzma}
+GZIP_LEVEL = 6
+
+# compression = gz with compression_threads > 1: the output is cut into blocks that are
+# compressed at the same time as separate gzip members (like pigz). Concatenated
+# members are a valid .gz file that every gzip reader decompresses in one go
+GZIP_BLOCK_SIZE = 4 * 1024 * 1024
+
+# incremental = osmchange: element type of each section in postgis_to_osm.changes
+ELEMENT_TYPES = {'nodes': 'node', 'ways': 'way', 'relations': 'relation'}
+
+# Output split into self-contained files (config: split_output): 'no', 'grid', 'elements'
+# or 'bytes', and the split_size of each mode when the config leaves it at 0
+DEFAULT_SPLIT_OUTPUT = 'no'
+SPLIT_SIZES = {'grid': 4, 'elements': 100000, 'bytes': 100 * 1024 * 1024}
+
+# Who renders the element lines (config: render_mode): 'python' or 'sql'
+DEFAULT_RENDER_MODE = 'python'
+
+# render_mode = sql: each output row is one XML line. CSV with a delimiter and a quote
+# character that can never reach the output (xml_escape drops them) writes the lines
+# as they are, without the backslash escaping of the text format
+COPY_OPTIONS = "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'"
+
+# Attribute values are single quoted; control characters XML 1.0 does not allow are dropped
+XML_ESCAPES = {
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    "'": '&apos;',
+    '"': '&quot;',
+    '\n': '&#10;',
+    '\r': '&#13;',
+    '\t': '&#9;',
+}
+XML_ESCAPES.update({chr(code): None for code in range(1, 32) if chr(code) not in XML_ESCAPES})
+XML_ESCAPE_TABLE = str.maketrans(XML_ESCAPES)
+
+def connect_to_database(db_host, db_user, db_password, db_name):
+    try:
+        connection = psycopg2.connect(
+            host=db_host,
+            database=db_name,
+            user=db_user,
+            password=db_password
+        )
+        cursor = connection.cursor()
+        cursor.execute("SELECT version();")
+        db_version = cursor.fetchone()
+        #print(f"Connected to the database: {db_version[0]}")
+        return connection, cursor
+    except Exception as error:
+        print(f"Error connecting to the database: {error}")
+        return None, None
+
+def prepare_output_folder(db_name, schema_name, table_name, output_name=None):
+    # Navigate two folders up from the current directory
+    databases_folder = os.path.join(os.getcwd(), 'databases')
+    os.makedirs(databases_folder, exist_ok=True)
+
+    db_folder = os.path.join(databases_folder, db_name)
+    os.makedirs(db_folder, exist_ok=True)
+
+    # output_name: file of a combined batch (<output_name>.osm) instead of <schema>.<table>.osm
+    output_filename = f"{output_name or f'{schema_name}.{table_name}'}.osm"
+    output_filepath = os.path.join(db_folder, output_filename)
+
+    return output_filepath
+
+def xml_escape(value):
+    # Same escaping as postgis_to_osm.xml_escape (render_mode = sql)
+    return str(value).translate(XML_ESCAPE_TABLE)
+
+class ParallelGzipWriter(io.RawIOBase):
+    # Binary file that compresses its blocks in a thread pool (zlib releases the GIL)
+    # and writes them in order; at most two blocks per thread are held in memory
+    def __init__(self, output_file_path, threads):
+        self.output_file = open(output_file_path, 'wb')
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.pending = collections.deque()
+        self.max_pending = threads * 2
+        self.block = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.block += data
+        if len(self.block) >= GZIP_BLOCK_SIZE:
+            self.submit_block()
+        return len(data)
+
+    def submit_block(self):
+        self.pending.append(self.pool.submit(gzip.compress, bytes(self.block), GZIP_LEVEL))
+        self.block = bytearray()
+        while len(self.pending) > self.max_pending:
+            self.output_file.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.block:
+                self.submit_block()
+            while self.pending:
+                self.output_file.write(self.pending.popleft().result())
+        finally:
+            self.pool.shutdown()
+            self.output_file.close()
+            super().close()
+
+def output_compression(output_file_path, compression):
+    # An explicit .gz/.bz2/.xz file name wins, otherwise the configured compression
+    # adds its extension (<schema>.<table>.osm.gz)
+    for extension in COMPRESSIONS:
+        if output_file_path.endswith(f".{extension}"):
+            return output_file_path, extension
+    if compression in COMPRESSIONS:
+        return f"{output_file_path}.{compression}", compression
+    return output_file_path, None
+
+def output_file_name(output_file_path, config_data):
+    # File actually written for <schema>.<table>.osm, and its compression: the .osc delta
+    # (incremental = osmchange), the .osm.pbf file or the (compressed) .osm file
+    config_data = config_data or {}
+    compression = config_data.get('compression')
+    if (config_data.get('incremental') or 'no').lower() == 'osmchange':
+        if output_file_path.endswith('.osm'):
+            output_file_path = output_file_path[:-len('.osm')] + '.osc'
+        return output_compression(output_file_path, compression)
+    if (config_data.get('output_format') or DEFAULT_OUTPUT_FORMAT) == 'pbf' or output_file_path.endswith('.pbf'):
+        if not output_file_path.endswith('.pbf'):
+            output_file_path += '.pbf'  # <schema>.<table>.osm.pbf
+        return output_file_path, None
+    return output_compression(output_file_path, compression)
+
+def open_output(output_file_path, compression=None, threads=1):
+    # Text stream to the .osm file, compressed on the fly when asked
+    if compression == 'gz' and threads > 1:
+        raw = ParallelGzipWriter(output_file_path, threads)
+        return io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER_SIZE), encoding='utf-8')
+    if compression == 'gz':
+        return gzip.open(output_file_path, 'wt', compresslevel=GZIP_LEVEL, encoding='utf-8')
+    if compression in COMPRESSIONS:
+        return COMPRESSIONS[compression].open(output_file_path, 'wt', encoding='utf-8')
+    return open(output_file_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
+def render_osm_start(config_data):
+    # <osm> start tag built from the [osm_file_config] values (defaults when missing)
+    if config_data:
+        version = config_data.get('version', '0.6')
+        download = str(config_data.get('download', 'true')).lower()
+        upload = str(config_data.get('upload', 'true')).lower()
+        locked = str(config_data.get('locked', 'false')).lower()
+        generator = config_data.get('generator', 'postgis_to_osm')
+    else:
+        version = '0.6'
+        download = 'true'
+        upload = 'true'
+        locked = 'false'
+        generator = 'postgis_to_osm'
+
+    return (
+        f"<osm version='{xml_escape(version)}' download='{xml_escape(download)}' upload='{xml_escape(upload)}'"
+        f" locked='{xml_escape(locked)}' generator='{xml_escape(generator)}'>\n"
+    )
+
+def render_tags(tags):
+    lines = []
+    for tag_pair in tags:
+        if tag_pair and len(tag_pair) == 2 and tag_pair[0] and tag_pair[1]:  # Valid tag
+            k, v = tag_pair
+            lines.append(f"    <tag k='{xml_escape(k)}' v='{xml_escape(v)}' />\n")
+    return "".join(lines)
+
+def render_node(id_, action, lat, lon, tags):
+    if not tags or all(tag == ["", ""] for tag in tags):  # Check for empty or invalid tags
+        return f"  <node id='{id_}' action='{xml_escape(action)}' lat='{lat}' lon='{lon}' />\n"
+
+    # Has valid tags
+    return (
+        f"  <node id='{id_}' action='{xml_escape(action)}' lat='{lat}' lon='{lon}'>\n"
+        + render_tags(tags)
+        + "  </node>\n"
+    )
+
+def render_way(id_, action, nds, tags):
+    # Start writing the way
+    lines = [f"  <way id='{id_}' action='{xml_escape(action)}'>\n"]
+
+    # Write all nd references
+    lines.extend(f"    <nd ref='{nd_ref}' />\n" for nd_ref in nds)
+
+    # If there are tags, write them
+    if tags and any(tag != ["", ""] for tag in tags):
+        lines.append(render_tags(tags))
+
+    # Close the way
+    lines.append("  </way>\n")
+    return "".join(lines)
+
+def render_relation(id_, action, members, tags):
+    # Start writing the relation
+    lines = [f"  <relation id='{id_}' action='{xml_escape(action)}'>\n"]
+
+    # Write the member elements - each member is a (type, ref, role) triplet
+    for member_type, member_ref, member_role in members:
+        lines.append(f"    <member type='{xml_escape(member_type)}' ref='{xml_escape(member_ref)}' role='{xml_escape(member_role)}' />\n")
+
+    # If there are tags, write them
+    if tags and any(tag != ["", ""] for tag in tags):
+        lines.append(render_tags(tags))
+
+    # Close the relation
+    lines.append("  </relation>\n")
+    return "".join(lines)
+
+def xml_sizes(osm_config):
+    # Bytes of each part of the XML, measured on the renderers (see estimate_run.output_sizes
+    # and split_output, which add them up for the elements of a file)
+    tag = [['k', 'v']]
+    node = len(render_node(-10000001, 'modify', -29.1234567, -51.1234567, None))
+    way = len(render_way(-10001, 'modify', [], None))
+    relation = len(render_relation(-101, 'modify', [], None))
+    return {
+        'file': len(render_osm_start(osm_config)) + len("</osm>\n"),
+        'nodes': node,
+        'ways': way,
+        'relations': relation,
+        'nd_refs': len(render_way(-10001, 'modify', [-10000001], None)) - way,
+        'members': len(render_relation(-101, 'modify', [('way', -10001, 'outer')], None)) - relation,
+        # Tag line without its key and value
+        'tags': len(render_tags(tag)) - 2,
+        # A tagged node has an end tag
+        'tagged_nodes': len(render_node(-10000001, 'modify', -29.1234567, -51.1234567, tag))
+                        - len(render_tags(tag)) - node,
+    }
+
+def staging_members(member_types, member_refs, member_roles):
+    # Staging members are three parallel arrays: type, ref and role of each member
+    return list(zip(member_types, member_refs, member_roles))  # e.g. [('way', -10001, 'outer')]
+
+def stream_rows(connection, query, itersize, name):
+    # Named (server-side) cursor: rows are fetched itersize at a time, so client
+    # memory holds a single batch whatever the size of the table
+    with connection.cursor(name=name) as stream:
+        stream.itersize = itersize
+        stream.execute(query)
+        while True:
+            rows = stream.fetchmany(itersize)
+            if not rows:
+                break
+            yield rows
+
+def copy_rows(cursor, query, osm_file):
+    # render_mode = sql: PostgreSQL renders the lines, COPY streams them straight to the file
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH ({COPY_OPTIONS})", osm_file)
+
+def section_query(schema, section, render_mode, condition='TRUE'):
+    # Rows of a section (or of a slice of it when a condition is given)
+    render_function, columns = SECTIONS[section]
+    rows = f"SELECT {', '.join(columns)} FROM {schema}.{section} WHERE {condition}"
+    if render_mode != 'sql':
+        return rows
+
+    # render_mode = sql: one row per XML line, rendered by postgis_to_osm.render_*
+    # (in the function schema shared by the runs, see build_environment.py)
+    arguments = ', '.join(f"e.{column}" for column in columns)
+    return (
+        f"SELECT line FROM ({rows}) AS e "
+        f"CROSS JOIN LATERAL unnest({build_environment.function_schema_name()}.{render_function}({arguments})) AS line"
+    )
+
+def render_rows(section, rows):
+    # Each batch is rendered into one buffer and written in one go
+    if section == 'nodes':
+        return "".join(
+            render_node(id_, action, lat / COORDINATE_SCALE, lon / COORDINATE_SCALE, tags)
+            for id_, action, lat, lon, tags in rows
+        )
+    if section == 'ways':
+        return "".join(
+            render_way(id_, action, nds, tags)
+            for id_, action, nds, tags in rows
+        )
+    return "".join(
+        render_relation(id_, action, staging_members(member_types, member_refs, member_roles), tags)
+        for id_, action, member_types, member_refs, member_roles, tags in rows
+    )
+
+def write_section(cursor, schema, section, osm_file, itersize, render_mode, condition='TRUE'):
+    query = section_query(schema, section, render_mode, condition)
+    if render_mode == 'sql':
+        copy_rows(cursor, query, osm_file)
+        return
+
+    for rows in stream_rows(cursor.connection, query, itersize, f'postgis_to_osm_{section}'):
+        osm_file.write(render_rows(section, rows))
+
+def node_slices(cursor, schema, slices):
+    # Node IDs come from a sequence, so equal ID ranges hold about as many nodes.
+    # Slices go from -10000001 downwards, the order the nodes were created in
+    cursor.execute(f"SELECT min(id), max(id) FROM {schema}.nodes;")
+    lowest, highest = cursor.fetchone()
+    if lowest is None:
+        return ['TRUE']
+
+    step = -(-(highest - lowest + 1) // slices)  # ceil
+    conditions = []
+    upper = highest
+    while upper >= lowest:
+        conditions.append(f"id <= {upper} AND id > {upper - step}")
+        upper -= step
+    return conditions
+
+def write_part(connection_params, schema, section, condition, part_path, itersize, render_mode):
+    # Runs in a worker process: own connection, own part file
+    connection, cursor = connect_to_database(*connection_params)
+    if not connection:
+        raise RuntimeError(f"Could not connect to write the {section} part ({condition})")
+
+    try:
+        with open(part_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as part_file:
+            write_section(cursor, schema, section, part_file, itersize, render_mode, condition)
+    finally:
+        cursor.close()
+        connection.close()
+    return part_path
+
+def write_sections_parallel(cursor, schema, osm_file, output_folder, itersize, render_mode, connection_params, workers):
+    # Node slices, ways and relations are written to part files at the same time,
+    # then appended to the .osm file in output order (through its compressor, if any)
+    tasks = [('nodes', condition) for condition in node_slices(cursor, schema, workers)]
+    tasks += [('ways', 'TRUE'), ('relations', 'TRUE')]
+
+    parts_folder = tempfile.mkdtemp(prefix='.postgis_to_osm_parts_', dir=output_folder)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    write_part, connection_params, schema, section, condition,
+                    os.path.join(parts_folder, f"{index:04d}.{section}.part"), itersize, render_mode
+                )
+                for index, (section, condition) in enumerate(tasks)
+            ]
+
+            # Parts are appended as soon as they (and all the ones before them) are done
+            osm_file.flush()
+            for future in futures:
+                part_path = future.result()
+                with open(part_path, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, osm_file.buffer, WRITE_BUFFER_SIZE)
+                osm_file.buffer.flush()
+                os.remove(part_path)
+    finally:
+        shutil.rmtree(parts_folder, ignore_errors=True)
+
+def staged_rows(cursor, schema, section, itersize, condition='TRUE'):
+    # Rows of a section one by one, streamed itersize at a time (condition: SQL text)
+    render_function, columns = SECTIONS[section]
+    query = sql.SQL("SELECT {} FROM {} WHERE {}").format(
+        sql.SQL(', ').join(sql.Identifier(column) for column in columns),
+        sql.Identifier(schema, section),
+        sql.SQL(condition)
+    )
+    for rows in stream_rows(cursor.connection, query, itersize, f'postgis_to_osm_{section}'):
+        yield from rows
+
+def build_osm_pbf_file(cursor, schema, output_file_path, config_data, itersize, conditions=None):
+    # conditions: section -> condition, to write part of the staging (see build_split_files)
+    conditions = conditions or {}
+    relations = (
+        (id_, action, staging_members(member_types, member_refs, member_roles), tags)
+        for id_, action, member_types, member_refs, member_roles, tags
+        in staged_rows(cursor, schema, 'relations', itersize, conditions.get('relations', 'TRUE'))
+    )
+    with open(output_file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as pbf_file:
+        build_osm_pbf.write_pbf(
+            pbf_file,
+            (config_data or {}).get('generator') or 'postgis_to_osm',
+            staged_rows(cursor, schema, 'nodes', itersize, conditions.get('nodes', 'TRUE')),
+            staged_rows(cursor, schema, 'ways', itersize, conditions.get('ways', 'TRUE')),
+            relations,
+        )
+
+def part_file_path(output_file_path, part):
+    # <schema>.<table>.0001.osm next to <schema>.<table>.osm
+    return f"{os.path.splitext(output_file_path)[0]}.{part:04d}.osm"
+
+def manifest_file_path(output_file_path):
+    return os.path.splitext(output_file_path)[0] + '.manifest.json'
+
+def build_split_files(cursor, schema, output_file_path, config_data, itersize, render_mode):
+    # split_output: one self-contained file per part of postgis_to_osm.output_parts, and a
+    # manifest with the bbox and the element counts of every file
+    split_output = config_data['split_output'].lower()
+    split_size = int(config_data.get('split_size') or 0) or SPLIT_SIZES.get(split_output, 0)
+    compression_threads = int(config_data.get('compression_threads') or 1)
+
+    cursor.execute(
+        f"SELECT * FROM {build_environment.function_schema_name()}.split_output(%s, %s, %s::JSONB);",
+        (split_output, split_size, json.dumps(xml_sizes(config_data)))
+    )
+    parts = cursor.fetchall()
+    cursor.connection.commit()
+
+    files = []
+    for part, nodes, ways, relations, min_lat, min_lon, max_lat, max_lon in parts:
+        part_path, compression = output_file_name(part_file_path(output_file_path, part), config_data)
+        conditions = {
+            section: (
+                f"id IN (SELECT element_id FROM {schema}.output_parts "
+                f"WHERE part = {part} AND element_type = '{element_type}')"
+            )
+            for section, element_type in ELEMENT_TYPES.items()
+        }
+
+        if part_path.endswith('.pbf'):
+            build_osm_pbf_file(cursor, schema, part_path, config_data, itersize, conditions)
+        else:
+            with open_output(part_path, compression, compression_threads) as osm_file:
+                osm_file.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+                osm_file.write(render_osm_start(config_data))
+                for section in SECTIONS:
+                    write_section(cursor, schema, section, osm_file, itersize, render_mode, conditions[section])
+                osm_file.write("</osm>\n")
+
+        files.append({
+            'file': os.path.basename(part_path),
+            # min_lon, min_lat, max_lon, max_lat in degrees | None: no node
+            'bbox': None if min_lat is None else [
+                min_lon / COORDINATE_SCALE, min_lat / COORDINATE_SCALE,
+                max_lon / COORDINATE_SCALE, max_lat / COORDINATE_SCALE,
+            ],
+            'nodes': nodes,
+            'ways': ways,
+            'relations': relations,
+            'bytes': os.path.getsize(part_path),
+        })
+
+    with open(manifest_file_path(output_file_path), 'w', encoding='utf-8') as f:
+        json.dump({
+            'split_output': split_output,
+            'split_size': split_size,
+            'files': files,
+        }, f, indent=2)
+
+def write_osm_change(cursor, schema, osm_file, config_data, itersize, render_mode):
+    # osmChange document from postgis_to_osm.changes: created and modified elements in full,
+    # deleted ones by ID (relations first, so that nothing refers to an element deleted before)
+    version = (config_data or {}).get('version') or '0.6'
+    generator = (config_data or {}).get('generator') or 'postgis_to_osm'
+    osm_file.write(f"<osmChange version='{xml_escape(version)}' generator='{xml_escape(generator)}'>\n")
+
+    for change in ('create', 'modify'):
+        osm_file.write(f"<{change}>\n")
+        for section, element_type in ELEMENT_TYPES.items():
+            condition = (
+                f"id IN (SELECT element_id FROM {schema}.changes "
+                f"WHERE element_type = '{element_type}' AND change = '{change}')"
+            )
+            write_section(cursor, schema, section, osm_file, itersize, render_mode, condition)
+        osm_file.write(f"</{change}>\n")
+
+    osm_file.write("<delete>\n")
+    for element_type in reversed(list(ELEMENT_TYPES.values())):
+        query = (
+            f"SELECT element_id FROM {schema}.changes "
+            f"WHERE element_type = '{element_type}' AND change = 'delete' ORDER BY element_id DESC"
+        )
+        for rows in stream_rows(cursor.connection, query, itersize, 'postgis_to_osm_deletes'):
+            osm_file.write("".join(f"  <{element_type} id='{id_}' />\n" for (id_,) in rows))
+    osm_file.write("</delete>\n")
+
+    osm_file.write("</osmChange>\n")
+
+def build_osm_file(cursor, output_file_path, connection_params=None, staging_schema=STAGING_SCHEMA):
+    try:
+        tables = ['nodes', 'ways', 'relations']
+        schema = staging_schema
+        connection = cursor.connection
+
+        # Fetch config information
+        cursor.execute(f"SELECT * FROM {schema}.config LIMIT 1;")
+        config_row = cursor.fetchone()
+        config_columns = [desc[0] for desc in cursor.description]
+        config_data = dict(zip(config_columns, config_row)) if config_row else None
+        itersize = int((config_data or {}).get('itersize') or DEFAULT_ITERSIZE)
+        render_mode = (config_data or {}).get('render_mode') or DEFAULT_RENDER_MODE
+        workers = int((config_data or {}).get('workers') or DEFAULT_WORKERS)
+        compression_threads = int((config_data or {}).get('compression_threads') or 1)
+
+        incremental = ((config_data or {}).get('incremental') or 'no').lower()
+        split_output = ((config_data or {}).get('split_output') or DEFAULT_SPLIT_OUTPUT).lower()
+
+        # The id indexes are left out while the staging tables are loaded: build them once,
+        # now that they are complete, and commit them before the writers read the tables
+        cursor.execute(f"SELECT {build_environment.function_schema_name()}.create_staging_indexes();")
+        connection.commit()
+
+        # Parts are named after <schema>.<table>.osm (see part_file_path)
+        split_file_path = output_file_path
+        output_file_path, compression = output_file_name(output_file_path, config_data)
+
+        if split_output != 'no' and incremental != 'osmchange':
+            build_split_files(cursor, schema, split_file_path, config_data, itersize, render_mode)
+
+        elif incremental == 'osmchange':
+            with open_output(output_file_path, compression, compression_threads) as osm_file:
+                osm_file.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+                write_osm_change(cursor, schema, osm_file, config_data, itersize, render_mode)
+
+        elif output_file_path.endswith('.pbf'):
+            build_osm_pbf_file(cursor, schema, output_file_path, config_data, itersize)
+
+        else:
+            with open_output(output_file_path, compression, compression_threads) as osm_file:
+                # Write XML header
+                osm_file.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+
+                # Write <osm> start tag
+                osm_file.write(render_osm_start(config_data))
+
+                # Body: nodes, ways, relations
+                if workers > 1 and connection_params:
+                    output_folder = os.path.dirname(os.path.abspath(output_file_path))
+                    write_sections_parallel(
+                        cursor, schema, osm_file, output_folder, itersize, render_mode, connection_params, workers
+                    )
+                else:
+                    for section in SECTIONS:
+                        write_section(cursor, schema, section, osm_file, itersize, render_mode)
+
+                # Close <osm> tag
+                osm_file.write("</osm>\n")
+
+        if incremental != 'no':
+            # The file holds every change so far: the next delta starts from here
+            cursor.execute(f"TRUNCATE {schema}.changes;")
+            connection.commit()
+
+        #print(f"OSM file created at: {output_file_path}")
+        return True
+
+    except Exception as error:
+        # The file may be missing or half written: the run must not go on with it
+        print(f"Error building the OSM file: {error}")
+        cursor.connection.rollback()
+        return False
+
+def run(context, schema_name, table_name, staging_schema=STAGING_SCHEMA, output_name=None):
+    # Stage of a run (see run_context.py), on the connection of the run
+    connection = context.connection()
+    # The shared functions (indexes, split_output) work on the tables of the staging schema
+    build_environment.use_schemas(connection, staging_schema)
+    cursor = connection.cursor()
+    output_file_path = prepare_output_folder(context.databasename, schema_name, table_name, output_name)
+    built = build_osm_file(cursor, output_file_path, context.connection_params, staging_schema)
+    cursor.close()
+    # End the read transaction, so that the next stage does not run inside it
+    connection.commit()
+    return built
+
+def main(databasename_schemaname_tablename, staging_schema=STAGING_SCHEMA, output_name=None):
+    #print(f"Updating table config for {databasename}")
+
+    parts = databasename_schemaname_tablename.split('.')
+    if len(parts) != 3:
+        #print("Invalid format. Use: databasename.schemaname.tablename")
+        sys.exit(1)
+
+    db_name, schema_name, table_name = parts
+    with run_context.RunContext(db_name) as context:
+        run(context, schema_name, table_name, staging_schema, output_name)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1])  # Run main if executed directly
@@ -0,0 +1,189 @@
+import struct
+import zlib
+
+# OSM PBF (https://wiki.openstreetmap.org/wiki/PBF_Format) written without any protobuf
+# library: the few messages needed are encoded by hand below.
+#
+# The file is a sequence of fileblocks:
+#   4 bytes (big endian) BlobHeader size | BlobHeader | Blob (zlib compressed block)
+# The first block is an OSMHeader, the others are OSMData PrimitiveBlocks holding
+# DenseNodes, Ways or Relations. Negative IDs are kept as they are. PBF has no
+# action attribute, so action='modify' is not written.
+
+# Entities per PrimitiveBlock (the same as osmium)
+BLOCK_SIZE = 8000
+
+# Relation member types (Relation.MemberType)
+MEMBER_TYPES = {'node': 0, 'way': 1, 'relation': 2}
+
+# Protobuf wire types
+VARINT = 0
+LENGTH_DELIMITED = 2
+
+UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+
+def encode_varint(value):
+    # Negative int64 values are written as their 64 bit two's complement (10 bytes)
+    value &= UINT64_MASK
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def packed_varints(values):
+    out = bytearray()
+    append = out.append
+    for value in values:
+        value &= UINT64_MASK
+        while value > 0x7F:
+            append((value & 0x7F) | 0x80)
+            value >>= 7
+        append(value)
+    return bytes(out)
+
+def zigzag(value):
+    # sint64: small negative numbers stay small
+    return (value << 1) ^ (value >> 63)
+
+def packed_sint_deltas(values):
+    # Delta coded, zigzag encoded sint64 list (DenseNodes ids/lat/lon, way refs, member ids)
+    previous = 0
+    deltas = []
+    for value in values:
+        deltas.append(zigzag(value - previous))
+        previous = value
+    return packed_varints(deltas)
+
+def field_varint(number, value):
+    return encode_varint(number << 3 | VARINT) + encode_varint(value)
+
+def field_bytes(number, data):
+    return encode_varint(number << 3 | LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+def valid_tags(tags):
+    # Same rule as the XML renderers: pairs with an empty key or value are skipped
+    return [
+        (tag_pair[0], tag_pair[1])
+        for tag_pair in tags or []
+        if tag_pair and len(tag_pair) == 2 and tag_pair[0] and tag_pair[1]
+    ]
+
+class StringTable:
+    # Strings of one PrimitiveBlock; index 0 is reserved (empty string, DenseNodes separator)
+    def __init__(self):
+        self.strings = ['']
+        self.index = {'': 0}
+
+    def id(self, value):
+        value = str(value)
+        string_id = self.index.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.index[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+    def encode(self):
+        return b''.join(field_bytes(1, value.encode('utf-8')) for value in self.strings)
+
+def primitive_block(strings, group):
+    # PrimitiveBlock: stringtable, one primitivegroup (granularity and offsets left at their defaults)
+    return field_bytes(1, strings.encode()) + field_bytes(2, group)
+
+def nodes_block(rows):
+    # rows: (id, action, lat, lon, tags) with lat/lon in units of 100 nanodegrees, as they are
+    # staged (the default granularity)
+    strings = StringTable()
+    ids, lats, lons, keys_vals = [], [], [], []
+    tagged = False
+    for id_, action, lat, lon, tags in rows:
+        ids.append(id_)
+        lats.append(lat)
+        lons.append(lon)
+        for k, v in valid_tags(tags):
+            keys_vals.append(strings.id(k))
+            keys_vals.append(strings.id(v))
+            tagged = True
+        keys_vals.append(0)
+
+    dense = (
+        field_bytes(1, packed_sint_deltas(ids))
+        + field_bytes(8, packed_sint_deltas(lats))
+        + field_bytes(9, packed_sint_deltas(lons))
+    )
+    if tagged:  # keys_vals may be left out when no node has tags
+        dense += field_bytes(10, packed_varints(keys_vals))
+    return primitive_block(strings, field_bytes(2, dense))
+
+def tag_fields(strings, tags):
+    # keys (2) and vals (3) of Way and Relation
+    pairs = valid_tags(tags)
+    if not pairs:
+        return b''
+    return (
+        field_bytes(2, packed_varints(strings.id(k) for k, v in pairs))
+        + field_bytes(3, packed_varints(strings.id(v) for k, v in pairs))
+    )
+
+def ways_block(rows):
+    # rows: (id, action, nds, tags)
+    strings = StringTable()
+    group = []
+    for id_, action, nds, tags in rows:
+        way = field_varint(1, id_) + tag_fields(strings, tags)
+        if nds:
+            way += field_bytes(8, packed_sint_deltas(nds))
+        group.append(field_bytes(3, way))
+    return primitive_block(strings, b''.join(group))
+
+def relations_block(rows):
+    # rows: (id, action, members, tags) with members as (type, ref, role) triplets
+    strings = StringTable()
+    group = []
+    for id_, action, members, tags in rows:
+        relation = field_varint(1, id_) + tag_fields(strings, tags)
+        if members:
+            relation += (
+                field_bytes(8, packed_varints(strings.id(role or '') for member_type, ref, role in members))
+                + field_bytes(9, packed_sint_deltas(int(ref) for member_type, ref, role in members))
+                + field_bytes(10, packed_varints(MEMBER_TYPES[member_type] for member_type, ref, role in members))
+            )
+        group.append(field_bytes(4, relation))
+    return primitive_block(strings, b''.join(group))
+
+def header_block(generator):
+    # HeaderBlock: required_features (4), writingprogram (16)
+    return (
+        field_bytes(4, b'OsmSchema-V0.6')
+        + field_bytes(4, b'DenseNodes')
+        + field_bytes(16, str(generator).encode('utf-8'))
+    )
+
+def write_blob(pbf_file, blob_type, data):
+    # Blob: raw_size (2), zlib_data (3) | BlobHeader: type (1), datasize (3)
+    blob = field_varint(2, len(data)) + field_bytes(3, zlib.compress(data))
+    header = field_bytes(1, blob_type.encode('ascii')) + field_varint(3, len(blob))
+    pbf_file.write(struct.pack('>I', len(header)) + header + blob)
+
+def blocks(rows, size=BLOCK_SIZE):
+    # Regroup a stream of rows into lists of at most size rows
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) == size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def write_pbf(pbf_file, generator, nodes, ways, relations):
+    # nodes, ways, relations: row iterators, consumed one block at a time
+    write_blob(pbf_file, 'OSMHeader', header_block(generator))
+    for block in blocks(nodes):
+        write_blob(pbf_file, 'OSMData', nodes_block(block))
+    for block in blocks(ways):
+        write_blob(pbf_file, 'OSMData', ways_block(block))
+    for block in blocks(relations):
+        write_blob(pbf_file, 'OSMData', relations_block(block))
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import re
+import hashlib
+from fnmatch import fnmatchcase
+
+from . import build_environment
+from . import update_table_config
+from . import convert_table_to_osm_structure
+from . import build_osm_file
+from . import demolish_environment
+from . import estimate_run
+from . import output_cache
+from . import run_context
+
+# Options of the command line, besides the tables
+OPTIONS = ('--estimate', '--cleanup')
+
+def check_arguments(config):
+    """Check the arguments: one or more tables (globs allowed), or none to run the
+    [batch] job of my_preferences.config."""
+    arguments = [argument for argument in sys.argv[1:] if argument not in OPTIONS]
+    if not arguments:
+        arguments = update_table_config.get_batch_config(config)['tables']
+    if not arguments:
+        print("Usage: postgis_to_osm.py [--estimate] <databasename.schemaname.tablename> [<databasename.schemaname.tablename> ...]")
+        print("       postgis_to_osm.py --cleanup <databasename>")
+        sys.exit(1)
+    return arguments
+
+def parse_argument(argument):
+    """Parse the argument into databasename, schemaname, and tablename."""
+    db_parts = argument.split('.')
+    
+    if len(db_parts) == 3:
+        databasename, schemaname, tablename = db_parts
+    elif len(db_parts) == 1:
+        databasename = db_parts[0]
+        schemaname = None
+        tablename = None
+    else:
+        print("Invalid argument format")
+        sys.exit(1)
+
+    return databasename, schemaname, tablename
+
+def expand_tables(arguments, config):
+    """Turn the arguments into (databasename, schemaname, tablename) tuples.
+    Schema and table names may be globs (e.g. mydb.public.road_*), matched against the
+    tables with a geometry column."""
+    tables = []
+    for argument in arguments:
+        databasename, schemaname, tablename = parse_argument(argument)
+        if schemaname is None:
+            print(f"Invalid argument format: {argument}")
+            sys.exit(1)
+        if not any(char in f"{schemaname}{tablename}" for char in '*?['):
+            tables.append((databasename, schemaname, tablename))
+            continue
+
+        connection = update_table_config.connect_database(config, databasename)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT f_table_schema, f_table_name FROM geometry_columns ORDER BY 1, 2;"
+            )
+            matches = [
+                (databasename, schema, table)
+                for schema, table in cursor.fetchall()
+                if fnmatchcase(schema, schemaname) and fnmatchcase(table, tablename)
+            ]
+        connection.close()
+        if not matches:
+            print(f"No table matches {argument}")
+        tables.extend(matches)
+
+    # Same table given twice (or matched by two globs): keep the first
+    return list(dict.fromkeys(tables))
+
+def staging_schema_name(schemaname, tablename):
+    """Staging schema of a run: one per source table, so that runs on different tables
+    can work side by side on one database and a rerun finds its own checkpoints."""
+    return build_environment.staging_schema_name(schemaname, tablename)
+
+def batch_staging_schema_name(name, tables):
+    """Staging schema of a batch, from its name and its list of tables."""
+    slug = re.sub(r'[^a-z0-9_]', '_', name.lower())[:32]
+    digest = hashlib.md5(",".join(f"{schema}.{table}" for schema, table in tables).encode('utf-8')).hexdigest()[:8]
+    return f"postgis_to_osm_batch_{slug}_{digest}"
+
+def keep_environment(osm_config):
+    """keep_environment = yes: the staging schema outlives the run with its tables emptied,
+    so that the next run on the table does not create them again (see --cleanup)."""
+    return osm_config['keep_environment'].lower() in ('yes', 'true')
+
+def output_file_paths(databasename, tables, osm_config, output_name=None):
+    """Files written by a run: one per table, or <output_name> for a combined batch."""
+    if output_name:
+        schemaname, tablename = tables[0]
+        paths = [build_osm_file.prepare_output_folder(databasename, schemaname, tablename, output_name)]
+    else:
+        paths = [
+            build_osm_file.prepare_output_folder(databasename, schemaname, tablename)
+            for schemaname, tablename in tables
+        ]
+    return [build_osm_file.output_file_name(path, osm_config)[0] for path in paths]
+
+def run_cached(context, tables, run, output_name=None):
+    """Call run(), unless an earlier run on the same source data, [osm_file_config] and
+    code left its files in the cache: they are linked in place instead (see output_cache.py)."""
+    cache_config = update_table_config.get_cache_config(context.config)
+    osm_config = dict(context.config['osm_file_config'])
+    if (cache_config['enabled'].lower() not in ('yes', 'true')
+            or osm_config.get('incremental', 'no').lower() != 'no'
+            or osm_config.get('split_output', 'no').lower() != 'no'):
+        # Incremental runs depend on the kept staging; split files are not cached
+        run()
+        return
+
+    databasename = context.databasename
+    paths = output_file_paths(databasename, tables, osm_config, output_name)
+    connection = context.connection()
+    with connection.cursor() as cursor:
+        key = output_cache.cache_key(
+            cursor, context.config['server_connection']['host'], databasename, tables, osm_config, output_name,
+            cache_config['fingerprint'].lower()
+        )
+    connection.commit()
+
+    if output_cache.restore(key, paths):
+        return
+    output_cache.detach(paths)
+    started = time.time()
+    # A failed run exits before this point (see run_scripts)
+    run()
+    output_cache.store(key, paths, int(cache_config['max_size_mb']), started)
+
+def execute_scripts(databasename, schemaname, tablename, context=None):
+    """Execute the scripts, or reuse the cached file of an unchanged table.
+    The stages share one run context: the config is parsed once and a single
+    connection serves them all."""
+    if context is None:
+        with run_context.RunContext(databasename) as context:
+            execute_scripts(databasename, schemaname, tablename, context)
+        return
+    run_cached(context, [(schemaname, tablename)], lambda: run_scripts(context, schemaname, tablename))
+
+def run_scripts(context, schemaname, tablename):
+    """Execute the stages sequentially with the appropriate arguments.
+    Every stage is timed, and the report of the run (config: metrics_report) is written
+    next to the output file (see run_metrics.py)."""
+    osm_config = context.osm_config
+    metrics = context.metrics
+    output_file_path = build_osm_file.prepare_output_folder(context.databasename, schemaname, tablename)
+    if osm_config['conversion_engine'].lower() == 'client':
+        # The client engine streams the table and writes the .osm file itself,
+        # without the postgis_to_osm staging schema
+        with metrics.stage('convert_table_to_osm_structure'):
+            converted = convert_table_to_osm_structure.run(context, schemaname, tablename)
+        if not converted:
+            sys.exit(1)
+        metrics.write_report(output_file_path, [(schemaname, tablename)])
+        return
+
+    staging_schema = staging_schema_name(schemaname, tablename)
+
+    with metrics.stage('build_environment', context.connection()):
+        build_environment.run(context, staging_schema)
+
+    with metrics.stage('update_table_config', context.connection()):
+        update_table_config.run(context, staging_schema)
+    metrics.start_functions(context.connection(), staging_schema)
+
+    with metrics.stage('convert_table_to_osm_structure', context.connection()):
+        converted = convert_table_to_osm_structure.run(context, schemaname, tablename, staging_schema)
+    if not converted:
+        # Keep the staging schema: the next run resumes the conversion
+        sys.exit(1)
+
+    with metrics.stage('build_osm_file', context.connection()):
+        built = build_osm_file.run(context, schemaname, tablename, staging_schema)
+    if not built:
+        # Keep the staging schema: the next run writes the file again
+        sys.exit(1)
+    metrics.collect_elements(context.connection(), staging_schema)
+    metrics.collect_functions(context.connection(), staging_schema)
+
+    if osm_config['incremental'].lower() == 'no':
+        with metrics.stage('demolish_environment', context.connection()):
+            demolish_environment.run(context, staging_schema, keep_environment(osm_config))
+    metrics.write_report(output_file_path, [(schemaname, tablename)])
+
+def execute_batch(databasename, tables, batch_config, config=None):
+    """Convert several tables of one database with a single environment.
+
+    combined: all tables go into the same staging tables, so that a vertex shared by
+    several tables (a road meeting a building outline) becomes one node, and a single
+    <name>.osm file is written. per_table: one file per table, as separate runs would.
+    """
+    with run_context.RunContext(databasename, config) as context:
+        if context.osm_config['conversion_engine'].lower() == 'client':
+            # No staging to share: every table is converted on its own
+            for schemaname, tablename in tables:
+                execute_scripts(databasename, schemaname, tablename, context)
+            return
+
+        output_name = batch_config['name'] if batch_config['output'] == 'combined' else None
+        run_cached(context, tables, lambda: run_batch(context, tables, batch_config), output_name)
+
+def run_batch(context, tables, batch_config):
+    """Convert the tables of a batch in its staging schema and write the file(s)."""
+    osm_config = context.osm_config
+    metrics = context.metrics
+    combined = batch_config['output'] == 'combined'
+    staging_schema = batch_staging_schema_name(batch_config['name'], tables)
+
+    with metrics.stage('build_environment', context.connection()):
+        build_environment.run(context, staging_schema)
+    with metrics.stage('update_table_config', context.connection()):
+        update_table_config.run(context, staging_schema)
+    metrics.start_functions(context.connection(), staging_schema)
+
+    for schemaname, tablename in tables:
+        with metrics.stage('convert_table_to_osm_structure', context.connection()):
+            converted = convert_table_to_osm_structure.run(
+                context, schemaname, tablename, staging_schema, keep_staging=combined
+            )
+        if not converted:
+            # Keep the staging schema: the next run resumes the batch
+            sys.exit(1)
+        if not combined:
+            with metrics.stage('build_osm_file', context.connection()):
+                built = build_osm_file.run(context, schemaname, tablename, staging_schema)
+            if not built:
+                sys.exit(1)
+            metrics.collect_elements(context.connection(), staging_schema)
+
+    if combined:
+        schemaname, tablename = tables[0]
+        with metrics.stage('build_osm_file', context.connection()):
+            built = build_osm_file.run(context, schemaname, tablename, staging_schema, batch_config['name'])
+        if not built:
+            sys.exit(1)
+        metrics.collect_elements(context.connection(), staging_schema)
+    metrics.collect_functions(context.connection(), staging_schema)
+
+    if osm_config['incremental'].lower() == 'no':
+        with metrics.stage('demolish_environment', context.connection()):
+            demolish_environment.run(context, staging_schema, keep_environment(osm_config))
+
+    # One report for the batch: <name>.metrics.json
+    schemaname, tablename = tables[0]
+    metrics.write_report(
+        build_osm_file.prepare_output_folder(context.databasename, schemaname, tablename, batch_config['name']),
+        tables
+    )
+
+def cleanup(databasename, config):
+    """--cleanup: drop the staging schemas left behind by earlier runs (keep_environment,
+    failed runs) and the function schemas of older SQL files (see demolish_environment.py).
+    Staging schemas with the state of incremental runs are kept."""
+    with run_context.RunContext(databasename, config) as context:
+        for schema in demolish_environment.cleanup(context.connection()):
+            print(f"Dropped {schema}")
+
+def estimate(databasename, tables, config, output_name=None):
+    """--estimate: print the elements, file size and runtime a run on the tables would
+    have, as JSON, without running it (see estimate_run.py). Nothing is written to the
+    database: the staging schema is not created."""
+    with run_context.RunContext(databasename, config) as context:
+        estimate_run.print_estimate(estimate_run.run(context, tables, output_name))
+
+def main():
+    """Main function to handle the execution flow. A stage that cannot go on raises
+    RuntimeError (see build_environment.py): the command stops there, and the run
+    context closes its connection on the way out."""
+    try:
+        run_command()
+    except RuntimeError as error:
+        print(error)
+        sys.exit(1)
+
+def run_command():
+    """Run the conversion (or the estimate) of the tables of the command line."""
+    # my_preferences.config is read once, here, for the whole run
+    config = update_table_config.load_config()
+    arguments = check_arguments(config)
+    if '--cleanup' in sys.argv[1:]:
+        for databasename in dict.fromkeys(parse_argument(argument)[0] for argument in arguments):
+            cleanup(databasename, config)
+        return
+
+    tables = expand_tables(arguments, config)
+    if not tables:
+        sys.exit(1)
+
+    if '--estimate' in sys.argv[1:]:
+        databasenames = {databasename for databasename, schemaname, tablename in tables}
+        if len(databasenames) > 1:
+            print("All tables of a batch must be in the same database")
+            sys.exit(1)
+        batch_config = update_table_config.get_batch_config(config)
+        # The client engine has no combined output (see execute_batch)
+        combined = (len(tables) > 1 and batch_config['output'] == 'combined'
+                    and config['osm_file_config'].get('conversion_engine', 'row').lower() != 'client')
+        estimate(
+            databasenames.pop(),
+            [(schemaname, tablename) for databasename, schemaname, tablename in tables],
+            config,
+            batch_config['name'] if combined else None
+        )
+        return
+
+    if len(arguments) == 1 and len(tables) == 1:
+        with run_context.RunContext(tables[0][0], config) as context:
+            execute_scripts(*tables[0], context)
+        return
+
+    databasenames = {databasename for databasename, schemaname, tablename in tables}
+    if len(databasenames) > 1:
+        print("All tables of a batch must be in the same database")
+        sys.exit(1)
+
+    batch_config = update_table_config.get_batch_config(config)
+    execute_batch(
+        databasenames.pop(),
+        [(schemaname, tablename) for databasename, schemaname, tablename in tables],
+        batch_config,
+        config
+    )
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,834 @@
+import psycopg2
+from psycopg2 import sql
+import decimal
+import hashlib
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from . import build_environment
+from . import build_osm_file
+from . import run_context
+from . import run_metrics
+from . import update_table_config
+
+# Staging schema of the run (see build_environment.py)
+STAGING_SCHEMA = 'postgis_to_osm'
+
+def connect_to_database(db_host, db_user, db_password, db_name):
+    #print(f"Connecting to database {db_name} at {db_host} as user {db_user}...")
+    try:
+        connection = psycopg2.connect(
+            host=db_host,
+            database=db_name,
+            user=db_user,
+            password=db_password
+        )
+        connection.autocommit = True  # Important for functions that modify data inside!
+        cursor = connection.cursor()
+        cursor.execute("SELECT version();")
+        db_version = cursor.fetchone()
+        #print(f"Connected to the database: {db_version[0]}")
+        return connection, cursor
+    except Exception as error:
+        print(f"Error connecting to the database: {error}")
+        return None, None
+
+def estimate_row_count(cursor, schema_name, table_name, source_filter=None):
+    # Planner estimate (cheap), exact count when the table was never analyzed
+    if source_filter:
+        # Rows kept by the filter of the plan (see plan_table), as the planner expects them
+        cursor.execute(sql.SQL("EXPLAIN (FORMAT JSON) SELECT 1 FROM {}.{} WHERE {};").format(
+            sql.Identifier(schema_name), sql.Identifier(table_name), sql.SQL(source_filter)
+        ))
+        return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+    cursor.execute(
+        "SELECT reltuples::BIGINT FROM pg_class WHERE oid = %s::regclass;",
+        (sql.SQL("{}.{}").format(sql.Identifier(schema_name), sql.Identifier(table_name)).as_string(cursor),)
+    )
+    row = cursor.fetchone()
+    if row and row[0] and row[0] > 0:
+        return row[0]
+    cursor.execute(sql.SQL("SELECT count(*) FROM {}.{};").format(sql.Identifier(schema_name), sql.Identifier(table_name)))
+    return cursor.fetchone()[0]
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+def report_progress(full_table, rows_done, total_rows, rows_this_run, elapsed):
+    rate = rows_this_run / elapsed if elapsed > 0 else 0.0
+    if rate > 0 and total_rows > rows_done:
+        eta = format_duration((total_rows - rows_done) / rate)
+    else:
+        eta = format_duration(0)
+    run_metrics.log(f"{full_table}: {rows_done}/{total_rows} rows, {rate:.0f} rows/s, ETA {eta}")
+
+def run_function(cursor, schema_name, table_name, chunk_size=10000, staging_schema=STAGING_SCHEMA, keep_staging=False):
+    # Converts the table chunk by chunk; the connection is in autocommit mode, so every
+    # chunk (and its checkpoint) is committed on its own and a rerun resumes after it.
+    # keep_staging adds the table to the tables already staged (combined batch)
+    full_table = f"{schema_name}.{table_name}"
+    staging = sql.Identifier(staging_schema)
+    functions = sql.Identifier(build_environment.function_schema_name())
+    #print(f"Preparing to run function on: {full_table}")
+    try:
+        cursor.execute(
+            sql.SQL("SELECT {}.start_table_conversion(%s, %s);").format(functions), (full_table, keep_staging)
+        )
+        rows_done = cursor.fetchone()[0]
+        if rows_done:
+            run_metrics.log(f"{full_table}: resuming after {rows_done} converted rows")
+
+        cursor.execute(
+            sql.SQL("SELECT source_filter FROM {}.plans WHERE source_table = %s;").format(staging), (full_table,)
+        )
+        source_filter = cursor.fetchone()[0]
+        total_rows = estimate_row_count(cursor, schema_name, table_name, source_filter)
+        started = time.monotonic()
+        rows_this_run = 0
+
+        while True:
+            cursor.execute(
+                sql.SQL("SELECT {}.psql_table_to_osm_chunk(%s, %s);").format(functions), (full_table, chunk_size)
+            )
+            chunk_rows = cursor.fetchone()[0]
+            if chunk_rows is None:  # Table done
+                break
+            rows_done += chunk_rows
+            rows_this_run += chunk_rows
+            report_progress(full_table, rows_done, max(total_rows, rows_done), rows_this_run, time.monotonic() - started)
+
+        cursor.execute(sql.SQL("SELECT {}.finish_table_conversion(%s);").format(functions), (full_table,))
+        rejected = cursor.fetchone()[0]
+        if rejected:
+            print(f"{full_table}: {rejected} rows could not be converted, see {staging_schema}.rejects")
+        return True
+    except Exception as e:
+        print(f"Error executing the function: {e}")
+        print(f"{full_table}: converted chunks are kept, run again to resume")
+        return False
+
+def run_incremental(cursor, schema_name, table_name, staging_schema=STAGING_SCHEMA):
+    # incremental != no: staging is kept between runs and only added, changed and
+    # deleted rows are converted (sync_table_changes)
+    full_table = f"{schema_name}.{table_name}"
+    staging = sql.Identifier(staging_schema)
+    functions = sql.Identifier(build_environment.function_schema_name())
+    try:
+        started = time.monotonic()
+        cursor.execute(sql.SQL("SELECT * FROM {}.sync_table_changes(%s);").format(functions), (full_table,))
+        added, changed, deleted = cursor.fetchone()
+        run_metrics.log(
+            f"{full_table}: {added} added, {changed} changed, {deleted} deleted rows, "
+            f"{format_duration(time.monotonic() - started)}"
+        )
+
+        cursor.execute(
+            sql.SQL("SELECT count(*) FROM {}.rejects WHERE source_table = %s;").format(staging), (full_table,)
+        )
+        rejected = cursor.fetchone()[0]
+        if rejected:
+            print(f"{full_table}: {rejected} rows could not be converted, see {staging_schema}.rejects")
+        return True
+    except Exception as e:
+        print(f"Error executing the incremental conversion: {e}")
+        return False
+
+# --- Tiled conversion ------------------------------------------------------
+# tiles > 1: the table is split into a grid of spatial tiles (table_tiles), every tile is
+# converted by its own process, connection and staging schema, then the tiles are merged
+# into the staging schema of the run (merge_tile_staging): IDs are renumbered and vertices
+# on tile edges become a single node again
+
+def run_topology(cursor, schema_name, table_name, staging_schema=STAGING_SCHEMA, keep_staging=False):
+    # conversion_engine = topology: the polygons share their borders through a PostGIS
+    # topology (see psql_table_to_osm_topology). The table is converted in one statement,
+    # without chunks: an interrupted run starts over
+    full_table = f"{schema_name}.{table_name}"
+    staging = sql.Identifier(staging_schema)
+    functions = sql.Identifier(build_environment.function_schema_name())
+    try:
+        cursor.execute(
+            sql.SQL("SELECT {}.start_table_conversion(%s, %s);").format(functions), (full_table, keep_staging)
+        )
+        cursor.execute(
+            sql.SQL("SELECT finished FROM {}.checkpoints WHERE source_table = %s;").format(staging), (full_table,)
+        )
+        if cursor.fetchone()[0]:  # Already converted by an interrupted batch
+            return True
+
+        started = time.monotonic()
+        cursor.execute(sql.SQL("SELECT {}.psql_table_to_osm_topology(%s);").format(functions), (full_table,))
+        rows_done = cursor.fetchone()[0]
+        cursor.execute(
+            sql.SQL("UPDATE {}.checkpoints SET rows_done = %s, updated_at = now() WHERE source_table = %s;").format(staging),
+            (rows_done, full_table)
+        )
+        run_metrics.log(f"{full_table}: {rows_done} rows converted with shared borders, {format_duration(time.monotonic() - started)}")
+
+        cursor.execute(sql.SQL("SELECT {}.finish_table_conversion(%s);").format(functions), (full_table,))
+        rejected = cursor.fetchone()[0]
+        if rejected:
+            print(f"{full_table}: {rejected} rows could not be converted, see {staging_schema}.rejects")
+        return True
+    except Exception as e:
+        print(f"Error converting the table with its topology: {e}")
+        return False
+
+def tile_schema_name(staging_schema, index):
+    digest = hashlib.md5(staging_schema.encode('utf-8')).hexdigest()[:8]
+    return f"postgis_to_osm_tile_{digest}_{index}"
+
+def convert_tile(connection_params, tile_schema, full_table, tile_filter, osm_config):
+    # Runs in a worker process; returns the number of rows of the tile
+    connection, cursor = connect_to_database(*connection_params)
+    if not connection:
+        raise RuntimeError(f"Could not connect to convert the tile {tile_schema}")
+
+    try:
+        # Tables of the tile in its own schema; the functions of the run are shared
+        build_environment.install_tables(connection, build_environment.find_sql_files(), tile_schema)
+        build_environment.use_schemas(connection, tile_schema)
+        update_table_config.update_table(connection, osm_config, tile_schema)
+        cursor.execute(
+            sql.SQL("SELECT {0}.source_to_osm({0}.table_source_query(%s, %s), %s);").format(
+                sql.Identifier(build_environment.function_schema_name())
+            ),
+            (full_table, tile_filter, full_table)
+        )
+        return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+def tile_processes(tiles, osm_config):
+    # Tiles converted at the same time: workers when it is set above 1, else one per CPU;
+    # never more than the tiles. The other tiles wait for a free process
+    workers = int(osm_config.get('workers') or 1)
+    return max(1, min(tiles, workers if workers > 1 else os.cpu_count() or 1))
+
+def run_tiled(cursor, connection_params, schema_name, table_name, tiles, osm_config,
+              staging_schema=STAGING_SCHEMA, keep_staging=False):
+    full_table = f"{schema_name}.{table_name}"
+    staging = sql.Identifier(staging_schema)
+    functions = sql.Identifier(build_environment.function_schema_name())
+    connection = cursor.connection
+    tile_schemas = []
+    try:
+        cursor.execute(
+            sql.SQL("SELECT {}.start_table_conversion(%s, %s);").format(functions), (full_table, keep_staging)
+        )
+        cursor.execute(
+            sql.SQL("SELECT finished FROM {}.checkpoints WHERE source_table = %s;").format(staging), (full_table,)
+        )
+        if cursor.fetchone()[0]:  # Already converted by an interrupted batch
+            return True
+
+        cursor.execute(sql.SQL("SELECT {}.table_tiles(%s, %s);").format(functions), (full_table, tiles))
+        tile_filters = [row[0] for row in cursor.fetchall()]
+        tile_schemas = [tile_schema_name(staging_schema, index) for index in range(len(tile_filters))]
+        # Held by the run until the tiles are dropped, so that --cleanup leaves them alone
+        for tile_schema in tile_schemas:
+            build_environment.lock_staging_schema(connection, tile_schema)
+        started = time.monotonic()
+
+        with ProcessPoolExecutor(max_workers=tile_processes(len(tile_filters), osm_config)) as pool:
+            futures = [
+                pool.submit(convert_tile, connection_params, tile_schema, full_table, tile_filter, osm_config)
+                for tile_schema, tile_filter in zip(tile_schemas, tile_filters)
+            ]
+            rows_done = sum(future.result() for future in futures)
+        run_metrics.log(f"{full_table}: {rows_done} rows converted in {len(tile_filters)} tiles, {format_duration(time.monotonic() - started)}")
+
+        # All tiles are merged (and the checkpoint updated) in one transaction
+        connection.autocommit = False
+        for tile_schema in tile_schemas:
+            cursor.execute(sql.SQL("SELECT {}.merge_tile_staging(%s);").format(functions), (tile_schema,))
+        cursor.execute(
+            sql.SQL("UPDATE {}.checkpoints SET rows_done = %s, updated_at = now() WHERE source_table = %s;").format(staging),
+            (rows_done, full_table)
+        )
+        connection.commit()
+        connection.autocommit = True
+        run_metrics.log(f"{full_table}: tiles merged, {format_duration(time.monotonic() - started)}")
+
+        cursor.execute(sql.SQL("SELECT {}.finish_table_conversion(%s);").format(functions), (full_table,))
+        rejected = cursor.fetchone()[0]
+        if rejected:
+            print(f"{full_table}: {rejected} rows could not be converted, see {staging_schema}.rejects")
+        return True
+    except Exception as e:
+        print(f"Error converting the tiles: {e}")
+        connection.rollback()
+        return False
+    finally:
+        connection.autocommit = True
+        for tile_schema in tile_schemas:
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(sql.Identifier(tile_schema)))
+            build_environment.unlock_staging_schema(connection, tile_schema)
+
+# --- Client engine ---------------------------------------------------------
+# Converts the table on the client: rows are streamed as binary WKB (SRID 4326)
+# through a server-side cursor, deduplicated in compact in-memory tables and
+# written straight to the .osm file. The postgis_to_osm staging schema is not used.
+
+# First IDs handed out, the same as the staging sequences (IDs are negative)
+NODE_ID_START = 10000001
+WAY_ID_START = 10001
+RELATION_ID_START = 101
+
+# Rows fetched per round trip by the server-side cursor (config: itersize)
+CLIENT_ITERSIZE = 10000
+
+WKB_TYPES = {
+    1: 'ST_Point',
+    2: 'ST_LineString',
+    3: 'ST_Polygon',
+    4: 'ST_MultiPoint',
+    5: 'ST_MultiLineString',
+    6: 'ST_MultiPolygon',
+    7: 'ST_GeometryCollection',
+}
+
+def decode_wkb(data):
+    # Decode (E)WKB into (geom_type, value), keeping x/y only:
+    #   ST_Point -> (x, y) | ST_LineString -> [(x, y), ...] | ST_Polygon -> [ring, ...]
+    #   ST_Multi* -> [value, ...] | ST_GeometryCollection -> [(geom_type, value), ...]
+    geometry, _ = _read_wkb(memoryview(data), 0)
+    return geometry
+
+def _read_wkb(data, offset):
+    byte_order = '<' if data[offset] == 1 else '>'
+    (type_code,) = struct.unpack_from(byte_order + 'I', data, offset + 1)
+    offset += 5
+
+    dims = 2
+    if type_code & 0x80000000:  # EWKB Z
+        dims += 1
+    if type_code & 0x40000000:  # EWKB M
+        dims += 1
+    if type_code & 0x20000000:  # EWKB SRID
+        offset += 4
+    type_code &= 0x0FFFFFFF
+    dims += (0, 1, 1, 2)[type_code // 1000]  # ISO Z, M and ZM types
+    base_type = type_code % 1000
+    geom_type = WKB_TYPES.get(base_type)
+
+    if base_type == 1:
+        coords = struct.unpack_from(f"{byte_order}{dims}d", data, offset)
+        offset += 8 * dims
+        x, y = coords[0], coords[1]
+        return (geom_type, None if x != x else (x, y)), offset  # NaN means POINT EMPTY
+
+    if base_type == 2:
+        points, offset = _read_points(data, offset, byte_order, dims)
+        return (geom_type, points), offset
+
+    if base_type == 3:
+        (num_rings,) = struct.unpack_from(byte_order + 'I', data, offset)
+        offset += 4
+        rings = []
+        for _ in range(num_rings):
+            ring, offset = _read_points(data, offset, byte_order, dims)
+            rings.append(ring)
+        return (geom_type, rings), offset
+
+    if 4 <= base_type <= 7:
+        (num_parts,) = struct.unpack_from(byte_order + 'I', data, offset)
+        offset += 4
+        parts = []
+        for _ in range(num_parts):
+            part, offset = _read_wkb(data, offset)
+            # Multi* parts all share one type, keep their values only
+            parts.append(part if base_type == 7 else part[1])
+        return (geom_type, parts), offset
+
+    raise ValueError(f"Unsupported WKB geometry type: {type_code}")
+
+def _read_points(data, offset, byte_order, dims):
+    (num_points,) = struct.unpack_from(byte_order + 'I', data, offset)
+    offset += 4
+    values = struct.unpack_from(f"{byte_order}{num_points * dims}d", data, offset)
+    offset += 8 * num_points * dims
+    return list(zip(values[0::dims], values[1::dims])), offset
+
+# 1e-7 degrees per unit of the integer coordinates (see to_e7)
+E7 = decimal.Decimal(10000000)
+
+def to_e7(value):
+    # Fixed-point 1e-7 degrees as point_to_node computes them: round(value::numeric * 10000000).
+    # The server casts float8 to numeric with 15 significant digits ('%.15g'), then rounds
+    # half away from zero: -35.48880995 gives -354888100, where value * 1e7 would round
+    # the binary -354888099.49999994 down
+    return int((decimal.Decimal('%.15g' % value) * E7).to_integral_value(decimal.ROUND_HALF_UP))
+
+def like_regex(pattern):
+    # LIKE pattern as a regular expression: % matches any characters, _ one, and a
+    # backslash makes the next character literal
+    parts = []
+    characters = iter(pattern)
+    for character in characters:
+        if character == '\\':
+            parts.append(re.escape(next(characters, '')))
+        elif character == '%':
+            parts.append('.*')
+        elif character == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(character))
+    return ''.join(parts)
+
+def ilike_contains(text, value):
+    # text ILIKE '%' || value || '%', as postgis_to_osm.merge_way_tags tests it: the value
+    # is a pattern, its %, _ and backslashes are not taken literally
+    if not any(character in value for character in '%_\\'):
+        return value.lower() in text.lower()
+    return re.fullmatch(like_regex(f"%{value.lower()}%"), text.lower(), re.DOTALL) is not None
+
+def merge_way_tags(existing_tags, new_tags):
+    # Same rules as postgis_to_osm.merge_way_tags, NULL (None) values included
+    if existing_tags is None:
+        return new_tags
+
+    existing = {}
+    for k, v in existing_tags:
+        existing[k] = v  # Later duplicates of a key win
+
+    added = {}
+    seen = set()
+    for k, v in new_tags or ():
+        if (k, v) in seen:
+            continue
+        seen.add((k, v))
+        if k not in existing:
+            added.setdefault(k, []).append(v)
+        elif existing[k] is not None and v is not None and not ilike_contains(existing[k], v):
+            added.setdefault(k, []).append(v)
+
+    merged = dict(existing)
+    for k, values in added.items():
+        # string_agg leaves NULL values out, and is NULL without any other
+        values = [v for v in values if v is not None]
+        joined = ';'.join(values) if values else None
+        merged[k] = f"{existing[k]};{joined}" if k in existing else joined
+
+    # Ordered by code point, as the keys are ordered with COLLATE "C"
+    return [[k, merged[k]] for k in sorted(merged)] or None
+
+def merge_relation_tags(existing_tags, new_tags):
+    # Same rules as postgis_to_osm.merge_relation_tags
+    if existing_tags is None:
+        return new_tags
+
+    values = {}
+    for k, v in list(existing_tags) + list(new_tags):
+        values.setdefault(k, []).append(v)
+
+    merged = []
+    for k, key_values in values.items():
+        if len(key_values) == 1:
+            merged.append([k, key_values[0]])
+        else:
+            parts = {part for v in key_values if v is not None for part in v.split(';')}
+            merged.append([k, ';'.join(sorted(parts))])
+    return merged or None
+
+def with_type_tag(fields, type_value):
+    # Same rules as postgis_to_osm.with_type_tag
+    field_map = [list(kv) for kv in fields]
+    for kv in field_map:
+        if kv[0] == 'type':
+            if not kv[1]:
+                kv[1] = type_value
+            return field_map
+    field_map.append(['type', type_value])
+    return field_map
+
+# Single item multi geometries simplified by simplify_geometry_type = yes
+SIMPLIFIED_TYPES = {
+    'ST_MultiPoint': 'ST_Point',
+    'ST_MultiLineString': 'ST_LineString',
+    'ST_MultiPolygon': 'ST_Polygon',
+}
+
+MEMBER_TAGS = [['', '']]  # Tags given to relation members, as the SQL functions do
+
+class ClientConverter:
+    # In-memory counterpart of the postgis_to_osm.*_to_* functions.
+    # Nodes live in array-backed coordinate tables (1e-7 degree integers) indexed by a
+    # packed coordinate key; ways keep their nds in one flat array. Memory grows with
+    # the number of unique elements, not with the number of rows.
+
+    def __init__(self, simplify_geometry_type='no'):
+        self.simplify_geometry_type = str(simplify_geometry_type).lower()
+
+        self.node_lat = array('i')
+        self.node_lon = array('i')
+        self.node_tags = {}           # node index -> tags (tagged nodes only)
+        self.node_index = {}          # packed coordinate -> node index (untagged nodes)
+        self.tagged_node_index = {}   # (packed coordinate, normalized tags) -> node index
+
+        self.way_nds = array('q')
+        self.way_offsets = array('q', [0])
+        self.way_tags = []
+        self.way_index = {}           # nds fingerprint -> way index
+
+        self.relation_members = []
+        self.relation_tags = []
+        self.relation_index = {}      # members fingerprint -> relation index
+
+        # Elements asked for, found or created (see element_counts)
+        self.uses = {'nodes': 0, 'ways': 0, 'relations': 0}
+
+    def geometry_to_osm(self, geometry, fields):
+        geom_type, value = geometry
+
+        # Simplify or not simplify geometry type
+        if (self.simplify_geometry_type == 'yes'
+                and geom_type in SIMPLIFIED_TYPES
+                and len(value) == 1):
+            geom_type, value = SIMPLIFIED_TYPES[geom_type], value[0]
+
+        if geom_type == 'ST_Point':
+            return self.point_to_node(value, fields)
+        if geom_type == 'ST_LineString':
+            return self.linestring_to_way(value, fields)
+        if geom_type == 'ST_Polygon':
+            return self.polygon_to_way(value, fields)
+        if geom_type == 'ST_MultiPoint':
+            return self.multipoint_to_relation(value, fields)
+        if geom_type == 'ST_MultiLineString':
+            return self.multilinestring_to_relation(value, fields)
+        if geom_type == 'ST_MultiPolygon':
+            return self.multipolygon_to_relation(value, fields)
+        if geom_type == 'ST_GeometryCollection':
+            return self.geometrycollection_to_relation(value, fields)
+        return None
+
+    def point_to_node(self, point, fields):
+        if point is None:
+            return None
+        self.uses['nodes'] += 1
+        lat = to_e7(point[1])
+        lon = to_e7(point[0])
+        key = ((lat + 900000000) << 32) | (lon + 1800000000)
+
+        if not fields:
+            # tags are empty
+            index = self.node_index.get(key)
+            if index is None:
+                index = self._add_node(lat, lon, None)
+                self.node_index[key] = index
+        else:
+            # tags are not empty
+            tags_key = (key, tuple(sorted(v for kv in fields for v in kv)))
+            index = self.tagged_node_index.get(tags_key)
+            if index is None:
+                index = self._add_node(lat, lon, fields)
+                self.tagged_node_index[tags_key] = index
+
+        return -(NODE_ID_START + index)
+
+    def _add_node(self, lat, lon, tags):
+        index = len(self.node_lat)
+        self.node_lat.append(lat)
+        self.node_lon.append(lon)
+        if tags:
+            self.node_tags[index] = tags
+        return index
+
+    def linestring_to_way(self, points, fields):
+        nds = array('q', [self.point_to_node(point, None) for point in points])
+        key = hashlib.md5(nds.tobytes()).digest()
+        self.uses['ways'] += 1
+
+        index = self.way_index.get(key)
+        if index is not None:
+            self.way_tags[index] = merge_way_tags(self.way_tags[index], fields)
+        else:
+            index = len(self.way_tags)
+            self.way_index[key] = index
+            self.way_nds.extend(nds)
+            self.way_offsets.append(len(self.way_nds))
+            self.way_tags.append(fields)
+
+        return -(WAY_ID_START + index)
+
+    def polygon_to_way(self, rings, fields):
+        if not rings:
+            return None
+        if len(rings) == 1:
+            # No interior rings: treat as simple linestring
+            return self.linestring_to_way(rings[0], fields)
+        # Has interior rings: treat as multipolygon relation
+        return self.multipolygon_to_relation([rings], fields)
+
+    def multipoint_to_relation(self, points, fields):
+        members = [('node', self.point_to_node(point, MEMBER_TAGS), '') for point in points]
+        return self._add_relation(members, with_type_tag(fields, 'collection'))
+
+    def multilinestring_to_relation(self, lines, fields):
+        members = [('way', self.linestring_to_way(line, MEMBER_TAGS), '') for line in lines]
+        return self._add_relation(members, with_type_tag(fields, 'collection'))
+
+    def multipolygon_to_relation(self, polygons, fields):
+        members = []
+        for rings in polygons:
+            for ring_number, ring in enumerate(rings):
+                way_id = self.polygon_to_way([ring], MEMBER_TAGS)
+                members.append(('way', way_id, 'outer' if ring_number == 0 else 'inner'))
+        return self._add_relation(members, with_type_tag(fields, 'multipolygon'))
+
+    def geometrycollection_to_relation(self, parts, fields):
+        members = []
+        for geom_type, value in parts:
+            if geom_type == 'ST_Point':
+                members.append(('node', self.point_to_node(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_LineString':
+                members.append(('way', self.linestring_to_way(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_Polygon':
+                member_type = 'way' if len(value) <= 1 else 'relation'
+                members.append((member_type, self.polygon_to_way(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_MultiPoint':
+                members.append(('relation', self.multipoint_to_relation(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_MultiLineString':
+                members.append(('relation', self.multilinestring_to_relation(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_MultiPolygon':
+                members.append(('relation', self.multipolygon_to_relation(value, MEMBER_TAGS), ''))
+            elif geom_type == 'ST_GeometryCollection':
+                members.append(('relation', self.geometrycollection_to_relation(value, MEMBER_TAGS), ''))
+        if not members:
+            return None
+        return self._add_relation(members, with_type_tag(fields, 'collection'))
+
+    def _add_relation(self, members, field_map):
+        # Member order does not matter: sorted triplets are fingerprinted
+        key = hashlib.md5(
+            ','.join(sorted(f"{t}:{ref}:{role}" for t, ref, role in members)).encode('utf-8')
+        ).digest()
+        self.uses['relations'] += 1
+
+        index = self.relation_index.get(key)
+        if index is not None:
+            self.relation_tags[index] = merge_relation_tags(self.relation_tags[index], field_map)
+        else:
+            index = len(self.relation_tags)
+            self.relation_index[key] = index
+            self.relation_members.append(members)
+            self.relation_tags.append(field_map)
+
+        return -(RELATION_ID_START + index)
+
+    def element_counts(self):
+        # Created and used elements, as postgis_to_osm.staging_element_counts counts them
+        created = {'nodes': len(self.node_lat), 'ways': len(self.way_tags), 'relations': len(self.relation_tags)}
+        return {
+            element_type: {'created': created[element_type], 'used': used, 'extra_uses': used - created[element_type]}
+            for element_type, used in self.uses.items()
+        }
+
+    def write(self, osm_file, osm_config):
+        osm_file.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+        osm_file.write(build_osm_file.render_osm_start(osm_config))
+
+        for index in range(len(self.node_lat)):
+            osm_file.write(build_osm_file.render_node(
+                -(NODE_ID_START + index), 'modify',
+                self.node_lat[index] / 10000000, self.node_lon[index] / 10000000,
+                self.node_tags.get(index)
+            ))
+
+        for index, tags in enumerate(self.way_tags):
+            nds = self.way_nds[self.way_offsets[index]:self.way_offsets[index + 1]]
+            osm_file.write(build_osm_file.render_way(-(WAY_ID_START + index), 'modify', nds, tags))
+
+        for index, tags in enumerate(self.relation_tags):
+            osm_file.write(build_osm_file.render_relation(
+                -(RELATION_ID_START + index), 'modify', self.relation_members[index], tags
+            ))
+
+        osm_file.write("</osm>\n")
+
+def get_table_fields(cursor, schema_name, table_name):
+    # Non-geometry columns, as psql_table_to_osm_structure() reads them
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = %s
+          AND table_name = %s
+          AND data_type NOT IN ('USER-DEFINED', 'geometry', 'geography')
+        ORDER BY ordinal_position;
+    """, (schema_name, table_name))
+    return [row[0] for row in cursor.fetchall()]
+
+def table_plan(cursor, schema_name, table_name, osm_config):
+    # Same rules as postgis_to_osm.plan_table, for the client engine (no staging schema):
+    # geometry column and its SRID, fields and filter of the table
+    full_table = f"{schema_name}.{table_name}"
+    cursor.execute("""
+        SELECT attname, postgis_typmod_srid(atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass
+          AND attnum > 0
+          AND NOT attisdropped
+          AND atttypid = 'geometry'::regtype
+        ORDER BY attname = %s DESC, attnum
+        LIMIT 1;
+    """, (sql.Identifier(schema_name, table_name).as_string(cursor), (osm_config.get('var_geom') or 'geom').strip()))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Table \"{full_table}\" has no geometry column.")
+    geom_column, srid = row
+
+    var_fields = (osm_config.get('var_fields') or '-').strip()
+    if var_fields == '-':
+        fields = get_table_fields(cursor, schema_name, table_name)
+    else:
+        fields = [field.strip() for field in var_fields.split(',') if field.strip()]
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s;",
+            (schema_name, table_name)
+        )
+        columns = {row[0] for row in cursor.fetchall()}
+        missing = [field for field in fields if field not in columns]
+        if missing:
+            raise ValueError(f"var_fields: no column {', '.join(missing)} in \"{full_table}\".")
+
+    filters = []
+    source_filter = (osm_config.get('source_filter') or '').strip()
+    if source_filter:
+        filters.append(sql.SQL("({})").format(sql.SQL(source_filter)))
+    bbox = (osm_config.get('bbox') or '').strip()
+    if bbox:
+        values = [float(value) for value in bbox.split(',')]
+        if len(values) != 4:
+            raise ValueError(f"bbox must be xmin,ymin,xmax,ymax, not \"{bbox}\".")
+        envelope = sql.SQL("ST_MakeEnvelope({}, 4326)").format(sql.SQL(', ').join(map(sql.Literal, values)))
+        if srid not in (0, 4326):
+            envelope = sql.SQL("ST_Transform({}, {})").format(envelope, sql.Literal(srid))
+        filters.append(sql.SQL("{} && {}").format(sql.Identifier(geom_column), envelope))
+
+    return {
+        'geom_column': geom_column,
+        'srid': srid,
+        'fields': fields,
+        'source_filter': sql.SQL(' AND ').join(filters) if filters else None,
+    }
+
+def client_convert(connection, schema_name, table_name, osm_config):
+    # Streams the planned rows of the table through a server-side cursor into a ClientConverter
+    cursor = connection.cursor()
+    plan = table_plan(cursor, schema_name, table_name, osm_config)
+    fields = plan['fields']
+    cursor.close()
+
+    # Only tables in another SRID are transformed (ST_Transform keeps rows in 4326 as they are)
+    geom = sql.Identifier(plan['geom_column'])
+    if plan['srid'] != 4326:
+        geom = sql.SQL("ST_Transform({}, 4326)").format(geom)
+    query = sql.SQL("SELECT ST_AsBinary({}){} FROM {}.{}{}").format(
+        geom,
+        sql.SQL('').join(sql.SQL(', {}::TEXT').format(sql.Identifier(f)) for f in fields),
+        sql.Identifier(schema_name),
+        sql.Identifier(table_name),
+        sql.SQL(" WHERE {}").format(plan['source_filter']) if plan['source_filter'] else sql.SQL('')
+    )
+
+    # Named (server-side) cursors only live inside a transaction
+    connection.autocommit = False
+    stream = connection.cursor(name='postgis_to_osm_client')
+    stream.itersize = int(osm_config.get('itersize') or CLIENT_ITERSIZE)
+    stream.execute(query)
+
+    converter = ClientConverter(osm_config.get('simplify_geometry_type', 'no'))
+    for row in stream:
+        if row[0] is None:
+            continue
+        tags = [[field, value] for field, value in zip(fields, row[1:]) if value is not None and value != '']
+        try:
+            converter.geometry_to_osm(decode_wkb(row[0]), tags)
+        except ValueError as error:
+            print(f"Skipping row: {error}")
+
+    stream.close()
+    connection.rollback()
+    return converter
+
+def run_client_engine(connection, schema_name, table_name, output_file_path, osm_config, metrics=None):
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = %s;",
+            (schema_name, table_name)
+        )
+        if cursor.fetchone() is None:
+            print(f"Table \"{table_name}\" does not exist in schema \"{schema_name}\".")
+            return False
+        cursor.close()
+
+        converter = client_convert(connection, schema_name, table_name, osm_config)
+        if metrics is not None and metrics.collecting:
+            metrics.record_elements(converter.element_counts())
+
+        output_file_path, compression = build_osm_file.output_compression(
+            output_file_path, osm_config.get('compression')
+        )
+        compression_threads = int(osm_config.get('compression_threads') or 1)
+        with build_osm_file.open_output(output_file_path, compression, compression_threads) as osm_file:
+            converter.write(osm_file, osm_config)
+        return True
+    except Exception as e:
+        print(f"Error running the client engine: {e}")
+        return False
+
+def run(context, schema_name, table_name, staging_schema=STAGING_SCHEMA, keep_staging=False):
+    # Stage of a run (see run_context.py); the connection is in autocommit mode
+    # (important for functions that modify data inside!)
+    osm_config = context.osm_config
+    connection = context.connection(autocommit=True)
+    cursor = connection.cursor()
+
+    if osm_config['conversion_engine'].lower() == 'client':
+        # The client engine writes the .osm file itself
+        output_file_path = build_osm_file.prepare_output_folder(context.databasename, schema_name, table_name)
+        converted = run_client_engine(
+            connection, schema_name, table_name, output_file_path, osm_config, context.metrics
+        )
+    else:
+        # The shared functions work on the tables of the staging schema of the run
+        build_environment.use_schemas(connection, staging_schema)
+        if osm_config['incremental'].lower() != 'no':
+            converted = run_incremental(cursor, schema_name, table_name, staging_schema)
+        elif osm_config['conversion_engine'].lower() == 'topology':
+            converted = run_topology(cursor, schema_name, table_name, staging_schema, keep_staging)
+        elif int(osm_config['tiles']) > 1:
+            converted = run_tiled(
+                cursor, context.connection_params, schema_name, table_name,
+                int(osm_config['tiles']), osm_config, staging_schema, keep_staging
+            )
+        else:
+            converted = run_function(
+                cursor, schema_name, table_name, int(osm_config['chunk_size']), staging_schema, keep_staging
+            )
+    #print("Closing cursor...")
+    cursor.close()
+    return converted
+
+def main(databasename_schemaname_tablename, staging_schema=STAGING_SCHEMA, keep_staging=False):
+    
+    parts = databasename_schemaname_tablename.split('.')
+
+    db_name, schema_name, table_name = parts
+    #print(f"Parsed - Database: {db_name}, Schema: {schema_name}, Table: {table_name}")
+
+    with run_context.RunContext(db_name) as context:
+        return run(context, schema_name, table_name, staging_schema, keep_staging)
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1])  # Run main if executed directly
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import sys
+from psycopg2 import sql
+
+from . import build_environment
+from . import run_context
+
+# Staging schema of the run (see build_environment.py)
+STAGING_SCHEMA = 'postgis_to_osm'
+
+def demolish_schema(conn, staging_schema=STAGING_SCHEMA):
+    cursor = conn.cursor()
+    try:
+        # SQL statement to drop the schema
+        drop_schema_sql = sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(sql.Identifier(staging_schema))
+        #print(f"Executing: {drop_schema_sql}")
+        cursor.execute(drop_schema_sql)
+        conn.commit()
+        #print("Schema 'postgis_to_osm' dropped successfully.")
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        raise RuntimeError(f"Error dropping schema: {e}") from e
+    cursor.close()
+
+def empty_schema(conn, staging_schema=STAGING_SCHEMA):
+    # keep_environment: the schema stays for the next run on the table, only the staging
+    # tables are emptied (by the shared function, on the tables of the staging schema)
+    build_environment.use_schemas(conn, staging_schema)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            sql.SQL("SELECT {}.reset_staging();").format(sql.Identifier(build_environment.function_schema_name()))
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        raise RuntimeError(f"Error emptying schema: {e}") from e
+    cursor.close()
+
+def leftover_schemas(conn):
+    # Schemas left behind by earlier runs: staging schemas (the ones with an environment
+    # table, see create_schema_and_tables.sql) and function schemas of older SQL files,
+    # staging schemas first. Staging schemas holding the state of incremental runs, or
+    # used by a run (see build_environment.lock_staging_schema), are kept
+    function_schema = build_environment.function_schema_name()
+    staging_leftovers = []
+    function_leftovers = []
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT nspname, to_regclass(format('%I.environment', nspname)) IS NOT NULL
+            FROM pg_namespace
+            WHERE left(nspname, 15) = 'postgis_to_osm_'
+            ORDER BY nspname;
+        """)
+        for schema, staging in cursor.fetchall():
+            if schema.startswith(build_environment.FUNCTION_SCHEMA_PREFIX):
+                if schema != function_schema:
+                    function_leftovers.append(schema)
+            elif staging:
+                cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {});").format(sql.Identifier(schema, 'source_rows')))
+                if not cursor.fetchone()[0]:
+                    staging_leftovers.append(schema)
+    conn.commit()
+    return staging_leftovers + function_leftovers
+
+def function_schema_in_use(conn, function_schema):
+    # A staging schema kept from a run on older SQL files still depends on the function
+    # schema of those files: the generated columns of its tables call its functions and
+    # its plans table is OF its plan type (see create_schema_and_tables.sql). Dropping
+    # that function schema with CASCADE would take those columns and tables with it
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            WITH referenced AS (
+                SELECT 'pg_proc'::regclass AS classid, oid FROM pg_proc WHERE pronamespace = %(schema)s::regnamespace
+                UNION ALL
+                SELECT 'pg_type'::regclass, oid FROM pg_type WHERE typnamespace = %(schema)s::regnamespace
+            )
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_depend AS d
+                JOIN referenced AS r ON r.classid = d.refclassid AND r.oid = d.refobjid
+                LEFT JOIN pg_attrdef AS ad ON d.classid = 'pg_attrdef'::regclass AND ad.oid = d.objid
+                JOIN pg_class AS c
+                  ON c.oid = CASE WHEN d.classid = 'pg_attrdef'::regclass THEN ad.adrelid
+                                  WHEN d.classid = 'pg_class'::regclass THEN d.objid END
+                WHERE c.relnamespace <> %(schema)s::regnamespace
+            );
+        """, {'schema': function_schema})
+        in_use = cursor.fetchone()[0]
+    conn.commit()
+    return in_use
+
+def cleanup(conn):
+    # --cleanup (see cli.py): drops the leftover schemas, returns their names.
+    # Function schemas go last, and only once no kept staging schema depends on them
+    dropped = []
+    for schema in leftover_schemas(conn):
+        if schema.startswith(build_environment.FUNCTION_SCHEMA_PREFIX):
+            if function_schema_in_use(conn, schema):
+                continue
+            demolish_schema(conn, schema)
+            dropped.append(schema)
+            continue
+        try:
+            build_environment.lock_staging_schema(conn, schema)
+        except RuntimeError:
+            continue
+        try:
+            demolish_schema(conn, schema)
+        finally:
+            build_environment.unlock_staging_schema(conn, schema)
+        dropped.append(schema)
+    return dropped
+
+def run(context, staging_schema=STAGING_SCHEMA, keep_environment=False):
+    # Stage of a run (see run_context.py), on the connection of the run. Raises
+    # RuntimeError when the schema cannot be dropped or emptied
+    conn = context.connection()
+    if keep_environment:
+        empty_schema(conn, staging_schema)
+    else:
+        demolish_schema(conn, staging_schema)
+
+def main(databasename, staging_schema=STAGING_SCHEMA, keep_environment=False):
+    #print(f"Demolishing {staging_schema} schema on {databasename}")
+    with run_context.RunContext(databasename) as context:
+        try:
+            run(context, staging_schema, keep_environment)
+        except RuntimeError as error:
+            print(error)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1])  # Run main if executed directly
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import shutil
+from psycopg2 import sql
+
+from . import build_osm_file
+from . import convert_table_to_osm_structure
+
+# Rows of the source table profiled by the estimate (a TABLESAMPLE of about that many rows)
+SAMPLE_ROWS = 2000
+
+# Same sample on every estimate of an unchanged table
+SAMPLE_SEED = 42
+
+# Compressed size / XML size, as measured on OSM XML files (ids and tags compress well)
+COMPRESSION_RATIOS = {
+    'gz': 0.12,
+    'bz2': 0.08,
+    'xz': 0.07,
+}
+
+# Bytes per element in .osm.pbf (zlib blocks, delta coded ids, coordinates and nd refs)
+PBF_BYTES = {
+    'nodes': 5.0,
+    'ways': 4.0,
+    'relations': 6.0,
+    'nd_refs': 1.5,
+    'members': 3.0,
+}
+# Share of the tag text left in .osm.pbf (string tables, zlib)
+PBF_TAG_RATIO = 0.25
+
+# Source vertices converted per second, by conversion engine (rough, single process)
+CONVERT_RATES = {
+    'row': 15000,
+    'set': 60000,
+    'client': 250000,
+    'topology': 5000,
+}
+
+# Elements written per second by build_osm_file, and XML bytes compressed per second and thread
+WRITE_RATES = {
+    'xml': 200000,
+    'pbf': 300000,
+}
+COMPRESSION_RATES = {
+    'gz': 50 * 1024 * 1024,
+    'bz2': 10 * 1024 * 1024,
+    'xz': 5 * 1024 * 1024,
+}
+
+ELEMENT_KEYS = ('nodes', 'ways', 'relations', 'nd_refs', 'members', 'tags', 'tag_bytes')
+
+def row_elements(geom_type, points, parts, rings, simplify):
+    # Elements one source row makes before deduplication, by the rules of geometry_to_osm
+    # (see ClientConverter): closed rings share their first and last node, polygons with
+    # holes and multi geometries become relations
+    if simplify and parts == 1 and geom_type in convert_table_to_osm_structure.SIMPLIFIED_TYPES:
+        geom_type = convert_table_to_osm_structure.SIMPLIFIED_TYPES[geom_type]
+
+    elements = dict.fromkeys(('nodes', 'ways', 'relations', 'nd_refs', 'members'), 0)
+    if geom_type == 'ST_Point':
+        elements['nodes'] = 1
+    elif geom_type == 'ST_LineString':
+        elements.update(nodes=points, ways=1, nd_refs=points)
+    elif geom_type == 'ST_Polygon' and rings <= 1:
+        elements.update(nodes=points - 1, ways=1, nd_refs=points)
+    elif geom_type in ('ST_Polygon', 'ST_MultiPolygon'):
+        elements.update(nodes=points - rings, ways=rings, nd_refs=points, relations=1, members=rings)
+    elif geom_type == 'ST_MultiPoint':
+        elements.update(nodes=points, relations=1, members=parts)
+    elif geom_type == 'ST_MultiLineString':
+        elements.update(nodes=points, ways=parts, nd_refs=points, relations=1, members=parts)
+    elif geom_type == 'ST_GeometryCollection':
+        # Parts are not profiled one by one: points when there is a vertex per part, ways otherwise
+        if points <= parts:
+            elements.update(nodes=points, relations=1, members=parts)
+        else:
+            elements.update(nodes=points, ways=parts, nd_refs=points, relations=1, members=parts)
+    return elements
+
+def tag_expressions(fields):
+    # Tags of a row and their text (key and value), for the fields that have a value
+    if not fields:
+        return sql.SQL("0"), sql.SQL("0")
+    values = [sql.SQL("NULLIF({}::TEXT, '')").format(sql.Identifier(field)) for field in fields]
+    count = sql.SQL(" + ").join(
+        sql.SQL("({} IS NOT NULL)::INT").format(value) for value in values
+    )
+    size = sql.SQL(" + ").join(
+        sql.SQL("COALESCE(octet_length({}) + {}, 0)").format(value, sql.Literal(len(field.encode('utf-8'))))
+        for field, value in zip(fields, values)
+    )
+    return count, size
+
+def sample_profile(cursor, schema_name, table_name, plan, table_rows):
+    # Geometry type, vertices, parts, rings and tags of a sample of the planned rows, and the
+    # share of distinct vertices in it (vertices shared by neighbouring rows become one node)
+    geom = sql.Identifier(plan['geom_column'])
+    if plan['srid'] != 4326:
+        geom = sql.SQL("ST_Transform({}, 4326)").format(geom)
+    tag_count, tag_bytes = tag_expressions(plan['fields'])
+
+    if plan['source_filter'] is not None:
+        # The filter (source_filter, bbox) reads its rows through an index, not a sample of pages
+        source = sql.SQL("{} WHERE {}").format(sql.Identifier(schema_name, table_name), plan['source_filter'])
+    else:
+        percent = min(100.0, max(0.0001, SAMPLE_ROWS * 100.0 / max(table_rows, 1)))
+        source = sql.SQL("{} TABLESAMPLE SYSTEM ({}) REPEATABLE ({})").format(
+            sql.Identifier(schema_name, table_name), sql.Literal(percent), sql.Literal(SAMPLE_SEED)
+        )
+
+    cursor.execute(sql.SQL("""
+        WITH sample AS MATERIALIZED (
+            SELECT {geom} AS g, {tag_count} AS tag_count, {tag_bytes} AS tag_bytes
+            FROM {source}
+            LIMIT {limit}
+        ),
+        -- Vertices as row_elements counts them (the closing point of a polygon ring is its
+        -- first point again, and no node of its own), and the distinct ones among them
+        vertices AS (
+            SELECT (
+                       SELECT sum(ST_NPoints(g) - CASE
+                                  WHEN ST_GeometryType(g) IN ('ST_Polygon', 'ST_MultiPolygon') THEN ST_NRings(g)
+                                  ELSE 0
+                              END)::BIGINT
+                       FROM sample
+                   ) AS total,
+                   count(DISTINCT (round(ST_X(d.geom)::NUMERIC, 7), round(ST_Y(d.geom)::NUMERIC, 7))) AS distinct_vertices
+            FROM sample
+            CROSS JOIN LATERAL ST_DumpPoints(g) AS d
+        )
+        SELECT ST_GeometryType(g),
+               ST_NPoints(g),
+               ST_NumGeometries(g),
+               CASE WHEN ST_GeometryType(g) IN ('ST_Polygon', 'ST_MultiPolygon') THEN ST_NRings(g) ELSE 0 END,
+               tag_count,
+               tag_bytes,
+               v.total,
+               v.distinct_vertices
+        FROM sample
+        CROSS JOIN vertices AS v
+        WHERE g IS NOT NULL AND NOT ST_IsEmpty(g);
+    """).format(
+        geom=geom, tag_count=tag_count, tag_bytes=tag_bytes, source=source, limit=sql.Literal(SAMPLE_ROWS)
+    ))
+    return cursor.fetchall()
+
+def estimate_table(cursor, schema_name, table_name, osm_config):
+    # Elements of a table: the averages of the sample, times the rows the planner expects
+    plan = convert_table_to_osm_structure.table_plan(cursor, schema_name, table_name, osm_config)
+    table_rows = convert_table_to_osm_structure.estimate_row_count(cursor, schema_name, table_name)
+    rows = table_rows
+    if plan['source_filter'] is not None:
+        rows = convert_table_to_osm_structure.estimate_row_count(
+            cursor, schema_name, table_name, plan['source_filter'].as_string(cursor)
+        )
+
+    sample = sample_profile(cursor, schema_name, table_name, plan, table_rows)
+    simplify = str(osm_config.get('simplify_geometry_type', 'no')).lower() == 'yes'
+
+    totals = dict.fromkeys(ELEMENT_KEYS, 0)
+    geometry_types = {}
+    vertices = 0
+    tagged_points = 0
+    for geom_type, points, parts, rings, tag_count, tag_bytes, total, distinct_vertices in sample:
+        elements = row_elements(geom_type, points, parts, rings, simplify)
+        if elements['relations']:
+            # type=multipolygon / type=collection
+            tag_count += 1
+            tag_bytes += len('type') + len(
+                'multipolygon' if geom_type in ('ST_Polygon', 'ST_MultiPolygon') else 'collection'
+            )
+        for key, value in elements.items():
+            totals[key] += value
+        totals['tags'] += tag_count
+        totals['tag_bytes'] += tag_bytes
+        if geom_type == 'ST_Point' and tag_count:
+            # Tagged nodes are only merged with nodes of the same tags
+            tagged_points += 1
+        geometry_types[geom_type] = geometry_types.get(geom_type, 0) + 1
+        vertices += points
+
+    sampled = len(sample)
+    # Same total and distinct vertices on every row (see sample_profile). Ring closing
+    # points count in neither: row_elements already leaves them out of the nodes
+    shared_ratio = min(1.0, sample[0][7] / sample[0][6]) if sample and sample[0][6] else 1.0
+    scale = rows / sampled if sampled else 0.0
+    elements = {key: round(value * scale) for key, value in totals.items()}
+    # Shared vertices: the sample only sees the neighbours on the same pages, so nodes
+    # stay an upper bound for tables of adjacent geometries
+    untagged_nodes = max(0, totals['nodes'] - tagged_points)
+    elements['nodes'] = round((tagged_points + untagged_nodes * shared_ratio) * scale)
+    elements['tagged_nodes'] = round(tagged_points * scale)
+
+    return {
+        'table': f"{schema_name}.{table_name}",
+        'rows': rows,
+        'sampled_rows': sampled,
+        'geometry_types': {
+            geom_type: round(count / sampled, 4) for geom_type, count in sorted(geometry_types.items())
+        },
+        'vertices': round(vertices * scale),
+        'shared_vertex_ratio': round(1.0 - shared_ratio, 4),
+        'elements': elements,
+    }
+
+def output_sizes(elements, osm_config):
+    # Bytes of the output file in every format and compression
+    sizes = build_osm_file.xml_sizes(osm_config)
+    xml = sizes['file'] + sizes['tags'] * elements['tags'] + elements['tag_bytes']
+    xml += sizes['tagged_nodes'] * elements['tagged_nodes']
+    for key in ('nodes', 'ways', 'relations', 'nd_refs', 'members'):
+        xml += sizes[key] * elements[key]
+
+    pbf = elements['tag_bytes'] * PBF_TAG_RATIO
+    for key, size in PBF_BYTES.items():
+        pbf += size * elements[key]
+
+    output = {'xml': round(xml)}
+    for compression, ratio in COMPRESSION_RATIOS.items():
+        output[f"xml.{compression}"] = round(xml * ratio)
+    output['pbf'] = round(pbf)
+    return output
+
+def configured_format(osm_config):
+    # Key of output_sizes() for the file the configuration writes (see output_file_name)
+    if (osm_config.get('output_format') or build_osm_file.DEFAULT_OUTPUT_FORMAT) == 'pbf':
+        return 'pbf'
+    compression = osm_config.get('compression')
+    return f"xml.{compression}" if compression in COMPRESSION_RATIOS else 'xml'
+
+def runtime(vertices, elements, output, osm_config):
+    # Seconds of the conversion and of the writing, at the rates above
+    engine = (osm_config.get('conversion_engine') or 'row').lower()
+    convert = vertices / CONVERT_RATES.get(engine, CONVERT_RATES['row'])
+    tiles = int(osm_config.get('tiles') or 1)
+    if engine in ('row', 'set') and tiles > 1:
+        # Tiles are converted by processes of their own
+        convert /= tiles
+
+    output_format = configured_format(osm_config)
+    written = sum(elements[key] for key in ('nodes', 'ways', 'relations'))
+    write = written / WRITE_RATES['pbf' if output_format == 'pbf' else 'xml']
+    compression = output_format.split('.')[1] if '.' in output_format else None
+    if compression:
+        threads = int(osm_config.get('compression_threads') or 1) if compression == 'gz' else 1
+        write += output['xml'] / (COMPRESSION_RATES[compression] * threads)
+    return {'convert': round(convert, 1), 'write': round(write, 1), 'total': round(convert + write, 1)}
+
+def free_bytes(path):
+    # Free space of the disk of the output folder (or of its first existing parent)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+def run(context, tables, output_name=None):
+    # Estimate of a run on the tables, without the staging schema: only the catalog,
+    # the planner and a sample of every table are read. output_name: combined batch file
+    osm_config = context.osm_config
+    connection = context.connection()
+    estimates = []
+    with connection.cursor() as cursor:
+        for schema_name, table_name in tables:
+            estimates.append(estimate_table(cursor, schema_name, table_name, osm_config))
+    connection.rollback()
+
+    for estimate in estimates:
+        estimate['output_bytes'] = output_sizes(estimate['elements'], osm_config)
+        estimate['seconds'] = runtime(estimate['vertices'], estimate['elements'], estimate['output_bytes'], osm_config)
+
+    # Combined output (batch): one file for all the tables
+    if output_name or len(estimates) == 1:
+        files = [output_name or estimates[0]['table']]
+        elements = {key: sum(e['elements'][key] for e in estimates) for key in estimates[0]['elements']}
+        output = output_sizes(elements, osm_config)
+    else:
+        files = [e['table'] for e in estimates]
+        elements = None
+        output = {key: sum(e['output_bytes'][key] for e in estimates) for key in estimates[0]['output_bytes']}
+
+    output_format = configured_format(osm_config)
+    output_folder = os.path.join(os.getcwd(), 'databases', context.databasename)
+    disk_free = free_bytes(output_folder)
+    return {
+        'database': context.databasename,
+        'estimated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'files': files,
+        'output_format': output_format,
+        'output_bytes': output[output_format],
+        'seconds': round(sum(e['seconds']['total'] for e in estimates), 1),
+        'disk_free_bytes': disk_free,
+        'fits': output[output_format] < disk_free,
+        'elements': elements or {
+            key: sum(e['elements'][key] for e in estimates) for key in estimates[0]['elements']
+        },
+        'tables': estimates,
+    }
+
+def print_estimate(estimate):
+    # JSON on stdout, for the schedulers
+    print(json.dumps(estimate, indent=2))
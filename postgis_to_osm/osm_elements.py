@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import collections
+from psycopg2 import sql
+
+from . import build_environment
+from . import build_osm_file
+from . import convert_table_to_osm_structure
+from . import demolish_environment
+from . import run_context
+from . import update_table_config
+
+# Elements yielded by elements(), in file order: every node, then every way, then every
+# relation. IDs are negative (new elements), coordinates in degrees and tags a tuple of
+# (key, value) pairs, empty ones left out as in the .osm file.
+#   Node(id=-10000001, lat=-29.68, lon=-53.80, tags=(('amenity', 'school'),))
+#   Way(id=-10001, nds=(-10000001, -10000002, ...), tags=(('highway', 'primary'),))
+#   Relation(id=-101, members=(('way', -10001, 'outer'), ...), tags=(('type', 'multipolygon'),))
+Node = collections.namedtuple('Node', ['id', 'lat', 'lon', 'tags'])
+Way = collections.namedtuple('Way', ['id', 'nds', 'tags'])
+Relation = collections.namedtuple('Relation', ['id', 'members', 'tags'])
+
+def element_tags(tags):
+    # Staging tags are [key, value] pairs; members get [['', '']] (see MEMBER_TAGS)
+    return tuple(
+        (tag_pair[0], tag_pair[1])
+        for tag_pair in tags or ()
+        if tag_pair and len(tag_pair) == 2 and tag_pair[0] and tag_pair[1]
+    )
+
+def parse_table(table):
+    # 'schema.table' or (schema, table)
+    if isinstance(table, str):
+        parts = table.split('.')
+        if len(parts) != 2:
+            raise ValueError(f"Invalid table \"{table}\": use schemaname.tablename")
+        return parts[0], parts[1]
+    schema_name, table_name = table
+    return schema_name, table_name
+
+def run_config(osm_config=None, config=None):
+    # my_preferences.config (or the config given), with the osm_config settings on top
+    config = config if config is not None else update_table_config.load_config()
+    if osm_config:
+        if 'osm_file_config' not in config:
+            config['osm_file_config'] = {}
+        for key, value in osm_config.items():
+            config['osm_file_config'][key] = str(value)
+    return config
+
+def staged_elements(connection, staging_schema, itersize):
+    # Elements of the staging tables, streamed itersize rows at a time (see build_osm_file.py)
+    cursor = connection.cursor()
+    cursor.execute(
+        sql.SQL("SELECT {}.create_staging_indexes();").format(sql.Identifier(build_environment.function_schema_name()))
+    )
+    connection.commit()
+
+    for id_, action, lat, lon, tags in build_osm_file.staged_rows(cursor, staging_schema, 'nodes', itersize):
+        yield Node(
+            id_, lat / build_osm_file.COORDINATE_SCALE, lon / build_osm_file.COORDINATE_SCALE, element_tags(tags)
+        )
+    for id_, action, nds, tags in build_osm_file.staged_rows(cursor, staging_schema, 'ways', itersize):
+        yield Way(id_, tuple(nds or ()), element_tags(tags))
+    for id_, action, member_types, member_refs, member_roles, tags in build_osm_file.staged_rows(
+            cursor, staging_schema, 'relations', itersize):
+        yield Relation(
+            id_, tuple(build_osm_file.staging_members(member_types, member_refs, member_roles)), element_tags(tags)
+        )
+
+    cursor.close()
+    # End the read transaction (see build_osm_file.run)
+    connection.commit()
+
+def converter_elements(converter):
+    # Elements of a ClientConverter (conversion_engine = client), in the order it writes them
+    for index in range(len(converter.node_lat)):
+        yield Node(
+            -(convert_table_to_osm_structure.NODE_ID_START + index),
+            converter.node_lat[index] / build_osm_file.COORDINATE_SCALE,
+            converter.node_lon[index] / build_osm_file.COORDINATE_SCALE,
+            element_tags(converter.node_tags.get(index))
+        )
+    for index, tags in enumerate(converter.way_tags):
+        nds = converter.way_nds[converter.way_offsets[index]:converter.way_offsets[index + 1]]
+        yield Way(-(convert_table_to_osm_structure.WAY_ID_START + index), tuple(nds), element_tags(tags))
+    for index, tags in enumerate(converter.relation_tags):
+        yield Relation(
+            -(convert_table_to_osm_structure.RELATION_ID_START + index),
+            tuple(converter.relation_members[index]),
+            element_tags(tags)
+        )
+
+def elements(connection, table, osm_config=None, config=None):
+    # Converts a table on the connection of the caller and yields its elements instead of
+    # writing a file (see postgis_to_osm.elements). The stages run as in a run of the
+    # command line, in the staging schema of the table, which is demolished (or emptied,
+    # keep_environment) once the generator is done or closed. conversion_engine = client
+    # converts in memory, without staging schema. The connection is left open, in its
+    # autocommit mode and its search_path
+    schema_name, table_name = parse_table(table)
+    autocommit = connection.autocommit
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('search_path');")
+        search_path = cursor.fetchone()[0]
+    connection.commit()
+    context = run_context.RunContext(connection.info.dbname, run_config(osm_config, config), connection)
+    osm_config = context.osm_config
+    staging_schema = None
+    converted = False
+    try:
+        if osm_config['conversion_engine'].lower() == 'client':
+            converter = convert_table_to_osm_structure.client_convert(
+                connection, schema_name, table_name, osm_config
+            )
+            yield from converter_elements(converter)
+            return
+
+        staging_schema = build_environment.staging_schema_name(schema_name, table_name)
+        build_environment.run(context, staging_schema)
+        update_table_config.run(context, staging_schema)
+        converted = convert_table_to_osm_structure.run(context, schema_name, table_name, staging_schema)
+        if not converted:
+            # The staging schema is kept: the next call resumes the conversion
+            raise RuntimeError(f"Conversion of {schema_name}.{table_name} failed")
+
+        # Named (server-side) cursors only live inside a transaction
+        yield from staged_elements(
+            context.connection(), staging_schema, int(osm_config['itersize'] or build_osm_file.DEFAULT_ITERSIZE)
+        )
+    finally:
+        if not connection.closed:
+            # Ends the read transaction of a generator closed before its last element
+            connection.rollback()
+            if converted and osm_config['incremental'].lower() == 'no':
+                demolish_environment.run(
+                    context, staging_schema, osm_config['keep_environment'].lower() in ('yes', 'true')
+                )
+                connection.commit()
+            if staging_schema is not None:
+                # The connection outlives the conversion (see build_environment.lock_staging_schema)
+                build_environment.unlock_staging_schema(connection, staging_schema)
+            # The stages point the search_path at the staging schema (see build_environment.use_schemas)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('search_path', %s, FALSE);", (search_path,))
+            connection.commit()
+            connection.autocommit = autocommit
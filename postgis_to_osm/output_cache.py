@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import math
+import os
+import shutil
+from psycopg2 import sql
+
+# Cache of the output files (config: [cache]), next to them in databases/.cache: one
+# folder per key, holding the files of the run by name
+CACHE_FOLDER = '.cache'
+
+# Size of the cache (config: max_size_mb); the least recently used entries go first
+DEFAULT_MAX_SIZE_MB = 1024
+
+# How the source tables are fingerprinted (config: fingerprint): 'stats' reads the
+# statistics counters of the server, 'scan' reads every row (see table_fingerprint)
+DEFAULT_FINGERPRINT = 'stats'
+
+# Files the output depends on besides the data and the config: the SQL functions and
+# the Python writers
+CODE_FOLDERS = ['sql', '.']
+
+def cache_folder():
+    # databases/.cache, under the same folder as the output files (see prepare_output_folder)
+    return os.path.join(os.getcwd(), 'databases', CACHE_FOLDER)
+
+def code_version():
+    # Hash of the .sql and .py files of the package: a new version of the functions
+    # makes a new key, whatever the data
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for folder in CODE_FOLDERS:
+        folder_path = os.path.join(code_dir, folder)
+        for name in sorted(os.listdir(folder_path)):
+            if not name.endswith(('.sql', '.py')):
+                continue
+            digest.update(f"{folder}/{name}\0".encode('utf-8'))
+            with open(os.path.join(folder_path, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def table_fingerprint(cursor, schema_name, table_name, fingerprint=DEFAULT_FINGERPRINT):
+    # Fingerprint of the content of a table, plus its column definitions.
+    #   stats: the rows inserted, updated and deleted since the statistics were reset
+    #          (pg_stat_user_tables) and the file of the table (pg_class), which TRUNCATE,
+    #          VACUUM FULL and CLUSTER replace. Reads no row: a few catalog lookups
+    #   scan:  row count and sum/max of the xmin of the rows (any INSERT, UPDATE or DELETE
+    #          changes them), in a scan of the whole table that reads no geometry. Also
+    #          sees changes the statistics miss (a reset, counters not sent yet)
+    table = sql.Identifier(schema_name, table_name)
+    if fingerprint == 'scan':
+        cursor.execute(sql.SQL(
+            "SELECT count(*), sum(xmin::TEXT::BIGINT), max(xmin::TEXT::BIGINT) FROM {};"
+        ).format(table))
+        content = [str(value) for value in cursor.fetchone()]
+    else:
+        cursor.execute("""
+            SELECT c.oid, c.relfilenode, c.reltuples, s.n_tup_ins, s.n_tup_upd, s.n_tup_del, s.n_live_tup
+            FROM pg_class AS c
+            LEFT JOIN pg_stat_user_tables AS s ON s.relid = c.oid
+            WHERE c.oid = %s::regclass;
+        """, (table.as_string(cursor),))
+        content = [str(value) for value in cursor.fetchone()]
+    cursor.execute("""
+        SELECT string_agg(attname || ' ' || format_type(atttypid, atttypmod), ', ' ORDER BY attnum)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped;
+    """, (table.as_string(cursor),))
+    columns = cursor.fetchone()[0]
+    return [fingerprint] + content + [columns]
+
+def cache_key(cursor, host, database_name, tables, osm_config, output_name=None, fingerprint=DEFAULT_FINGERPRINT):
+    # Content address of a run: source fingerprints, effective [osm_file_config] and code version
+    key = {
+        'source': [
+            [host, database_name, schema_name, table_name,
+             table_fingerprint(cursor, schema_name, table_name, fingerprint)]
+            for schema_name, table_name in tables
+        ],
+        'config': osm_config,
+        'code': code_version(),
+        'output_name': output_name,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+def link_file(source_path, target_path):
+    # Hard link (no copy) when both are on the same file system
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+def restore(key, output_file_paths):
+    # Cache hit: link the cached files in place of the output files
+    entry = os.path.join(cache_folder(), key)
+    cached_paths = [os.path.join(entry, os.path.basename(path)) for path in output_file_paths]
+    if not all(os.path.isfile(path) for path in cached_paths):
+        return False
+    for cached_path, output_file_path in zip(cached_paths, output_file_paths):
+        link_file(cached_path, output_file_path)
+    # Most recently used
+    os.utime(entry)
+    return True
+
+def detach(output_file_paths):
+    # An output file linked to the cache would be overwritten in place by the next run,
+    # changing the cached file too: unlink it first
+    for output_file_path in output_file_paths:
+        if os.path.isfile(output_file_path) and os.stat(output_file_path).st_nlink > 1:
+            os.remove(output_file_path)
+
+def entry_size(entry):
+    return sum(
+        os.path.getsize(os.path.join(entry, name))
+        for name in os.listdir(entry)
+        if os.path.isfile(os.path.join(entry, name))
+    )
+
+def evict(max_size):
+    # Remove the least recently used entries until the cache fits in max_size bytes
+    folder = cache_folder()
+    entries = [os.path.join(folder, name) for name in os.listdir(folder)]
+    entries = sorted((path for path in entries if os.path.isdir(path)), key=os.path.getmtime)
+    sizes = {entry: entry_size(entry) for entry in entries}
+    total = sum(sizes.values())
+    for entry in entries:
+        if total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+
+def store(key, output_file_paths, max_size_mb=DEFAULT_MAX_SIZE_MB, started=None):
+    # Keep the output files of a run under its key. Only files the run wrote are cached:
+    # a missing file, or one left by an earlier run (modified before started, the time
+    # the run began), means the run did not write it
+    if not all(os.path.isfile(path) for path in output_file_paths):
+        return
+    if started is not None and any(
+        # Whole seconds: some file systems keep the mtime to the second
+        os.path.getmtime(path) < math.floor(started) for path in output_file_paths
+    ):
+        return
+    entry = os.path.join(cache_folder(), key)
+    os.makedirs(entry, exist_ok=True)
+    for output_file_path in output_file_paths:
+        link_file(output_file_path, os.path.join(entry, os.path.basename(output_file_path)))
+    evict(max_size_mb * 1024 * 1024)
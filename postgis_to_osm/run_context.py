@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+from . import run_metrics
+from . import update_table_config
+
+class DatabaseConnectionError(RuntimeError):
+    # The database of a run cannot be reached. A RuntimeError like the other failures of a
+    # stage: the command line prints it and exits (see cli.main), callers of the API
+    # (see osm_elements.py) get it raised
+    pass
+
+class RunContext:
+    # What the stages of a run share (see cli.execute_scripts): my_preferences.config,
+    # parsed once, and a single database connection, opened on first use and closed with the run.
+    # connection: a connection of the caller (see osm_elements.py), used as it is and left open
+    def __init__(self, databasename, config=None, connection=None):
+        self.databasename = databasename
+        self.config = config if config is not None else update_table_config.load_config()
+        self.osm_config = update_table_config.get_osm_file_config(self.config)
+        server = self.config['server_connection'] if 'server_connection' in self.config else {}
+        # For the processes of a run (tiles, parallel writers), which need connections of their own
+        self.connection_params = (server.get('host'), server.get('user'), server.get('password'), databasename)
+        self._connection = connection
+        self._own_connection = connection is None
+        # Stage times, element counts and function statistics of the run (see run_metrics.py)
+        self.metrics = run_metrics.RunMetrics(self.osm_config)
+
+    def connection(self, autocommit=False):
+        # The shared connection, in the transaction mode the stage expects: autocommit for the
+        # conversion (every chunk commits on its own), transactions elsewhere
+        if self._connection is None or self._connection.closed:
+            try:
+                self._connection = update_table_config.connect_database(self.config, self.databasename)
+                self._own_connection = True
+            except Exception as e:
+                raise DatabaseConnectionError(f"Failed to connect to database '{self.databasename}': {e}") from e
+            self.metrics.setup_connection(self._connection)
+        if self._connection.autocommit != autocommit:
+            # The mode can only change between transactions; every stage commits its work
+            self._connection.commit()
+            self._connection.autocommit = autocommit
+        return self._connection
+
+    def close(self):
+        if self._own_connection and self._connection is not None and not self._connection.closed:
+            self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import contextlib
+import datetime
+import json
+import os
+import resource
+import time
+from psycopg2 import sql
+
+from . import build_environment
+
+# How much a run prints (config: verbosity):
+#   0: errors only
+#   1: progress of the conversion (default)
+#   2: also the time of every stage and the element counts
+#   3: also the NOTICE messages of the database functions
+DEFAULT_VERBOSITY = 1
+
+# Set by RunMetrics for the whole run: modules print their progress through log()
+VERBOSITY = DEFAULT_VERBOSITY
+
+def log(message, level=1):
+    if VERBOSITY >= level:
+        print(message, flush=True)
+
+def enabled(value):
+    return str(value).lower() in ('yes', 'true')
+
+# Written to /proc/self/clear_refs, resets the peak RSS (VmHWM) of the process (Linux 4.0+)
+CLEAR_PEAK_RSS = '5'
+
+def reset_peak_rss():
+    # Starts measuring the peak RSS of a stage (see stage_peak_rss_kb). False where it
+    # cannot be reset (not Linux, older kernels): only the peak of the whole process is
+    # known there (ru_maxrss). A reset also lowers ru_maxrss, so the peak of a run is the
+    # largest of the peaks of its stages
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write(CLEAR_PEAK_RSS)
+    except OSError:
+        return False
+    return True
+
+def stage_peak_rss_kb():
+    # Peak RSS of the process since reset_peak_rss, in KB
+    with open('/proc/self/status', encoding='ascii') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return None
+
+def report_file_path(output_file_path):
+    # <schema>.<table>.metrics.json next to <schema>.<table>.osm (see prepare_output_folder)
+    return os.path.splitext(output_file_path)[0] + '.metrics.json'
+
+class RunMetrics:
+    # What a run measures (config: verbosity, metrics_report, function_stats): the time and
+    # peak RSS of every stage, the nodes, ways and relations created and used, and the
+    # calls of the postgis_to_osm.* functions from the statistics of the server
+    def __init__(self, osm_config):
+        global VERBOSITY
+        VERBOSITY = int(osm_config.get('verbosity') or DEFAULT_VERBOSITY)
+        self.verbosity = VERBOSITY
+        self.report = enabled(osm_config.get('metrics_report', 'no'))
+        self.function_stats = enabled(osm_config.get('function_stats', 'no'))
+        self.started_at = datetime.datetime.now()
+        self.started = time.monotonic()
+        self.stages = {}
+        self.peak_rss_kb = 0
+        self.elements = {}
+        self.functions = None
+        self.notes = []
+        self._function_baseline = {}
+        # Called after every stage that went through (see add_stage_listener)
+        self._stage_listeners = []
+
+    def add_stage_listener(self, listener):
+        # listener(name, measured): measured is the time and peak RSS of that one call of the
+        # stage ({'seconds': ..., 'peak_rss_kb': ...}, see stage), where self.stages adds up
+        # the calls of a batch. Called once the stage is done, before the next one starts
+        # (see benchmark.py)
+        self._stage_listeners.append(listener)
+
+    @property
+    def collecting(self):
+        # Element counts cost a scan of the staging tables: only when someone reads them
+        return self.report or self.verbosity >= 2
+
+    def setup_connection(self, connection):
+        # Session settings of the run connection: server messages and function statistics
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('client_min_messages', %s, FALSE);",
+                ('notice' if self.verbosity >= 3 else 'warning',)
+            )
+        connection.commit()
+        if not self.function_stats:
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET track_functions = 'pl';")
+            connection.commit()
+        except Exception as e:
+            # Only superusers may change it: the server setting applies
+            connection.rollback()
+            self.notes.append(f"track_functions not set for the run ({str(e).strip()}), the server setting applies")
+
+    @contextlib.contextmanager
+    def stage(self, name, connection=None):
+        # Times a stage of the run (see cli.run_scripts) and measures its peak
+        # RSS (None where it cannot be measured per stage, see reset_peak_rss)
+        log(f"{name}: started", 2)
+        measured = reset_peak_rss()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - started
+            previous = self.stages.get(name, {})
+            stage_peak = stage_peak_rss_kb() if measured else None
+            peak = stage_peak
+            if peak is not None:
+                self.peak_rss_kb = max(self.peak_rss_kb, peak)
+                # A stage run once per table of a batch: the largest of its peaks
+                peak = max(peak, previous.get('peak_rss_kb') or 0)
+            self.stages[name] = {
+                'seconds': round(previous.get('seconds', 0) + seconds, 3),
+                'peak_rss_kb': peak,
+            }
+            log(f"{name}: {seconds:.2f}s", 2)
+            if connection is not None and self.verbosity >= 3:
+                for notice in connection.notices:
+                    print(notice.strip())
+                del connection.notices[:]
+        for listener in self._stage_listeners:
+            listener(name, {'seconds': round(seconds, 3), 'peak_rss_kb': stage_peak})
+
+    def record_elements(self, elements):
+        # {'nodes': {'created': ..., 'used': ..., 'extra_uses': ...}, 'ways': ..., 'relations': ...}
+        # extra_uses (used - created) is inferred from the staging tables, not counted by the
+        # conversion: it approximates what deduplication saved (see staging_element_counts)
+        for element_type, counts in elements.items():
+            total = self.elements.setdefault(element_type, {'created': 0, 'used': 0, 'extra_uses': 0})
+            for key in total:
+                total[key] += counts[key]
+            log(
+                f"{element_type}: {counts['created']} created, {counts['used']} uses "
+                f"(~{counts['extra_uses']} deduplicated)", 2
+            )
+
+    def collect_elements(self, connection, staging_schema):
+        # Created and used elements of the staging tables (see staging_element_counts)
+        if not self.collecting:
+            return
+        build_environment.use_schemas(connection, staging_schema)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("SELECT * FROM {}.staging_element_counts();").format(
+                    sql.Identifier(build_environment.function_schema_name())
+                )
+            )
+            rows = cursor.fetchall()
+        connection.commit()
+        self.record_elements({
+            element_type: {'created': created, 'used': used, 'extra_uses': used - created}
+            for element_type, created, used in rows
+        })
+
+    def function_snapshot(self, connection, staging_schema):
+        # Calls and times of the postgis_to_osm functions so far (pg_stat_user_functions). They
+        # live in the function schema every run shares: runs at the same time count together
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot();")
+            cursor.execute("""
+                SELECT funcname, calls, total_time, self_time
+                FROM pg_stat_user_functions
+                WHERE schemaname = %s;
+            """, (build_environment.function_schema_name(),))
+            rows = cursor.fetchall()
+        connection.commit()
+        return {name: (calls, total_time, self_time) for name, calls, total_time, self_time in rows}
+
+    def start_functions(self, connection, staging_schema):
+        # Statistics are cumulative: the ones of the run are the difference with this baseline
+        if self.function_stats:
+            self._function_baseline = self.function_snapshot(connection, staging_schema)
+
+    def collect_functions(self, connection, staging_schema):
+        if not self.function_stats:
+            return
+        # Statistics reach the server at the end of a transaction, at most once a second
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regprocedure('pg_stat_force_next_flush()') IS NOT NULL;")
+            if cursor.fetchone()[0]:
+                cursor.execute("SELECT pg_stat_force_next_flush();")
+        connection.commit()
+
+        functions = self.functions or {}
+        for name, (calls, total_time, self_time) in self.function_snapshot(connection, staging_schema).items():
+            base_calls, base_total, base_self = self._function_baseline.get(name, (0, 0.0, 0.0))
+            if calls - base_calls <= 0:
+                continue
+            function = functions.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'self_ms': 0.0})
+            function['calls'] += calls - base_calls
+            function['total_ms'] = round(function['total_ms'] + total_time - base_total, 3)
+            function['self_ms'] = round(function['self_ms'] + self_time - base_self, 3)
+        if not functions:
+            self.notes.append("no function statistics: track_functions is off on the server")
+        self.functions = functions
+
+    def write_report(self, output_file_path, tables):
+        # JSON report next to the output file (config: metrics_report)
+        seconds = time.monotonic() - self.started
+        log(f"Run: {seconds:.2f}s", 2)
+        if not self.report:
+            return
+        report_path = report_file_path(output_file_path)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'tables': [f"{schemaname}.{tablename}" for schemaname, tablename in tables],
+                'output': os.path.basename(output_file_path),
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'seconds': round(seconds, 3),
+                'peak_rss_kb': max(self.peak_rss_kb, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+                'stages': self.stages,
+                'elements': self.elements,
+                'functions': self.functions,
+                'notes': self.notes,
+            }, f, indent=2)
+        log(f"Metrics written to {report_path}", 1)
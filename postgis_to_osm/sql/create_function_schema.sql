@@ -0,0 +1,91 @@
+-- Function bundle: extensions and the functions every staging schema shares
+-- build_environment.py installs this file and the function.*.sql files once per version
+-- of the SQL files, into a schema of their own (postgis_to_osm_functions_<hash>), and
+-- create_schema_and_tables.sql into the staging schema of every run. References to
+-- staging tables in the functions are left unqualified: they are found through the
+-- search_path of the run, which starts with its staging schema (see use_schemas). The
+-- functions a run calls check that it does (staging_schema), so that a name never falls
+-- through to a table of the user; objects that may be missing (indexes) are qualified
+
+-- Create extensions
+CREATE EXTENSION IF NOT EXISTS postgis; 
+CREATE EXTENSION IF NOT EXISTS postgis_topology; 
+
+-- Create SCHEMA of the functions
+CREATE SCHEMA IF NOT EXISTS postgis_to_osm;
+
+-- Create FUNCTIONS used by the tables - Begin
+  -- Hashes are md5 digests stored as UUID: 16 bytes instead of a 33 byte hex string
+
+  -- Canonical tag hash: tags are normalized (sorted) once, when a row is written,
+  -- so deduplication lookups never have to re-normalize the tags of existing rows
+  CREATE OR REPLACE FUNCTION postgis_to_osm.tags_hash(tags TEXT[][])
+  RETURNS UUID
+  LANGUAGE sql IMMUTABLE AS $$
+    SELECT md5(COALESCE((
+      SELECT jsonb_agg(f ORDER BY f)
+      FROM unnest(tags) AS f
+    )::TEXT, ''))::UUID;
+  $$;
+
+  -- Canonical way fingerprint: node order matters, so the nds list is hashed as is
+  CREATE OR REPLACE FUNCTION postgis_to_osm.nds_fingerprint(nds BIGINT[])
+  RETURNS UUID
+  LANGUAGE sql IMMUTABLE AS $$
+    SELECT md5(COALESCE(array_to_string(nds, ','), ''))::UUID;
+  $$;
+
+  -- Canonical relation fingerprint: member order does not matter, so the
+  -- type:ref:role triplets are sorted before hashing
+  CREATE OR REPLACE FUNCTION postgis_to_osm.members_fingerprint(
+    member_types TEXT[],
+    member_refs BIGINT[],
+    member_roles TEXT[]
+  )
+  RETURNS UUID
+  LANGUAGE sql IMMUTABLE AS $$
+    SELECT md5(COALESCE((
+      SELECT string_agg(m, ',' ORDER BY m)
+      FROM (
+        SELECT t || ':' || r || ':' || o AS m
+        FROM unnest(member_types, member_refs, member_roles) AS u(t, r, o)
+      ) AS triplets
+    ), ''))::UUID;
+  $$;
+-- Create FUNCTIONS used by the tables - End
+
+-- Staging schema of the run: the first schema of the search_path. Raises an exception
+-- when it is no staging schema (no environment table, see create_schema_and_tables.sql),
+-- e.g. a function called without use_schemas, or a staging schema dropped meanwhile
+CREATE OR REPLACE FUNCTION postgis_to_osm.staging_schema()
+RETURNS TEXT
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+  v_schema TEXT := (current_schemas(FALSE))[1];
+BEGIN
+  IF v_schema IS NULL OR to_regclass(format('%I.environment', v_schema)) IS NULL THEN
+    RAISE EXCEPTION 'The search_path does not start with a staging schema: %', current_setting('search_path');
+  END IF;
+  RETURN v_schema;
+END;
+$$;
+
+-- Create TYPES used by the tables and the functions
+  -- Plan of a source table (see plan_table), the row type of postgis_to_osm.plans: the
+  -- functions are shared by every staging schema, so their types cannot be those of a table
+  DROP TYPE IF EXISTS postgis_to_osm.plan CASCADE;
+  CREATE TYPE postgis_to_osm.plan AS (
+    source_table TEXT,
+    geom_column TEXT,
+    srid INT, -- declared SRID of the geometry column | 0: not declared, checked per row
+    geom_expression TEXT, -- geometry as converted: simplified (or not) and in 4326
+    field_columns TEXT[], -- columns turned into tags, in tag order
+    key_column TEXT, -- single column primary key | NULL: ctid
+    source_filter TEXT -- WHERE condition (source_filter and bbox) | NULL: every row
+  );
+
+-- Table BUNDLE: written once every file of the bundle is installed (see build_environment.py)
+CREATE TABLE IF NOT EXISTS postgis_to_osm.bundle (
+  bundle_hash TEXT NOT NULL,
+  installed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,165 @@
+-- Create SCHEMA
+  -- The schema is rebuilt from scratch, unless it holds an unfinished conversion
+  -- (see postgis_to_osm.checkpoints): it is then kept so that the conversion resumes.
+  -- It is also kept when it holds the state of incremental runs (postgis_to_osm.source_rows)
+DO $$
+DECLARE
+  resumable BOOLEAN := FALSE;
+BEGIN
+  IF to_regclass('postgis_to_osm.checkpoints') IS NOT NULL THEN
+    EXECUTE 'SELECT EXISTS (SELECT 1 FROM postgis_to_osm.checkpoints WHERE NOT finished)'
+    INTO resumable;
+  END IF;
+  IF NOT resumable AND to_regclass('postgis_to_osm.source_rows') IS NOT NULL THEN
+    EXECUTE 'SELECT EXISTS (SELECT 1 FROM postgis_to_osm.source_rows)'
+    INTO resumable;
+  END IF;
+
+  IF NOT resumable THEN
+    DROP SCHEMA IF EXISTS postgis_to_osm CASCADE;
+  END IF;
+END;
+$$;
+CREATE SCHEMA IF NOT EXISTS postgis_to_osm;  
+
+/* OSM XML Header
+<?xml version='1.0' encoding='UTF-8'?>
+<osm version='0.6' download='never' upload='never' locked='true' generator='postgis_to_osm'>
+Full geometries types: POINT, LINESTRING, POLYGON, MULTIPOINT, MULTILINESTRING, MULTIPOLYGON, GEOMETRYCOLLECTION
+*/
+
+-- Create TABLES - Begin
+  -- Staging tables are UNLOGGED: they are rebuilt by the next run anyway, so they write
+  -- no WAL. A crash of the server empties them all, checkpoints included, and the
+  -- conversion starts over. Indexes on id are built after the load (create_staging_indexes)
+  -- Table config
+  CREATE TABLE IF NOT EXISTS postgis_to_osm.config (
+    version TEXT DEFAULT '0.6',
+    download TEXT DEFAULT 'true', -- values: true, false, never,
+    upload TEXT DEFAULT 'true', -- values: true, false, never,
+    locked TEXT DEFAULT 'false', -- values: true, false
+    generator TEXT DEFAULT 'postgis_to_osm', 
+    simplify_geometry_type TEXT DEFAULT 'no' -- yes, no | if yes, convert multipoint to point, 
+	                                              -- | multilinestring to linestring and 
+	                                              -- | multipolygon to polygon 
+	                                              -- | when they contain just one item 
+	                                              -- | as a way of avoiding unnecessary relations 
+	                                              -- | that contain just one member
+    , conversion_engine TEXT DEFAULT 'row' -- row, set, topology | row: one geometry_to_osm() call per source row
+	                                        -- | set: whole table in a few set-based statements
+	                                        -- | topology: polygons share their borders (edges written once)
+    , chunk_size INT DEFAULT 10000 -- rows converted (and committed) per chunk
+    , tiles INT DEFAULT 1 -- > 1: spatial tiles converted by parallel processes, then merged
+    , incremental TEXT DEFAULT 'no' -- no, full, osmchange | staging kept between runs, only changed rows converted
+    , itersize INT DEFAULT 10000 -- rows fetched per round trip when writing the .osm file
+    , render_mode TEXT DEFAULT 'python' -- python, sql | sql: lines rendered by render_*() and streamed with COPY
+    , workers INT DEFAULT 1 -- processes writing parts of the .osm file at the same time
+    , output_format TEXT DEFAULT 'xml' -- xml, pbf | pbf: <schema>.<table>.osm.pbf
+    , compression TEXT DEFAULT 'none' -- none, gz, bz2, xz | xml output compressed while it is written
+    , compression_threads INT DEFAULT 1 -- gz only: blocks compressed at the same time
+    , var_geom TEXT DEFAULT 'geom' -- geometry column | not found: the first geometry column of the table
+    , var_fields TEXT DEFAULT '-' -- "-" means every non-geometry column
+                                  -- Example: name, highway, surface
+    , source_filter TEXT DEFAULT '' -- WHERE condition on the source table | empty: every row
+    , bbox TEXT DEFAULT '' -- xmin,ymin,xmax,ymax in degrees (EPSG:4326) | empty: no bbox
+    , split_output TEXT DEFAULT 'no' -- no, grid, elements, bytes | self-contained files of a part each
+    , split_size BIGINT DEFAULT 0 -- grid: cells per side | elements, bytes: cap per file | 0: default
+  );
+  INSERT INTO postgis_to_osm.config (version,download,upload,locked,generator,simplify_geometry_type,conversion_engine,chunk_size,tiles,incremental,itersize,render_mode,workers,output_format,compression,compression_threads,var_geom,var_fields,source_filter,bbox,split_output,split_size) 
+         SELECT '0.6','true','true','false','postgis_to_osm','no','row',10000,1,'no',10000,'python',1,'xml','none',1,'geom','-','','','no',0
+         WHERE NOT EXISTS (SELECT 1 FROM postgis_to_osm.config);
+  -- Table NODEs
+    -- Create SEQUENCE for auto-generating negative IDs
+    CREATE SEQUENCE IF NOT EXISTS postgis_to_osm.nodes_id_seq START 10000001;
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.nodes (
+    id BIGINT NOT NULL DEFAULT -nextval('postgis_to_osm.nodes_id_seq'),
+    lat INTEGER NOT NULL, -- 1e-7 degrees (7 decimals, as in OSM)
+    lon INTEGER NOT NULL, -- 1e-7 degrees
+    tags_hash UUID GENERATED ALWAYS AS (postgis_to_osm.tags_hash(tags)) STORED,
+    action TEXT NOT NULL DEFAULT 'modify',
+    tags TEXT[][] -- k=v
+  );
+  -- Deduplication index: a node is identified by its rounded coordinate and its tags
+  CREATE UNIQUE INDEX IF NOT EXISTS nodes_lat_lon_tags_hash_idx ON postgis_to_osm.nodes (lat, lon, tags_hash);
+  -- Table WAYs
+    -- Create SEQUENCE for auto-generating negative IDs
+    CREATE SEQUENCE IF NOT EXISTS postgis_to_osm.ways_id_seq START 10001;
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.ways (
+    id BIGINT NOT NULL DEFAULT -nextval('postgis_to_osm.ways_id_seq'),
+    fingerprint UUID GENERATED ALWAYS AS (postgis_to_osm.nds_fingerprint(nds)) STORED,
+    action TEXT NOT NULL DEFAULT 'modify',
+    nds BIGINT[], -- nd ref
+    tags TEXT[][] -- k=v
+  );
+  -- Deduplication index: a way is identified by its ordered node list
+  CREATE UNIQUE INDEX IF NOT EXISTS ways_fingerprint_idx ON postgis_to_osm.ways (fingerprint);
+  -- Table RELATIONs
+    -- Create SEQUENCE for auto-generating negative IDs
+    CREATE SEQUENCE IF NOT EXISTS postgis_to_osm.relations_id_seq START 101;
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.relations (
+    id BIGINT NOT NULL DEFAULT -nextval('postgis_to_osm.relations_id_seq'),
+    fingerprint UUID GENERATED ALWAYS AS (
+      postgis_to_osm.members_fingerprint(member_types, member_refs, member_roles)
+    ) STORED,
+    action TEXT NOT NULL DEFAULT 'modify',
+    member_types TEXT[], -- node, way, relation
+    member_refs BIGINT[],
+    member_roles TEXT[],
+    tags TEXT[][] -- k=v
+  );
+  -- Deduplication index: a relation is identified by its (unordered) member set
+  CREATE UNIQUE INDEX IF NOT EXISTS relations_fingerprint_idx ON postgis_to_osm.relations (fingerprint);
+  -- Table CHECKPOINTs: progress of chunked conversions, one row per source table
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.checkpoints (
+    source_table TEXT PRIMARY KEY,
+    key_column TEXT, -- single column primary key used to order chunks | NULL: chunks are ctid (page) ranges
+    last_key TEXT, -- last key converted | ctid mode: next page to convert
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    finished BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+  );
+  -- Table PLANs: how each source table is read, resolved once per run (see plan_table)
+  -- Its rows are of the postgis_to_osm.plan type of the function bundle, which the functions use
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.plans OF postgis_to_osm.plan (
+    source_table PRIMARY KEY,
+    geom_column NOT NULL,
+    srid NOT NULL,
+    geom_expression NOT NULL,
+    field_columns NOT NULL
+  );
+  -- Table REJECTs: source rows that could not be converted
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.rejects (
+    source_table TEXT NOT NULL,
+    row_key TEXT, -- primary key (or ctid) of the source row
+    error TEXT,
+    rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+  );
+  -- Table SOURCE_ROWs: incremental runs, one row per converted source row
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.source_rows (
+    source_table TEXT NOT NULL,
+    row_key TEXT NOT NULL, -- primary key (or ctid) of the source row
+    row_hash TEXT NOT NULL, -- version of the row (plan hash and xmin, see sync_table_changes): a different one means the row changed
+    element_type TEXT, -- node, way, relation: element returned by geometry_to_osm
+    element_id BIGINT,
+    PRIMARY KEY (source_table, row_key)
+  );
+  CREATE INDEX IF NOT EXISTS source_rows_element_idx ON postgis_to_osm.source_rows (element_type, element_id);
+  -- Table CHANGEs: elements created, modified or deleted by incremental runs since the last file
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.changes (
+    element_type TEXT NOT NULL,
+    element_id BIGINT NOT NULL,
+    change TEXT NOT NULL, -- create, modify, delete
+    PRIMARY KEY (element_type, element_id)
+  );
+  -- Table OUTPUT_PARTs: split_output, elements written in each file (see split_output)
+  CREATE UNLOGGED TABLE IF NOT EXISTS postgis_to_osm.output_parts (
+    part INT NOT NULL,
+    element_type TEXT NOT NULL, -- node, way, relation
+    element_id BIGINT NOT NULL,
+    PRIMARY KEY (part, element_type, element_id)
+  );
+  -- Table ENVIRONMENT: hash of the SQL files the schema was installed with (see build_environment.py)
+  CREATE TABLE IF NOT EXISTS postgis_to_osm.environment (
+    bundle_hash TEXT NOT NULL,
+    installed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+  );
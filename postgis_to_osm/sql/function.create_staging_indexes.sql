@@ -0,0 +1,20 @@
+-- Indexes on the element IDs, built once the staging tables are loaded
+-- The conversion itself only looks elements up by their deduplication keys (coordinate
+-- and tags, fingerprints), so a bulk load does not maintain these; writing the file and
+-- incremental runs need them. Does nothing when they already exist
+DROP FUNCTION IF EXISTS postgis_to_osm.create_staging_indexes;
+CREATE OR REPLACE FUNCTION postgis_to_osm.create_staging_indexes()
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT := postgis_to_osm.staging_schema();
+BEGIN
+   EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS nodes_id_idx ON %I.nodes (id)', v_schema);
+   EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS ways_id_idx ON %I.ways (id)', v_schema);
+   EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS relations_id_idx ON %I.relations (id)', v_schema);
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.create_staging_indexes();
@@ -0,0 +1,23 @@
+
+-- Mark the chunked conversion of a table as finished
+-- Returns the number of rejected rows
+DROP FUNCTION IF EXISTS postgis_to_osm.finish_table_conversion;
+CREATE OR REPLACE FUNCTION postgis_to_osm.finish_table_conversion(
+   psql_table TEXT
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   UPDATE postgis_to_osm.checkpoints
+   SET finished = TRUE,
+       updated_at = now()
+   WHERE source_table = psql_table;
+
+   RETURN (
+       SELECT count(*)
+       FROM postgis_to_osm.rejects
+       WHERE source_table = psql_table
+   );
+END;
+$$;
@@ -1,9 +1,12 @@
 
 -- Detects geometry and redirects to correct function
+-- prepared: geom comes from a source query (see table_source_query), already simplified
+-- (or not) and in 4326, so the config and the SRID are not looked up again for every row
 DROP FUNCTION IF EXISTS postgis_to_osm.geometry_to_osm;
 CREATE OR REPLACE FUNCTION postgis_to_osm.geometry_to_osm(
   geom geometry,
-  fields TEXT[][]
+  fields TEXT[][],
+  prepared BOOLEAN DEFAULT FALSE
 ) RETURNS BIGINT AS $$
 DECLARE
   geom_simplified_or_not GEOMETRY;
@@ -12,22 +15,26 @@ DECLARE
   simplify_gt TEXT DEFAULT 'no';
 BEGIN
 
-  -- Simplify or not simplify geometry type
-  SELECT lower(simplify_geometry_type) INTO simplify_gt
-  FROM postgis_to_osm.config
-  LIMIT 1;
-
-  --RAISE NOTICE 'geom = %',ST_AsText(geom);
-
-  geom_simplified_or_not = CASE
-      WHEN simplify_gt = 'yes' THEN postgis_to_osm.simplify_multi(geom)
-      ELSE geom
-  END;
-  
-  geom_srid4326 = CASE
-      WHEN ST_SRID(geom_simplified_or_not) = 4326 THEN geom_simplified_or_not
-      ELSE ST_Transform(geom_simplified_or_not, 4326)
-  END;
+  IF prepared THEN
+    geom_srid4326 := geom;
+  ELSE
+    -- Simplify or not simplify geometry type
+    SELECT lower(simplify_geometry_type) INTO simplify_gt
+    FROM postgis_to_osm.config
+    LIMIT 1;
+
+    --RAISE NOTICE 'geom = %',ST_AsText(geom);
+
+    geom_simplified_or_not = CASE
+        WHEN simplify_gt = 'yes' THEN postgis_to_osm.simplify_multi(geom)
+        ELSE geom
+    END;
+
+    geom_srid4326 = CASE
+        WHEN ST_SRID(geom_simplified_or_not) = 4326 THEN geom_simplified_or_not
+        ELSE ST_Transform(geom_simplified_or_not, 4326)
+    END;
+  END IF;
 
   geom_type := ST_GeometryType(geom_srid4326);
 
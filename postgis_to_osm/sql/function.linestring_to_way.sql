@@ -0,0 +1,73 @@
+
+-- LINESTRING to way
+DROP FUNCTION IF EXISTS postgis_to_osm.linestring_to_way;
+CREATE OR REPLACE FUNCTION postgis_to_osm.linestring_to_way(
+  linestring GEOMETRY,
+  fields TEXT[][]
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+  pt GEOMETRY;
+  node_id BIGINT;
+  nds_list BIGINT[] := '{}';
+  way_fingerprint UUID;
+  existing_id BIGINT;
+  existing_tags TEXT[][];
+  merged_tags TEXT[][];
+BEGIN
+  -- 1. Convert points to nodes
+  FOR pt IN SELECT (dp).geom FROM ST_DumpPoints(linestring) AS dp
+  LOOP
+    -- point_to_node rounds the coordinate to 1e-7 degrees
+    node_id := postgis_to_osm.point_to_node(pt, ARRAY[]::TEXT[][]);
+
+    nds_list := nds_list || node_id;
+  END LOOP;
+
+  -- 2. Check for existing way with the same nds_list (index lookup on the fingerprint)
+  way_fingerprint := postgis_to_osm.nds_fingerprint(nds_list);
+
+  SELECT id, tags INTO existing_id, existing_tags
+  FROM postgis_to_osm.ways
+  WHERE fingerprint = way_fingerprint;
+
+  IF existing_id IS NOT NULL THEN
+    -- Merge with incoming fields
+    merged_tags := postgis_to_osm.merge_way_tags(existing_tags, fields);
+
+    -- Update existing tags
+    IF merged_tags IS DISTINCT FROM existing_tags THEN
+      UPDATE postgis_to_osm.ways
+      SET tags = merged_tags
+      WHERE fingerprint = way_fingerprint; -- no index on id while the table is loaded
+    END IF;
+
+    RETURN existing_id;
+  END IF;
+
+  -- 3. Insert if not found
+  INSERT INTO postgis_to_osm.ways (nds, tags)
+  VALUES (nds_list, fields)
+  RETURNING id INTO existing_id;
+
+  RETURN existing_id;
+END;
+$$;
+
+
+
+/*
+-- Test LineString
+SELECT postgis_to_osm.linestring_to_way( 
+  ST_GeomFromText('LINESTRING(-51.154941 -29.8545727, -51.154950 -29.8545700, -51.154960 -29.8545680)', 4326),
+  ARRAY[
+    ARRAY['highway','residential'],
+    ARRAY['name','Sample Street']
+    --ARRAY['surface','unpaved']
+  ]
+);
+*/
+
+
+
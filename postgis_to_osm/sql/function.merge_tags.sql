@@ -0,0 +1,162 @@
+
+-- Aggregates depend on the merge functions, drop them first
+DROP AGGREGATE IF EXISTS postgis_to_osm.merge_way_tags_agg(TEXT[]);
+DROP AGGREGATE IF EXISTS postgis_to_osm.merge_relation_tags_agg(TEXT[]);
+
+-- Merge incoming tags into the tags of an existing way (set-based)
+--   * keys are kept once and the result is ordered by key, byte-wise (COLLATE "C"), so that
+--     the order does not depend on the collation of the database (nor differ from the
+--     client engine, see convert_table_to_osm_structure.merge_way_tags)
+--   * an incoming value already contained (ILIKE) in the existing value is not repeated,
+--     any other value is appended with ';'
+--   * a repeated incoming pair (a column listed twice in var_fields) is added once; the
+--     incoming keys are otherwise distinct, as they are the columns of a source row (see
+--     table_source_query) or the keys of tags merged here before
+DROP FUNCTION IF EXISTS postgis_to_osm.merge_way_tags;
+CREATE OR REPLACE FUNCTION postgis_to_osm.merge_way_tags(
+  existing_tags TEXT[][],
+  new_tags TEXT[][]
+)
+RETURNS TEXT[][]
+LANGUAGE sql IMMUTABLE AS $$
+  WITH existing_kv AS (
+    -- Later duplicates of a key win, as they would in a key/value map
+    SELECT DISTINCT ON (existing_tags[i][1])
+           existing_tags[i][1] AS k,
+           existing_tags[i][2] AS v
+    FROM generate_subscripts(existing_tags, 1) AS i
+    ORDER BY existing_tags[i][1], i DESC
+  ),
+  new_kv AS (
+    SELECT new_tags[i][1] AS k, new_tags[i][2] AS v, min(i) AS pos
+    FROM generate_subscripts(new_tags, 1) AS i
+    GROUP BY 1, 2
+  ),
+  added_kv AS (
+    SELECT n.k, string_agg(n.v, ';' ORDER BY n.pos) AS v
+    FROM new_kv AS n
+    LEFT JOIN existing_kv AS e ON e.k = n.k
+    WHERE e.k IS NULL OR NOT (e.v ILIKE '%' || n.v || '%')
+    GROUP BY n.k
+  )
+  SELECT CASE
+    WHEN existing_tags IS NULL THEN new_tags
+    ELSE (
+      SELECT array_agg(ARRAY[merged.k, merged.v] ORDER BY merged.k COLLATE "C")
+      FROM (
+        SELECT COALESCE(e.k, a.k) AS k,
+               CASE
+                 WHEN e.k IS NULL THEN a.v
+                 WHEN a.k IS NULL THEN e.v
+                 ELSE e.v || ';' || a.v
+               END AS v
+        FROM existing_kv AS e
+        FULL JOIN added_kv AS a ON a.k = e.k
+      ) AS merged
+    )
+  END;
+$$;
+
+
+-- Merge incoming tags into the tags of an existing relation (set-based)
+--   * keys keep the position of their first appearance, new keys are appended
+--   * a key that receives more than one value holds the sorted, distinct
+--     union of their ';' separated parts
+DROP FUNCTION IF EXISTS postgis_to_osm.merge_relation_tags;
+CREATE OR REPLACE FUNCTION postgis_to_osm.merge_relation_tags(
+  existing_tags TEXT[][],
+  new_tags TEXT[][]
+)
+RETURNS TEXT[][]
+LANGUAGE sql IMMUTABLE AS $$
+  WITH kv AS (
+    SELECT 0 AS src, i AS pos, existing_tags[i][1] AS k, existing_tags[i][2] AS v
+    FROM generate_subscripts(existing_tags, 1) AS i
+    UNION ALL
+    SELECT 1, i, new_tags[i][1], new_tags[i][2]
+    FROM generate_subscripts(new_tags, 1) AS i
+  ),
+  grouped AS (
+    SELECT k, min(ARRAY[src, pos]) AS first_seen, count(*) AS n, string_agg(v, ';') AS vals
+    FROM kv
+    GROUP BY k
+  )
+  SELECT CASE
+    WHEN existing_tags IS NULL THEN new_tags
+    ELSE (
+      SELECT array_agg(
+               ARRAY[
+                 g.k,
+                 CASE
+                   WHEN g.n = 1 THEN g.vals
+                   ELSE (
+                     SELECT string_agg(DISTINCT part, ';' ORDER BY part)
+                     FROM unnest(string_to_array(g.vals, ';')) AS part
+                   )
+                 END
+               ]
+               ORDER BY g.first_seen
+             )
+      FROM grouped AS g
+    )
+  END;
+$$;
+
+
+-- Folding aggregates: merge the tags of every duplicate of an element in the given order,
+-- the first tags are kept as they are (as they would be on insert)
+CREATE AGGREGATE postgis_to_osm.merge_way_tags_agg(TEXT[][]) (
+  SFUNC = postgis_to_osm.merge_way_tags,
+  STYPE = TEXT[]
+);
+
+CREATE AGGREGATE postgis_to_osm.merge_relation_tags_agg(TEXT[][]) (
+  SFUNC = postgis_to_osm.merge_relation_tags,
+  STYPE = TEXT[]
+);
+
+
+-- Ensure a relation 'type' tag: an empty 'type' is filled, a missing one is appended
+DROP FUNCTION IF EXISTS postgis_to_osm.with_type_tag;
+CREATE OR REPLACE FUNCTION postgis_to_osm.with_type_tag(
+  fields TEXT[][],
+  type_value TEXT
+)
+RETURNS TEXT[][]
+LANGUAGE sql IMMUTABLE AS $$
+  WITH type_pos AS (
+    SELECT min(i) AS pos
+    FROM generate_subscripts(fields, 1) AS i
+    WHERE fields[i][1] = 'type'
+  )
+  SELECT CASE
+    WHEN (SELECT pos FROM type_pos) IS NULL THEN fields || ARRAY[ARRAY['type', type_value]]
+    ELSE (
+      SELECT array_agg(
+               ARRAY[
+                 fields[i][1],
+                 CASE
+                   WHEN i = (SELECT pos FROM type_pos) AND COALESCE(fields[i][2], '') = '' THEN type_value
+                   ELSE fields[i][2]
+                 END
+               ]
+               ORDER BY i
+             )
+      FROM generate_subscripts(fields, 1) AS i
+    )
+  END;
+$$;
+
+
+/*
+-- Test zone
+SELECT postgis_to_osm.merge_way_tags(
+  ARRAY[ARRAY['highway','residential'], ARRAY['name','Sample Street']],
+  ARRAY[ARRAY['name','Other Street'], ARRAY['surface','unpaved']]
+);
+
+SELECT postgis_to_osm.merge_relation_tags(
+  ARRAY[ARRAY['type','multipolygon'], ARRAY['name','Jungloo Woods']],
+  ARRAY[ARRAY['name','Joseph`s forest'], ARRAY['landuse','forest']]
+);
+*/
@@ -0,0 +1,111 @@
+-- Merge the staging tables of a tile (converted in its own schema, see table_tiles) into this one
+-- Tile IDs are remapped to new IDs of this schema. A node, way or relation that another tile
+-- already staged (a vertex on a tile edge, for instance) is not added twice: references to it
+-- point to the existing element and the tags of ways and relations are merged
+DROP FUNCTION IF EXISTS postgis_to_osm.merge_tile_staging;
+CREATE OR REPLACE FUNCTION postgis_to_osm.merge_tile_staging(
+   tile_schema TEXT
+)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_relation RECORD;
+   v_refs BIGINT[];
+   v_id BIGINT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Tile ID -> ID in this schema
+   CREATE TEMP TABLE IF NOT EXISTS tile_id_map (
+      element_type TEXT,
+      tile_id BIGINT,
+      id BIGINT,
+      PRIMARY KEY (element_type, tile_id)
+   );
+   CREATE TEMP TABLE IF NOT EXISTS tile_ways (
+      tile_id BIGINT,
+      action TEXT,
+      nds BIGINT[],
+      tags TEXT[][]
+   );
+   TRUNCATE tile_id_map, tile_ways;
+
+   -- Nodes, in the order the tile created them
+   EXECUTE format(
+      'INSERT INTO postgis_to_osm.nodes (action, lat, lon, tags)
+       SELECT action, lat, lon, tags
+       FROM %I.nodes
+       ORDER BY id DESC
+       ON CONFLICT (lat, lon, tags_hash) DO NOTHING',
+      tile_schema
+   );
+   EXECUTE format(
+      'INSERT INTO tile_id_map (element_type, tile_id, id)
+       SELECT ''node'', t.id, n.id
+       FROM %I.nodes AS t
+       JOIN postgis_to_osm.nodes AS n
+         ON n.lat = t.lat AND n.lon = t.lon AND n.tags_hash = t.tags_hash',
+      tile_schema
+   );
+
+   -- Ways: node references remapped first, so that the fingerprints can be compared
+   EXECUTE format(
+      'INSERT INTO tile_ways (tile_id, action, nds, tags)
+       SELECT w.id, w.action,
+              ARRAY(
+                 SELECT m.id
+                 FROM unnest(w.nds) WITH ORDINALITY AS u(nd, ord)
+                 JOIN tile_id_map AS m ON m.element_type = ''node'' AND m.tile_id = u.nd
+                 ORDER BY u.ord
+              ),
+              w.tags
+       FROM %I.ways AS w',
+      tile_schema
+   );
+
+   INSERT INTO postgis_to_osm.ways (action, nds, tags)
+   SELECT action, nds, tags
+   FROM tile_ways
+   ORDER BY tile_id DESC
+   ON CONFLICT (fingerprint) DO UPDATE
+      SET tags = postgis_to_osm.merge_way_tags(ways.tags, EXCLUDED.tags);
+
+   INSERT INTO tile_id_map (element_type, tile_id, id)
+   SELECT 'way', t.tile_id, w.id
+   FROM tile_ways AS t
+   JOIN postgis_to_osm.ways AS w ON w.fingerprint = postgis_to_osm.nds_fingerprint(t.nds);
+
+   -- Relations one by one, in creation order: a relation member is merged before its parent
+   FOR v_relation IN EXECUTE format(
+      'SELECT id, action, member_types, member_refs, member_roles, tags FROM %I.relations ORDER BY id DESC',
+      tile_schema
+   )
+   LOOP
+      -- Member refs remapped by the type of each member
+      SELECT array_agg(m.id ORDER BY u.ord)
+      INTO v_refs
+      FROM unnest(v_relation.member_types, v_relation.member_refs) WITH ORDINALITY AS u(member_type, ref, ord)
+      LEFT JOIN tile_id_map AS m ON m.element_type = u.member_type AND m.tile_id = u.ref;
+
+      INSERT INTO postgis_to_osm.relations (action, member_types, member_refs, member_roles, tags)
+      VALUES (v_relation.action, v_relation.member_types, v_refs, v_relation.member_roles, v_relation.tags)
+      ON CONFLICT (fingerprint) DO UPDATE
+         SET tags = postgis_to_osm.merge_relation_tags(relations.tags, EXCLUDED.tags)
+      RETURNING id INTO v_id;
+
+      INSERT INTO tile_id_map (element_type, tile_id, id)
+      VALUES ('relation', v_relation.id, v_id);
+   END LOOP;
+
+   -- Rows the tile could not convert
+   EXECUTE format(
+      'INSERT INTO postgis_to_osm.rejects (source_table, row_key, error, rejected_at)
+       SELECT source_table, row_key, error, rejected_at
+       FROM %I.rejects',
+      tile_schema
+   );
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.merge_tile_staging('postgis_to_osm_tile_0123abcd_0');
@@ -8,13 +8,15 @@ CREATE OR REPLACE FUNCTION postgis_to_osm.multipoint_to_relation(
 DECLARE
   point_geometry geometry;
   point_id BIGINT;
-  new_members TEXT[][] := ARRAY[]::TEXT[][];
+  -- Members as typed arrays: type, ref and role of each member
+  new_types TEXT[] := '{}';
+  new_refs BIGINT[] := '{}';
+  new_roles TEXT[] := '{}';
+  relation_fingerprint UUID;
   existing_id BIGINT;
   existing_tags TEXT[][];
   field_map TEXT[][];
-  new_kv TEXT[];
   merged_tags TEXT[][];
-  updated BOOLEAN;
   i INT;
   type_found BOOLEAN := FALSE;
   num_geometries INT;
@@ -54,67 +56,32 @@ BEGIN
     );
 
     -- Append member info as array of [key, value] pairs
-    new_members := new_members || ARRAY[
-      ARRAY['type', 'node'],
-      ARRAY['ref', point_id::TEXT],
-      ARRAY['role', ''] -- No role detection for points
-    ];
+    new_types := new_types || 'node'::TEXT;
+    new_refs := new_refs || point_id;
+    new_roles := new_roles || ''::TEXT; -- No role detection for points
   END LOOP;
 
   -- Check if a relation with the same members already exists (order does not matter)
+  relation_fingerprint := postgis_to_osm.members_fingerprint(new_types, new_refs, new_roles);
+
   SELECT id, tags INTO existing_id, existing_tags
   FROM postgis_to_osm.relations
-  WHERE (
-    SELECT array_agg(m ORDER BY m) FROM unnest(members) AS m
-  ) = (
-    SELECT array_agg(nm ORDER BY nm) FROM unnest(new_members) AS nm
-  )
-  LIMIT 1;
+  WHERE fingerprint = relation_fingerprint;
 
   IF existing_id IS NULL THEN
     -- Insert new relation and return its ID
-    INSERT INTO postgis_to_osm.relations (members, tags)
-    VALUES (new_members, field_map)
+    INSERT INTO postgis_to_osm.relations (member_types, member_refs, member_roles, tags)
+    VALUES (new_types, new_refs, new_roles, field_map)
     RETURNING id INTO existing_id;
   ELSE
     -- Smart merge field_map into existing_tags
-    merged_tags := existing_tags;
-
-    FOREACH new_kv SLICE 1 IN ARRAY field_map LOOP
-      updated := FALSE;
-      FOR i IN 1..COALESCE(array_length(merged_tags, 1), 0) LOOP
-        IF merged_tags[i][1] = new_kv[1] THEN
-          -- If the key already exists
-          IF NOT EXISTS (
-            SELECT 1
-            FROM unnest(string_to_array(merged_tags[i][2], ';')) AS val
-            WHERE val = new_kv[2]
-          ) THEN
-            merged_tags[i][2] := merged_tags[i][2] || ';' || new_kv[2];
-          END IF;
-
-          -- Always sort merged values
-          merged_tags[i][2] := (
-            SELECT string_agg(val, ';' ORDER BY val)
-            FROM unnest(string_to_array(merged_tags[i][2], ';')) AS val
-          );
-
-          updated := TRUE;
-          EXIT;
-        END IF;
-      END LOOP;
-
-      IF NOT updated THEN
-        -- If key not found, add new
-        merged_tags := merged_tags || ARRAY[new_kv];
-      END IF;
-    END LOOP;
+    merged_tags := postgis_to_osm.merge_relation_tags(existing_tags, field_map);
 
     -- Update only if tags have changed
     IF merged_tags IS DISTINCT FROM existing_tags THEN
       UPDATE postgis_to_osm.relations
       SET tags = merged_tags
-      WHERE id = existing_id;
+      WHERE fingerprint = relation_fingerprint; -- no index on id while the table is loaded
     END IF;
   END IF;
 
@@ -0,0 +1,156 @@
+-- Plan the conversion of a table: resolve once what every row would otherwise look up again
+--   geom_column     : var_geom when the table has it, its first geometry column otherwise
+--   srid            : declared SRID of that column, so that rows are only transformed when needed
+--   geom_expression : the column simplified (simplify_geometry_type) and transformed to 4326
+--   field_columns   : var_fields ("-": every non-geometry column)
+--   source_filter   : source_filter and bbox, as a WHERE condition the spatial index can serve
+-- The plan is stored in postgis_to_osm.plans (see table_plan) and read by table_source_query
+DROP FUNCTION IF EXISTS postgis_to_osm.plan_table;
+CREATE OR REPLACE FUNCTION postgis_to_osm.plan_table(
+   psql_table TEXT
+)
+RETURNS postgis_to_osm.plan
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT;
+   v_table  TEXT;
+   v_config RECORD;
+   v_plan postgis_to_osm.plan;
+   v_fields TEXT[];
+   v_missing TEXT;
+   v_bbox DOUBLE PRECISION[];
+   v_envelope GEOMETRY;
+   v_filters TEXT[] := '{}';
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Split schema and table
+   IF strpos(psql_table, '.') > 0 THEN
+       v_schema := split_part(psql_table, '.', 1);
+       v_table  := split_part(psql_table, '.', 2);
+   ELSE
+       v_schema := 'public';
+       v_table  := psql_table;
+   END IF;
+
+   IF to_regclass(format('%I.%I', v_schema, v_table)) IS NULL THEN
+       RAISE EXCEPTION 'Table "%" does not exist in schema "%".', v_table, v_schema;
+   END IF;
+
+   SELECT lower(COALESCE(simplify_geometry_type, 'no')) AS simplify_geometry_type,
+          COALESCE(NULLIF(trim(var_geom), ''), 'geom') AS var_geom,
+          COALESCE(NULLIF(trim(var_fields), ''), '-') AS var_fields,
+          NULLIF(trim(source_filter), '') AS source_filter,
+          NULLIF(trim(bbox), '') AS bbox
+   INTO v_config
+   FROM postgis_to_osm.config
+   LIMIT 1;
+
+   v_plan.source_table := psql_table;
+
+   -- Geometry column and its declared SRID (0 when the column has none)
+   SELECT a.attname, postgis_typmod_srid(a.atttypmod)
+   INTO v_plan.geom_column, v_plan.srid
+   FROM pg_attribute AS a
+   WHERE a.attrelid = format('%I.%I', v_schema, v_table)::regclass
+     AND a.attnum > 0
+     AND NOT a.attisdropped
+     AND a.atttypid = 'geometry'::regtype
+   ORDER BY a.attname = COALESCE(v_config.var_geom, 'geom') DESC, a.attnum
+   LIMIT 1;
+
+   IF v_plan.geom_column IS NULL THEN
+       RAISE EXCEPTION 'Table "%" has no geometry column.', psql_table;
+   END IF;
+
+   v_plan.geom_expression := quote_ident(v_plan.geom_column);
+   IF v_config.simplify_geometry_type = 'yes' THEN
+       v_plan.geom_expression := format('postgis_to_osm.simplify_multi(%s)', v_plan.geom_expression);
+   END IF;
+   IF v_plan.srid <> 4326 THEN
+       -- SRID 0: rows may have any SRID, ST_Transform leaves those in 4326 as they are
+       v_plan.geom_expression := format('ST_Transform(%s, 4326)', v_plan.geom_expression);
+   END IF;
+
+   -- Fields: every non-geometry column, or the listed ones in the listed order
+   IF COALESCE(v_config.var_fields, '-') = '-' THEN
+       SELECT COALESCE(array_agg(column_name::TEXT ORDER BY ordinal_position), '{}')
+       INTO v_plan.field_columns
+       FROM information_schema.columns
+       WHERE table_schema = v_schema
+         AND table_name = v_table
+         AND data_type NOT IN ('USER-DEFINED', 'geometry', 'geography'); -- Skip geometry types
+   ELSE
+       SELECT array_agg(trim(f) ORDER BY n)
+       INTO v_fields
+       FROM unnest(string_to_array(v_config.var_fields, ',')) WITH ORDINALITY AS u(f, n)
+       WHERE trim(f) <> '';
+
+       SELECT string_agg(f, ', ') INTO v_missing
+       FROM unnest(v_fields) AS f
+       WHERE NOT EXISTS (
+           SELECT 1
+           FROM information_schema.columns
+           WHERE table_schema = v_schema
+             AND table_name = v_table
+             AND column_name = f
+       );
+       IF v_missing IS NOT NULL THEN
+           RAISE EXCEPTION 'var_fields: no column % in "%".', v_missing, psql_table;
+       END IF;
+
+       v_plan.field_columns := COALESCE(v_fields, '{}');
+   END IF;
+
+   v_plan.key_column := postgis_to_osm.table_key_column(psql_table);
+
+   -- Filter: the bbox is compared with && to the column itself, in its own SRID
+   IF v_config.source_filter IS NOT NULL THEN
+       v_filters := v_filters || format('(%s)', v_config.source_filter);
+   END IF;
+   IF v_config.bbox IS NOT NULL THEN
+       v_bbox := string_to_array(replace(v_config.bbox, ' ', ''), ',')::DOUBLE PRECISION[];
+       IF COALESCE(array_length(v_bbox, 1), 0) <> 4 THEN
+           RAISE EXCEPTION 'bbox must be xmin,ymin,xmax,ymax, not "%".', v_config.bbox;
+       END IF;
+       v_envelope := ST_MakeEnvelope(v_bbox[1], v_bbox[2], v_bbox[3], v_bbox[4], 4326);
+       IF v_plan.srid NOT IN (0, 4326) THEN
+           v_envelope := ST_Transform(v_envelope, v_plan.srid);
+       END IF;
+       v_filters := v_filters || format('%I && %L::geometry', v_plan.geom_column, ST_AsEWKT(v_envelope));
+   END IF;
+   v_plan.source_filter := NULLIF(array_to_string(v_filters, ' AND '), '');
+
+   DELETE FROM postgis_to_osm.plans WHERE source_table = psql_table;
+   INSERT INTO postgis_to_osm.plans SELECT v_plan.*;
+
+   RETURN v_plan;
+END;
+$$;
+
+
+-- Plan of a table: the one stored by plan_table, planned now when there is none yet
+DROP FUNCTION IF EXISTS postgis_to_osm.table_plan;
+CREATE OR REPLACE FUNCTION postgis_to_osm.table_plan(
+   psql_table TEXT
+)
+RETURNS postgis_to_osm.plan
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_plan postgis_to_osm.plan;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   SELECT * INTO v_plan
+   FROM postgis_to_osm.plans
+   WHERE source_table = psql_table;
+
+   IF NOT FOUND THEN
+       v_plan := postgis_to_osm.plan_table(psql_table);
+   END IF;
+
+   RETURN v_plan;
+END;
+$$;
+
+
+-- Test zone
+--SELECT * FROM postgis_to_osm.plan_table('public._recorte_faces_de_logradouros');
@@ -0,0 +1,47 @@
+-- POINT to node
+DROP FUNCTION IF EXISTS postgis_to_osm.point_to_node;
+CREATE OR REPLACE FUNCTION postgis_to_osm.point_to_node(point GEOMETRY, fields TEXT[][])
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+  -- Integer coordinates in 1e-7 degrees (rounded to 7 decimals)
+  lat_val INTEGER := round(ST_Y(point)::numeric * 10000000);
+  lon_val INTEGER := round(ST_X(point)::numeric * 10000000);
+  fields_hash UUID := postgis_to_osm.tags_hash(fields);
+  node_id BIGINT;
+BEGIN
+  -- Index probe on (lat, lon, tags_hash): existing rows carry their own stored hash
+  SELECT id INTO node_id
+  FROM postgis_to_osm.nodes
+  WHERE lat = lat_val AND lon = lon_val
+    AND tags_hash = fields_hash;
+
+  IF NOT FOUND THEN
+    IF array_length(fields, 1) IS NULL THEN
+      -- tags are empty
+      INSERT INTO postgis_to_osm.nodes (lat, lon, tags)
+      VALUES (lat_val, lon_val, '{}')
+      RETURNING id INTO node_id;
+    ELSE
+      -- tags are not empty
+      INSERT INTO postgis_to_osm.nodes (lat, lon, tags)
+      VALUES (lat_val, lon_val, fields)
+      RETURNING id INTO node_id;
+    END IF;
+  END IF;
+
+  RETURN node_id;
+END;
+$$;
+
+
+/*
+-- Test Point
+SELECT postgis_to_osm.point_to_node( 
+        ST_GeometryFromText('POINT(-51.15494097504 -29.85457274247)', 4326 ),
+	    ARRAY[ARRAY['amenity','bar'],ARRAY['name','Foo Bar']]
+		--ARRAY[]::TEXT[][]
+	 );
+*/
+
+
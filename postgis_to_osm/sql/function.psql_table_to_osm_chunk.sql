@@ -0,0 +1,116 @@
+
+-- Convert the next chunk of a table and record it in postgis_to_osm.checkpoints
+-- Call it once per transaction: every committed chunk survives a failure of the next ones
+-- Chunks follow the single column primary key when there is one, ctid (page) ranges otherwise
+-- With a filter in the plan (source_filter, bbox), chunks only count the rows it keeps; in
+-- ctid mode the table is then a single chunk, so that the filter can use an index
+-- Returns the number of rows read in the chunk, NULL when the table is done
+DROP FUNCTION IF EXISTS postgis_to_osm.psql_table_to_osm_chunk;
+CREATE OR REPLACE FUNCTION postgis_to_osm.psql_table_to_osm_chunk(
+   psql_table TEXT,
+   chunk_size INT DEFAULT 10000
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT;
+   v_table  TEXT;
+   v_key_column TEXT;
+   v_last_key TEXT;
+   v_upper_key TEXT;
+   v_filter TEXT;
+   v_plan_filter TEXT;
+   v_first_page BIGINT;
+   v_pages BIGINT;
+   v_total_pages BIGINT;
+   v_rows BIGINT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Split schema and table
+   IF strpos(psql_table, '.') > 0 THEN
+       v_schema := split_part(psql_table, '.', 1);
+       v_table  := split_part(psql_table, '.', 2);
+   ELSE
+       v_schema := 'public';
+       v_table  := psql_table;
+   END IF;
+
+   SELECT key_column, last_key INTO v_key_column, v_last_key
+   FROM postgis_to_osm.checkpoints
+   WHERE source_table = psql_table
+   FOR UPDATE;
+
+   IF NOT FOUND THEN
+       RAISE EXCEPTION 'No conversion started for "%" (see start_table_conversion).', psql_table;
+   END IF;
+
+   v_plan_filter := (postgis_to_osm.table_plan(psql_table)).source_filter;
+
+   IF v_key_column IS NOT NULL THEN
+      -- Key-ordered chunk: the next chunk_size keys after the last converted one
+      EXECUTE format(
+         'SELECT max(k)::TEXT FROM (SELECT %1$I AS k FROM %2$I.%3$I WHERE %4$s AND %5$s ORDER BY %1$I LIMIT %6$s) AS chunk',
+         v_key_column, v_schema, v_table,
+         CASE WHEN v_last_key IS NULL THEN 'TRUE' ELSE format('%I > %L', v_key_column, v_last_key) END,
+         COALESCE(v_plan_filter, 'TRUE'),
+         chunk_size
+      ) INTO v_upper_key;
+
+      IF v_upper_key IS NULL THEN
+         RETURN NULL;
+      END IF;
+
+      v_filter := format('%I <= %L', v_key_column, v_upper_key);
+      IF v_last_key IS NOT NULL THEN
+         v_filter := format('%I > %L AND ', v_key_column, v_last_key) || v_filter;
+      END IF;
+   ELSE
+      -- ctid-ordered chunk: a range of pages holding about chunk_size rows
+      v_first_page := COALESCE(v_last_key::BIGINT, 0);
+      v_total_pages := pg_relation_size(format('%I.%I', v_schema, v_table)::regclass)
+                       / current_setting('block_size')::BIGINT;
+
+      IF v_first_page >= v_total_pages THEN
+         RETURN NULL;
+      END IF;
+
+      SELECT greatest(1, chunk_size / greatest(1, reltuples / greatest(relpages, 1)))::BIGINT
+      INTO v_pages
+      FROM pg_class
+      WHERE oid = format('%I.%I', v_schema, v_table)::regclass;
+
+      v_upper_key := (v_first_page + v_pages)::TEXT;
+      v_filter := format(
+         'ctid >= ''(%s,0)''::tid AND ctid < ''(%s,0)''::tid',
+         v_first_page, v_upper_key
+      );
+
+      -- Filtered table: every kept row in one chunk, read through the index of the filter
+      IF v_plan_filter IS NOT NULL THEN
+         v_upper_key := v_total_pages::TEXT;
+         v_filter := NULL;
+      END IF;
+   END IF;
+
+   v_rows := postgis_to_osm.source_to_osm(
+      postgis_to_osm.table_source_query(psql_table, v_filter),
+      psql_table
+   );
+
+   UPDATE postgis_to_osm.checkpoints
+   SET last_key = v_upper_key,
+       rows_done = rows_done + v_rows,
+       updated_at = now()
+   WHERE source_table = psql_table;
+
+   RETURN v_rows;
+END;
+$$;
+
+
+-- Test zone
+/*
+SELECT postgis_to_osm.start_table_conversion('public._recorte_faces_de_logradouros');
+SELECT postgis_to_osm.psql_table_to_osm_chunk('public._recorte_faces_de_logradouros', 1000);
+SELECT * FROM postgis_to_osm.checkpoints;
+*/
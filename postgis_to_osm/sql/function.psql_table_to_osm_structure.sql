@@ -0,0 +1,65 @@
+
+-- Convert a table to osm structure (in one go) and return TRUE if no exception occurs
+-- Rows that fail are recorded in postgis_to_osm.rejects
+-- For large tables prefer the chunked, resumable psql_table_to_osm_chunk()
+DROP FUNCTION IF EXISTS postgis_to_osm.psql_table_to_osm_structure;
+CREATE OR REPLACE FUNCTION postgis_to_osm.psql_table_to_osm_structure(
+   psql_table TEXT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_query TEXT;
+BEGIN
+   PERFORM postgis_to_osm.plan_table(psql_table);
+
+   -- Construct the final dynamic query
+   v_query := format(
+      'SELECT postgis_to_osm.source_to_osm(%L, %L);',
+      postgis_to_osm.table_source_query(psql_table), psql_table
+   );
+
+   --RAISE NOTICE 'v_query = %',v_query;
+
+   -- Execute the query
+   EXECUTE v_query;
+
+   -- Return TRUE if no exception occurs
+   RETURN TRUE;
+
+EXCEPTION
+   -- Catch any exception and return FALSE
+   WHEN OTHERS THEN
+      RETURN FALSE;
+END;
+$$;
+
+
+/*
+=======================  QUERY FORMATING  ============================
+
+SELECT postgis_to_osm.geometry_to_osm(
+  geom,
+  ARRAY(
+    SELECT ARRAY[field, value]
+    FROM (
+      VALUES
+        ('cd_setor', cd_setor::TEXT),
+        ('nm_log', nm_log::TEXT),
+        ('tot_geral', tot_geral::TEXT)
+    ) AS fields(field, value)
+    WHERE value IS NOT NULL AND value <> ''
+  )
+ ) 
+FROM public.faces_de_logradouros LIMIT 11;
+*/
+
+
+
+
+
+
+-- Test zone
+--SELECT postgis_to_osm.psql_table_to_osm_structure('public._recorte_faces_de_logradouros');
+
+
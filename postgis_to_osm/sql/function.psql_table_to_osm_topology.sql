@@ -0,0 +1,191 @@
+
+-- Convert a table with shared borders (conversion_engine = topology)
+-- The polygons of the table are loaded into a PostGIS topology: every edge becomes one way,
+-- and every polygon row a multipolygon relation of the edges around its faces (outer and
+-- inner). A border between two polygons is then a single way both relations refer to,
+-- instead of a copy in each closed way. A polygon whose boundary is a single edge (nothing
+-- touches it) stays a closed way, as with the other engines. Points, lines and geometry
+-- collections are converted by geometry_to_osm as usual.
+-- The whole table is converted at once (no chunks), and the topology, a work structure of
+-- the conversion, is dropped at the end. Rows that fail are recorded in postgis_to_osm.rejects
+-- Returns the number of rows read
+DROP FUNCTION IF EXISTS postgis_to_osm.psql_table_to_osm_topology;
+CREATE OR REPLACE FUNCTION postgis_to_osm.psql_table_to_osm_topology(
+   psql_table TEXT
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_topology TEXT;
+   v_row RECORD;
+   v_rows BIGINT := 0;
+   v_types TEXT[];
+   v_refs BIGINT[];
+   v_roles TEXT[];
+   v_fields TEXT[][];
+   v_fingerprint UUID;
+   v_existing_id BIGINT;
+   v_existing_tags TEXT[][];
+   v_merged_tags TEXT[][];
+BEGIN
+   -- One topology per staging schema, so that runs side by side have their own
+   v_topology := postgis_to_osm.staging_schema() || '_topology';
+
+   -- Left over by an interrupted run
+   IF EXISTS (SELECT 1 FROM topology.topology WHERE name = v_topology) THEN
+      PERFORM topology.DropTopology(v_topology);
+   END IF;
+   PERFORM topology.CreateTopology(v_topology, 4326, 0);
+
+   -- Polygon rows, and the faces they cover once every polygon is loaded
+   CREATE TEMP TABLE IF NOT EXISTS topology_rows (
+      row_key TEXT,
+      fields TEXT[][],
+      geom GEOMETRY,
+      faces INT[]
+   );
+   -- Edges around the faces of each row, and their role
+   CREATE TEMP TABLE IF NOT EXISTS topology_members (
+      row_key TEXT,
+      edge_id INT,
+      role TEXT
+   );
+   -- Way of every edge used by a row
+   CREATE TEMP TABLE IF NOT EXISTS topology_ways (
+      edge_id INT PRIMARY KEY,
+      way_id BIGINT
+   );
+   TRUNCATE topology_rows, topology_members, topology_ways;
+
+   -- 1. Polygons into the topology, the other rows converted as usual
+   FOR v_row IN EXECUTE format(
+      'SELECT geom, fields, row_key FROM (%s) AS src',
+      postgis_to_osm.table_source_query(psql_table)
+   )
+   LOOP
+      v_rows := v_rows + 1;
+      CONTINUE WHEN v_row.geom IS NULL;
+      BEGIN
+         IF ST_GeometryType(v_row.geom) IN ('ST_Polygon', 'ST_MultiPolygon') THEN
+            PERFORM topology.TopoGeo_AddPolygon(v_topology, d.geom, 0)
+            FROM ST_Dump(v_row.geom) AS d;
+
+            INSERT INTO topology_rows (row_key, fields, geom)
+            VALUES (v_row.row_key, v_row.fields, v_row.geom);
+         ELSE
+            PERFORM postgis_to_osm.geometry_to_osm(v_row.geom, v_row.fields, TRUE);
+         END IF;
+      EXCEPTION
+         WHEN OTHERS THEN
+            INSERT INTO postgis_to_osm.rejects (source_table, row_key, error)
+            VALUES (psql_table, v_row.row_key, SQLERRM);
+      END;
+   END LOOP;
+
+   -- 2. Faces of every row: a later polygon may have split the faces of an earlier one,
+   -- so they are looked up now (a face belongs to the row that covers a point inside it)
+   EXECUTE format(
+      'UPDATE topology_rows AS r
+       SET faces = ARRAY(
+          SELECT f.face_id
+          FROM %I.face AS f
+          WHERE f.face_id > 0
+            AND f.mbr && r.geom
+            AND ST_Covers(r.geom, ST_PointOnSurface(topology.ST_GetFaceGeometry(%L, f.face_id)))
+       )',
+      v_topology, v_topology
+   );
+
+   -- 3. Boundary of every row: the edges with one of its faces on one side only. Edges on
+   -- an exterior ring of the row are outer, the others (around holes) inner
+   EXECUTE format(
+      'INSERT INTO topology_members (row_key, edge_id, role)
+       SELECT r.row_key, e.edge_id,
+              CASE
+                 WHEN ST_DWithin(
+                    (SELECT ST_Collect(ST_ExteriorRing(d.geom)) FROM ST_Dump(r.geom) AS d),
+                    ST_LineInterpolatePoint(e.geom, 0.5),
+                    0.0000001
+                 ) THEN ''outer''
+                 ELSE ''inner''
+              END
+       FROM topology_rows AS r
+       JOIN %I.edge_data AS e
+         ON e.left_face = ANY (r.faces) OR e.right_face = ANY (r.faces)
+       WHERE (e.left_face = ANY (r.faces)) <> (e.right_face = ANY (r.faces))',
+      v_topology
+   );
+
+   -- 4. One way per edge (its nodes shared with the other ways through point_to_node)
+   FOR v_row IN EXECUTE format(
+      'SELECT e.edge_id, e.geom
+       FROM %I.edge_data AS e
+       WHERE e.edge_id IN (SELECT edge_id FROM topology_members)
+       ORDER BY e.edge_id',
+      v_topology
+   )
+   LOOP
+      INSERT INTO topology_ways (edge_id, way_id)
+      VALUES (v_row.edge_id, postgis_to_osm.linestring_to_way(v_row.geom, ARRAY[ARRAY['','']]));
+   END LOOP;
+
+   -- 5. Rows: a closed way with the tags when the row is bounded by a single edge, a
+   -- multipolygon relation of its edges otherwise
+   FOR v_row IN
+      SELECT r.row_key, r.fields,
+             array_agg(m.edge_id ORDER BY m.role DESC, m.edge_id) AS edge_ids,
+             array_agg(w.way_id ORDER BY m.role DESC, m.edge_id) AS way_ids,
+             array_agg(m.role ORDER BY m.role DESC, m.edge_id) AS roles
+      FROM topology_rows AS r
+      JOIN topology_members AS m ON m.row_key = r.row_key
+      JOIN topology_ways AS w ON w.edge_id = m.edge_id
+      GROUP BY r.row_key, r.fields
+   LOOP
+      IF cardinality(v_row.way_ids) = 1 AND v_row.roles[1] = 'outer' THEN
+         -- linestring_to_way finds the way of the edge again and merges the tags into it
+         EXECUTE format(
+            'SELECT postgis_to_osm.linestring_to_way(geom, $1) FROM %I.edge_data WHERE edge_id = $2',
+            v_topology
+         ) USING v_row.fields, v_row.edge_ids[1];
+         CONTINUE;
+      END IF;
+
+      v_types := array_fill('way'::TEXT, ARRAY[cardinality(v_row.way_ids)]);
+      v_refs := v_row.way_ids;
+      v_roles := v_row.roles;
+      v_fields := postgis_to_osm.with_type_tag(v_row.fields, 'multipolygon');
+
+      -- Same members already staged (order does not matter): merge the tags
+      v_fingerprint := postgis_to_osm.members_fingerprint(v_types, v_refs, v_roles);
+
+      SELECT id, tags INTO v_existing_id, v_existing_tags
+      FROM postgis_to_osm.relations
+      WHERE fingerprint = v_fingerprint;
+
+      IF v_existing_id IS NULL THEN
+         INSERT INTO postgis_to_osm.relations (member_types, member_refs, member_roles, tags)
+         VALUES (v_types, v_refs, v_roles, v_fields);
+      ELSE
+         v_merged_tags := postgis_to_osm.merge_relation_tags(v_existing_tags, v_fields);
+         IF v_merged_tags IS DISTINCT FROM v_existing_tags THEN
+            UPDATE postgis_to_osm.relations
+            SET tags = v_merged_tags
+            WHERE fingerprint = v_fingerprint;
+         END IF;
+      END IF;
+   END LOOP;
+
+   TRUNCATE topology_rows, topology_members, topology_ways;
+   PERFORM topology.DropTopology(v_topology);
+
+   RETURN v_rows;
+END;
+$$;
+
+
+-- Test zone
+/*
+SELECT postgis_to_osm.start_table_conversion('public._recorte_setores_censitarios');
+SELECT postgis_to_osm.psql_table_to_osm_topology('public._recorte_setores_censitarios');
+SELECT count(*) FROM postgis_to_osm.ways;
+*/
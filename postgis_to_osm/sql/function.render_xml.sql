@@ -0,0 +1,143 @@
+
+-- OSM XML rendering in the database (render_mode = sql)
+-- Every function returns the lines of one element (without line breaks), so that
+--   COPY (SELECT line FROM ..., unnest(render_...) AS line) TO STDOUT
+-- streams the finished file body. The markup is the same as build_osm_file.py renders.
+
+-- Escape a value for a (single quoted) XML attribute
+-- Control characters that XML 1.0 does not allow are dropped
+DROP FUNCTION IF EXISTS postgis_to_osm.xml_escape;
+CREATE OR REPLACE FUNCTION postgis_to_osm.xml_escape(value TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT replace(replace(replace(replace(replace(replace(replace(replace(
+           regexp_replace(value, E'[\\x01-\\x08\\x0B\\x0C\\x0E-\\x1F]', '', 'g'),
+           '&', '&amp;'),
+           '<', '&lt;'),
+           '>', '&gt;'),
+           '''', '&apos;'),
+           '"', '&quot;'),
+           E'\n', '&#10;'),
+           E'\r', '&#13;'),
+           E'\t', '&#9;');
+$$;
+
+
+-- Coordinates as Python prints floats (integral values keep a '.0')
+DROP FUNCTION IF EXISTS postgis_to_osm.xml_float;
+CREATE OR REPLACE FUNCTION postgis_to_osm.xml_float(value DOUBLE PRECISION)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE WHEN t ~ '^-?[0-9]+$' THEN t || '.0' ELSE t END
+  FROM (SELECT value::TEXT AS t) AS v;
+$$;
+
+
+-- <tag> lines: pairs with an empty key or value are skipped
+DROP FUNCTION IF EXISTS postgis_to_osm.render_tags;
+CREATE OR REPLACE FUNCTION postgis_to_osm.render_tags(tags TEXT[][])
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT COALESCE(
+    array_agg(
+      format('    <tag k=''%s'' v=''%s'' />',
+             postgis_to_osm.xml_escape(tags[i][1]),
+             postgis_to_osm.xml_escape(tags[i][2]))
+      ORDER BY i
+    ),
+    '{}'
+  )
+  FROM generate_subscripts(tags, 1) AS i
+  WHERE COALESCE(tags[i][1], '') <> ''
+    AND COALESCE(tags[i][2], '') <> '';
+$$;
+
+
+-- <node>: self-closing when it has no tags (or only ['',''] pairs)
+-- lat/lon are staging integers in 1e-7 degrees
+DROP FUNCTION IF EXISTS postgis_to_osm.render_node;
+CREATE OR REPLACE FUNCTION postgis_to_osm.render_node(
+  id BIGINT,
+  action TEXT,
+  lat INTEGER,
+  lon INTEGER,
+  tags TEXT[][]
+)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+    WHEN NOT EXISTS (
+      SELECT 1
+      FROM generate_subscripts(tags, 1) AS i
+      WHERE tags[i][1] IS DISTINCT FROM '' OR tags[i][2] IS DISTINCT FROM ''
+    ) THEN
+      ARRAY[format('  <node id=''%s'' action=''%s'' lat=''%s'' lon=''%s'' />',
+                   id, postgis_to_osm.xml_escape(action),
+                   postgis_to_osm.xml_float((lat / 10000000.0)::DOUBLE PRECISION),
+                   postgis_to_osm.xml_float((lon / 10000000.0)::DOUBLE PRECISION))]
+    ELSE
+      ARRAY[format('  <node id=''%s'' action=''%s'' lat=''%s'' lon=''%s''>',
+                   id, postgis_to_osm.xml_escape(action),
+                   postgis_to_osm.xml_float((lat / 10000000.0)::DOUBLE PRECISION),
+                   postgis_to_osm.xml_float((lon / 10000000.0)::DOUBLE PRECISION))]
+      || postgis_to_osm.render_tags(tags)
+      || ARRAY['  </node>']
+  END;
+$$;
+
+
+-- <way>: nd references in order, then tags
+DROP FUNCTION IF EXISTS postgis_to_osm.render_way;
+CREATE OR REPLACE FUNCTION postgis_to_osm.render_way(
+  id BIGINT,
+  action TEXT,
+  nds BIGINT[],
+  tags TEXT[][]
+)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT ARRAY[format('  <way id=''%s'' action=''%s''>', id, postgis_to_osm.xml_escape(action))]
+         || COALESCE((
+              SELECT array_agg(format('    <nd ref=''%s'' />', nd) ORDER BY ord)
+              FROM unnest(nds) WITH ORDINALITY AS n(nd, ord)
+            ), '{}')
+         || postgis_to_osm.render_tags(tags)
+         || ARRAY['  </way>'];
+$$;
+
+
+-- <relation>: members in order, from the member type, ref and role arrays
+DROP FUNCTION IF EXISTS postgis_to_osm.render_relation;
+CREATE OR REPLACE FUNCTION postgis_to_osm.render_relation(
+  id BIGINT,
+  action TEXT,
+  member_types TEXT[],
+  member_refs BIGINT[],
+  member_roles TEXT[],
+  tags TEXT[][]
+)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT ARRAY[format('  <relation id=''%s'' action=''%s''>', id, postgis_to_osm.xml_escape(action))]
+         || COALESCE((
+              SELECT array_agg(
+                       format('    <member type=''%s'' ref=''%s'' role=''%s'' />',
+                              postgis_to_osm.xml_escape(m.member_type),
+                              m.ref,
+                              postgis_to_osm.xml_escape(m.role))
+                       ORDER BY m.ord
+                     )
+              FROM unnest(member_types, member_refs, member_roles) WITH ORDINALITY AS m(member_type, ref, role, ord)
+            ), '{}')
+         || postgis_to_osm.render_tags(tags)
+         || ARRAY['  </relation>'];
+$$;
+
+
+/*
+-- Test zone
+SELECT line
+FROM postgis_to_osm.nodes AS n
+CROSS JOIN LATERAL unnest(postgis_to_osm.render_node(n.id, n.action, n.lat, n.lon, n.tags)) AS line
+LIMIT 20;
+*/
@@ -0,0 +1,34 @@
+
+-- Empty the staging tables and restart the ID sequences
+-- The ID indexes (and the reverse lookups of sync_table_changes) are dropped as well: the
+-- next load runs without them (see create_staging_indexes)
+DROP FUNCTION IF EXISTS postgis_to_osm.reset_staging;
+CREATE OR REPLACE FUNCTION postgis_to_osm.reset_staging()
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+   -- Everything dropped or emptied here is named in the staging schema of the run
+   v_schema TEXT := postgis_to_osm.staging_schema();
+   v_name TEXT;
+BEGIN
+   EXECUTE format(
+      'TRUNCATE %1$I.nodes, %1$I.ways, %1$I.relations, %1$I.checkpoints, %1$I.plans, '
+      '%1$I.rejects, %1$I.source_rows, %1$I.changes, %1$I.output_parts',
+      v_schema
+   );
+
+   FOREACH v_name IN ARRAY ARRAY['nodes_id_seq', 'ways_id_seq', 'relations_id_seq'] LOOP
+      EXECUTE format('ALTER SEQUENCE %I.%I RESTART', v_schema, v_name);
+   END LOOP;
+
+   FOREACH v_name IN ARRAY ARRAY[
+      'nodes_id_idx', 'ways_id_idx', 'relations_id_idx', 'ways_nds_idx', 'relations_member_refs_idx'
+   ] LOOP
+      EXECUTE format('DROP INDEX IF EXISTS %I.%I', v_schema, v_name);
+   END LOOP;
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.reset_staging();
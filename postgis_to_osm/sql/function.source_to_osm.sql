@@ -0,0 +1,47 @@
+
+-- Convert the rows of a source query (see table_source_query) with the configured engine
+-- A row that fails is recorded in postgis_to_osm.rejects instead of aborting the conversion
+-- Returns the number of rows read
+DROP FUNCTION IF EXISTS postgis_to_osm.source_to_osm;
+CREATE OR REPLACE FUNCTION postgis_to_osm.source_to_osm(
+   source_query TEXT,
+   psql_table TEXT
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_engine TEXT DEFAULT 'row';
+   v_row RECORD;
+   v_rows BIGINT := 0;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Conversion engine: row (one geometry_to_osm call per row) or set (all rows at once)
+   SELECT lower(conversion_engine) INTO v_engine
+   FROM postgis_to_osm.config
+   LIMIT 1;
+
+   IF v_engine = 'set' THEN
+      BEGIN
+         RETURN postgis_to_osm.source_to_osm_set(source_query);
+      EXCEPTION
+         -- Some row broke the set: convert these rows one by one to isolate it
+         WHEN OTHERS THEN
+            NULL;
+      END;
+   END IF;
+
+   FOR v_row IN EXECUTE format('SELECT geom, fields, row_key FROM (%s) AS src', source_query)
+   LOOP
+      BEGIN
+         PERFORM postgis_to_osm.geometry_to_osm(v_row.geom, v_row.fields, TRUE);
+      EXCEPTION
+         WHEN OTHERS THEN
+            INSERT INTO postgis_to_osm.rejects (source_table, row_key, error)
+            VALUES (psql_table, v_row.row_key, SQLERRM);
+      END;
+      v_rows := v_rows + 1;
+   END LOOP;
+
+   RETURN v_rows;
+END;
+$$;
@@ -0,0 +1,255 @@
+
+-- Set-based conversion engine: converts every row of a source query at once
+-- source_query must return two columns: geom (geometry, simplified or not and in 4326, as
+-- table_source_query returns it) and fields (TEXT[][])
+-- Returns the number of converted rows
+--
+-- Instead of one geometry_to_osm() call per row (and one point_to_node() call per vertex),
+-- all points are dumped once, nodes are created with a single GROUP BY, nds arrays are built
+-- with array_agg(... ORDER BY path) and relation members the same way.
+-- The result lands in the same nodes/ways/relations tables, deduplicated by the same indexes.
+-- GEOMETRYCOLLECTIONs are nested structures and are still handed to geometry_to_osm().
+DROP FUNCTION IF EXISTS postgis_to_osm.source_to_osm_set;
+CREATE OR REPLACE FUNCTION postgis_to_osm.source_to_osm_set(
+  source_query TEXT
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+  empty_hash UUID := postgis_to_osm.tags_hash(ARRAY[]::TEXT[][]);
+  v_rows BIGINT;
+BEGIN
+  -- Working tables (session scoped)
+  CREATE TEMP TABLE IF NOT EXISTS osm_set_rows (
+    rid BIGINT,
+    geom GEOMETRY,
+    geom_type TEXT,
+    rel_type TEXT, -- relation 'type' tag when the row becomes a relation
+    fields TEXT[][]
+  );
+  CREATE TEMP TABLE IF NOT EXISTS osm_set_points (
+    rid BIGINT,
+    part INT,
+    is_member BOOLEAN,
+    lat INTEGER, -- 1e-7 degrees, as in postgis_to_osm.nodes
+    lon INTEGER,
+    tags TEXT[][],
+    tags_hash UUID,
+    node_id BIGINT
+  );
+  CREATE TEMP TABLE IF NOT EXISTS osm_set_lines (
+    lkey BIGSERIAL,
+    rid BIGINT,
+    part INT,
+    subpart INT,
+    is_member BOOLEAN,
+    role TEXT,
+    geom GEOMETRY,
+    fields TEXT[][],
+    nds BIGINT[],
+    fingerprint UUID,
+    way_id BIGINT
+  );
+  CREATE TEMP TABLE IF NOT EXISTS osm_set_vertices (
+    lkey BIGINT,
+    idx INT,
+    lat INTEGER,
+    lon INTEGER,
+    node_id BIGINT
+  );
+  TRUNCATE osm_set_rows, osm_set_points, osm_set_lines, osm_set_vertices;
+
+  -- 1. Source rows (the source query simplifies and transforms them, see plan_table)
+  EXECUTE format(
+    'INSERT INTO osm_set_rows (rid, geom, fields)
+     SELECT row_number() OVER (), geom, fields
+     FROM (%s) AS src
+     WHERE geom IS NOT NULL',
+    source_query
+  );
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  UPDATE osm_set_rows
+  SET geom_type = ST_GeometryType(geom),
+      rel_type = CASE
+        WHEN ST_GeometryType(geom) IN ('ST_MultiPoint', 'ST_MultiLineString') THEN 'collection'
+        WHEN ST_GeometryType(geom) = 'ST_MultiPolygon' THEN 'multipolygon'
+        WHEN ST_GeometryType(geom) = 'ST_Polygon' AND ST_NumInteriorRings(geom) > 0 THEN 'multipolygon'
+      END;
+
+  -- 2. Points: POINT rows are tagged nodes, MULTIPOINT parts are relation members
+  INSERT INTO osm_set_points (rid, part, is_member, lat, lon, tags)
+  SELECT rid, 0, FALSE,
+         round(ST_Y(geom)::numeric * 10000000), round(ST_X(geom)::numeric * 10000000),
+         CASE WHEN array_length(fields, 1) IS NULL THEN '{}' ELSE fields END
+  FROM osm_set_rows
+  WHERE geom_type = 'ST_Point';
+
+  INSERT INTO osm_set_points (rid, part, is_member, lat, lon, tags)
+  SELECT r.rid, d.path[1], TRUE,
+         round(ST_Y(d.geom)::numeric * 10000000), round(ST_X(d.geom)::numeric * 10000000),
+         ARRAY[ARRAY['','']]
+  FROM osm_set_rows AS r
+  CROSS JOIN LATERAL ST_Dump(r.geom) AS d
+  WHERE r.geom_type = 'ST_MultiPoint';
+
+  UPDATE osm_set_points SET tags_hash = postgis_to_osm.tags_hash(tags);
+
+  -- 3. Lines: every linear element becomes a way
+    -- LINESTRINGs and POLYGONs without holes are tagged ways
+  INSERT INTO osm_set_lines (rid, part, subpart, is_member, role, geom, fields)
+  SELECT rid, 0, 0, FALSE, NULL,
+         CASE WHEN geom_type = 'ST_Polygon' THEN ST_ExteriorRing(geom) ELSE geom END,
+         fields
+  FROM osm_set_rows
+  WHERE geom_type = 'ST_LineString'
+     OR (geom_type = 'ST_Polygon' AND rel_type IS NULL);
+
+    -- MULTILINESTRING parts are relation members
+  INSERT INTO osm_set_lines (rid, part, subpart, is_member, role, geom, fields)
+  SELECT r.rid, d.path[1], 0, TRUE, '', d.geom, ARRAY[ARRAY['','']]
+  FROM osm_set_rows AS r
+  CROSS JOIN LATERAL ST_Dump(r.geom) AS d
+  WHERE r.geom_type = 'ST_MultiLineString';
+
+    -- MULTIPOLYGON (and POLYGON with holes) rings are outer/inner members
+  INSERT INTO osm_set_lines (rid, part, subpart, is_member, role, geom, fields)
+  SELECT r.rid, p.path[1], ring.path[1], TRUE,
+         CASE WHEN ring.path[1] = 0 THEN 'outer' ELSE 'inner' END,
+         ST_ExteriorRing(ring.geom),
+         ARRAY[ARRAY['','']]
+  FROM osm_set_rows AS r
+  CROSS JOIN LATERAL ST_Dump(ST_Multi(r.geom)) AS p
+  CROSS JOIN LATERAL ST_DumpRings(p.geom) AS ring
+  WHERE r.rel_type = 'multipolygon';
+
+  -- 4. Vertices of every line, dumped once
+  INSERT INTO osm_set_vertices (lkey, idx, lat, lon)
+  SELECT l.lkey, d.path[array_upper(d.path, 1)],
+         round(ST_Y(d.geom)::numeric * 10000000), round(ST_X(d.geom)::numeric * 10000000)
+  FROM osm_set_lines AS l
+  CROSS JOIN LATERAL ST_DumpPoints(l.geom) AS d;
+
+  -- 5. Nodes: one per distinct coordinate and tags, numbered in order of first appearance
+  INSERT INTO postgis_to_osm.nodes (lat, lon, tags)
+  SELECT lat, lon, tags
+  FROM (
+    SELECT lat, lon, tags, min(ARRAY[rid, part, subpart, idx]) AS first_seen
+    FROM (
+      SELECT v.lat, v.lon, '{}'::TEXT[] AS tags, l.rid, l.part, l.subpart, v.idx
+      FROM osm_set_vertices AS v
+      JOIN osm_set_lines AS l USING (lkey)
+      UNION ALL
+      SELECT lat, lon, tags, rid, part, 0, 0
+      FROM osm_set_points
+    ) AS candidates
+    GROUP BY lat, lon, tags
+  ) AS new_nodes
+  ORDER BY first_seen
+  ON CONFLICT (lat, lon, tags_hash) DO NOTHING;
+
+  UPDATE osm_set_vertices AS v
+  SET node_id = n.id
+  FROM postgis_to_osm.nodes AS n
+  WHERE n.lat = v.lat AND n.lon = v.lon AND n.tags_hash = empty_hash;
+
+  UPDATE osm_set_points AS p
+  SET node_id = n.id
+  FROM postgis_to_osm.nodes AS n
+  WHERE n.lat = p.lat AND n.lon = p.lon AND n.tags_hash = p.tags_hash;
+
+  -- 6. Ways: nds arrays in vertex order, one way per distinct nds, tags merged in row order
+  UPDATE osm_set_lines AS l
+  SET nds = v.nds,
+      fingerprint = postgis_to_osm.nds_fingerprint(v.nds)
+  FROM (
+    SELECT lkey, array_agg(node_id ORDER BY idx) AS nds
+    FROM osm_set_vertices
+    GROUP BY lkey
+  ) AS v
+  WHERE v.lkey = l.lkey;
+
+  INSERT INTO postgis_to_osm.ways AS w (nds, tags)
+  SELECT nds, tags
+  FROM (
+    SELECT min(nds) AS nds,
+           postgis_to_osm.merge_way_tags_agg(fields ORDER BY rid, part, subpart) AS tags,
+           min(ARRAY[rid, part, subpart]) AS first_seen
+    FROM osm_set_lines
+    WHERE nds IS NOT NULL
+    GROUP BY fingerprint
+  ) AS new_ways
+  ORDER BY first_seen
+  ON CONFLICT (fingerprint) DO UPDATE
+    SET tags = postgis_to_osm.merge_way_tags(w.tags, EXCLUDED.tags)
+    WHERE postgis_to_osm.merge_way_tags(w.tags, EXCLUDED.tags) IS DISTINCT FROM w.tags;
+
+  UPDATE osm_set_lines AS l
+  SET way_id = w.id
+  FROM postgis_to_osm.ways AS w
+  WHERE w.fingerprint = l.fingerprint;
+
+  -- 7. Relations: member types, refs and roles in part order, one relation per member set
+  WITH member_rows AS (
+    SELECT rid, part, subpart, 'way' AS member_type, way_id AS ref, role
+    FROM osm_set_lines
+    WHERE is_member
+    UNION ALL
+    SELECT rid, part, 0, 'node', node_id, ''
+    FROM osm_set_points
+    WHERE is_member
+  ),
+  rel AS (
+    SELECT r.rid,
+           m.member_types,
+           m.member_refs,
+           m.member_roles,
+           postgis_to_osm.members_fingerprint(m.member_types, m.member_refs, m.member_roles) AS fingerprint,
+           postgis_to_osm.with_type_tag(r.fields, r.rel_type) AS tags
+    FROM osm_set_rows AS r
+    JOIN (
+      SELECT rid,
+             array_agg(member_type ORDER BY part, subpart) AS member_types,
+             array_agg(ref ORDER BY part, subpart) AS member_refs,
+             array_agg(role ORDER BY part, subpart) AS member_roles
+      FROM member_rows
+      GROUP BY rid
+    ) AS m ON m.rid = r.rid
+  ),
+  firsts AS (
+    SELECT DISTINCT ON (fingerprint) fingerprint, rid, member_types, member_refs, member_roles
+    FROM rel
+    ORDER BY fingerprint, rid
+  ),
+  merged AS (
+    SELECT fingerprint, postgis_to_osm.merge_relation_tags_agg(tags ORDER BY rid) AS tags
+    FROM rel
+    GROUP BY fingerprint
+  )
+  INSERT INTO postgis_to_osm.relations AS rl (member_types, member_refs, member_roles, tags)
+  SELECT f.member_types, f.member_refs, f.member_roles, m.tags
+  FROM firsts AS f
+  JOIN merged AS m USING (fingerprint)
+  ORDER BY f.rid
+  ON CONFLICT (fingerprint) DO UPDATE
+    SET tags = postgis_to_osm.merge_relation_tags(rl.tags, EXCLUDED.tags)
+    WHERE postgis_to_osm.merge_relation_tags(rl.tags, EXCLUDED.tags) IS DISTINCT FROM rl.tags;
+
+  -- 8. GEOMETRYCOLLECTIONs go through the row engine
+  PERFORM postgis_to_osm.geometry_to_osm(geom, fields, TRUE)
+  FROM osm_set_rows
+  WHERE geom_type = 'ST_GeometryCollection'
+  ORDER BY rid;
+
+  RETURN v_rows;
+END;
+$$;
+
+
+/*
+-- Test zone
+SELECT postgis_to_osm.source_to_osm_set($q$
+  SELECT ST_GeomFromText('MULTIPOLYGON(((-51.155 -29.8546, -51.155 -29.8544, -51.1548 -29.8544, -51.1548 -29.8546, -51.155 -29.8546)))', 4326) AS geom,
+         ARRAY[ARRAY['name','Jungloo Woods']] AS fields
+$q$);
+*/
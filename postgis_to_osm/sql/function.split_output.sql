@@ -0,0 +1,288 @@
+-- Split the staging elements into self-contained parts (config: split_output, split_size),
+-- recorded in postgis_to_osm.output_parts. Every element nothing refers to (a root: the
+-- element of a source row) goes into one part together with everything it refers to, so
+-- that every way ships with its nodes and every relation with its members and their nodes.
+-- An element needed by roots of several parts is written in each of them.
+--   grid     : split_size x split_size cells over the extent of the roots, by their centre
+--   elements : roots in spatial order (geohash of their centre), at most split_size elements per part
+--   bytes    : same, at most about split_size bytes of XML per part, from element_sizes:
+--              the bytes of each part of an element as build_osm_file renders it (see
+--              build_osm_file.xml_sizes)
+-- The caps count every element of a part once and in full: a root adds the elements the
+-- part does not hold yet, so an element shared with the roots of other parts counts in each
+-- of them, as it is written in each. A root larger than the cap gets a part of its own.
+-- Returns one row per part: its element counts and its bbox (1e-7 degrees), for the manifest
+DROP FUNCTION IF EXISTS postgis_to_osm.split_output;
+CREATE OR REPLACE FUNCTION postgis_to_osm.split_output(
+   split_mode TEXT,
+   split_size BIGINT,
+   element_sizes JSONB DEFAULT NULL
+)
+RETURNS TABLE (
+   part INT,
+   nodes BIGINT,
+   ways BIGINT,
+   relations BIGINT,
+   min_lat INTEGER,
+   min_lon INTEGER,
+   max_lat INTEGER,
+   max_lon INTEGER
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_root RECORD;
+   v_weight BIGINT;
+   v_total BIGINT;
+   v_roots BIGINT := 0;
+   v_part INT := 1;
+   v_file BIGINT := 0;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   IF split_mode NOT IN ('grid', 'elements', 'bytes') THEN
+      RAISE EXCEPTION 'Unknown split_output "%" (grid, elements or bytes).', split_mode;
+   END IF;
+   IF split_size IS NULL OR split_size < 1 THEN
+      RAISE EXCEPTION 'split_size must be a positive number, not %.', split_size;
+   END IF;
+   IF split_mode = 'bytes' AND element_sizes IS NULL THEN
+      RAISE EXCEPTION 'split_output "bytes" needs the element_sizes of the renderers.';
+   END IF;
+
+   -- Elements referred to by a way or a relation
+   CREATE TEMP TABLE IF NOT EXISTS split_refs (
+      element_type TEXT,
+      element_id BIGINT,
+      PRIMARY KEY (element_type, element_id)
+   );
+   -- Elements each root needs, itself included
+   CREATE TEMP TABLE IF NOT EXISTS split_closure (
+      root_type TEXT,
+      root_id BIGINT,
+      element_type TEXT,
+      element_id BIGINT
+   );
+   CREATE INDEX IF NOT EXISTS split_closure_root_idx ON split_closure (root_type, root_id);
+   -- Size of every element of a closure: 1 (elements) or the bytes of its XML (bytes)
+   CREATE TEMP TABLE IF NOT EXISTS split_sizes (
+      element_type TEXT,
+      element_id BIGINT,
+      size BIGINT,
+      PRIMARY KEY (element_type, element_id)
+   );
+   -- Centre, weight (size of its whole closure) and part of each root
+   CREATE TEMP TABLE IF NOT EXISTS split_roots (
+      root_type TEXT,
+      root_id BIGINT,
+      lat INTEGER,
+      lon INTEGER,
+      weight BIGINT,
+      seq BIGINT,
+      part INT,
+      PRIMARY KEY (root_type, root_id)
+   );
+   -- Elements the part being filled already holds
+   CREATE TEMP TABLE IF NOT EXISTS split_held (
+      element_type TEXT,
+      element_id BIGINT,
+      PRIMARY KEY (element_type, element_id)
+   );
+   TRUNCATE split_refs, split_closure, split_sizes, split_roots, split_held, postgis_to_osm.output_parts;
+
+   INSERT INTO split_refs (element_type, element_id)
+   SELECT 'node', nd
+   FROM postgis_to_osm.ways
+   CROSS JOIN LATERAL unnest(nds) AS nd
+   UNION
+   SELECT m.member_type, m.ref
+   FROM postgis_to_osm.relations
+   CROSS JOIN LATERAL unnest(member_types, member_refs) AS m(member_type, ref);
+
+   -- Root relations, the relations below them (UNION stops on cycles), their member
+   -- nodes and ways, and the nodes of those ways
+   INSERT INTO split_closure (root_type, root_id, element_type, element_id)
+   WITH RECURSIVE tree(root_id, relation_id) AS (
+      SELECT r.id, r.id
+      FROM postgis_to_osm.relations AS r
+      WHERE NOT EXISTS (
+         SELECT 1 FROM split_refs AS s WHERE s.element_type = 'relation' AND s.element_id = r.id
+      )
+      UNION
+      SELECT t.root_id, m.ref
+      FROM tree AS t
+      JOIN postgis_to_osm.relations AS r ON r.id = t.relation_id
+      CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+      WHERE m.member_type = 'relation'
+   ),
+   members AS (
+      SELECT t.root_id, m.member_type, m.ref
+      FROM tree AS t
+      JOIN postgis_to_osm.relations AS r ON r.id = t.relation_id
+      CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+   )
+   SELECT 'relation', root_id, 'relation', relation_id FROM tree
+   UNION
+   SELECT 'relation', root_id, member_type, ref FROM members WHERE member_type IN ('node', 'way')
+   UNION
+   SELECT 'relation', m.root_id, 'node', nd
+   FROM members AS m
+   JOIN postgis_to_osm.ways AS w ON m.member_type = 'way' AND w.id = m.ref
+   CROSS JOIN LATERAL unnest(w.nds) AS nd;
+
+   -- Root ways and their nodes (a closed way lists its first node twice)
+   INSERT INTO split_closure (root_type, root_id, element_type, element_id)
+   SELECT 'way', w.id, 'way', w.id
+   FROM postgis_to_osm.ways AS w
+   WHERE NOT EXISTS (SELECT 1 FROM split_refs AS s WHERE s.element_type = 'way' AND s.element_id = w.id)
+   UNION
+   SELECT 'way', w.id, 'node', nd
+   FROM postgis_to_osm.ways AS w
+   CROSS JOIN LATERAL unnest(w.nds) AS nd
+   WHERE NOT EXISTS (SELECT 1 FROM split_refs AS s WHERE s.element_type = 'way' AND s.element_id = w.id);
+
+   -- Root nodes: points of the source
+   INSERT INTO split_closure (root_type, root_id, element_type, element_id)
+   SELECT 'node', n.id, 'node', n.id
+   FROM postgis_to_osm.nodes AS n
+   WHERE NOT EXISTS (SELECT 1 FROM split_refs AS s WHERE s.element_type = 'node' AND s.element_id = n.id);
+
+   -- Bytes of every element as build_osm_file writes it: its line(s), one per nd or member,
+   -- and one per tag with its key and value (an end tag for a tagged node)
+   INSERT INTO split_sizes (element_type, element_id, size)
+   SELECT sizes.element_type, sizes.element_id,
+          CASE
+             WHEN split_mode = 'bytes' THEN
+                sizes.size + COALESCE(
+                   octet_length(array_to_string(sizes.tags, '')) + (element_sizes->>'tags')::BIGINT * array_length(sizes.tags, 1),
+                   0
+                )
+             ELSE 1
+          END
+   FROM (
+      SELECT 'node'::TEXT AS element_type, id AS element_id,
+             (element_sizes->>'nodes')::BIGINT
+             + CASE WHEN tags IS NULL THEN 0 ELSE (element_sizes->>'tagged_nodes')::BIGINT END AS size,
+             tags
+      FROM postgis_to_osm.nodes
+      UNION ALL
+      SELECT 'way', id, (element_sizes->>'ways')::BIGINT + (element_sizes->>'nd_refs')::BIGINT * COALESCE(cardinality(nds), 0), tags
+      FROM postgis_to_osm.ways
+      UNION ALL
+      SELECT 'relation', id,
+             (element_sizes->>'relations')::BIGINT + (element_sizes->>'members')::BIGINT * COALESCE(cardinality(member_refs), 0),
+             tags
+      FROM postgis_to_osm.relations
+   ) AS sizes
+   WHERE EXISTS (
+      SELECT 1 FROM split_closure AS c
+      WHERE c.element_type = sizes.element_type AND c.element_id = sizes.element_id
+   );
+
+   INSERT INTO split_roots (root_type, root_id, lat, lon, weight)
+   SELECT c.root_type, c.root_id,
+          avg(n.lat)::INTEGER, avg(n.lon)::INTEGER,
+          sum(s.size)
+   FROM split_closure AS c
+   JOIN split_sizes AS s ON s.element_type = c.element_type AND s.element_id = c.element_id
+   LEFT JOIN postgis_to_osm.nodes AS n ON c.element_type = 'node' AND n.id = c.element_id
+   GROUP BY c.root_type, c.root_id;
+
+   IF split_mode = 'grid' THEN
+      -- Non-empty cells, numbered from the south-west
+      UPDATE split_roots AS r
+      SET part = g.part
+      FROM (
+         SELECT root_type, root_id,
+                dense_rank() OVER (ORDER BY cell_lat, cell_lon)::INT AS part
+         FROM (
+            SELECT root_type, root_id,
+                   least(split_size - 1, floor((lat - e.lat_min)::NUMERIC * split_size / greatest(e.lat_max - e.lat_min, 1))) AS cell_lat,
+                   least(split_size - 1, floor((lon - e.lon_min)::NUMERIC * split_size / greatest(e.lon_max - e.lon_min, 1))) AS cell_lon
+            FROM split_roots
+            CROSS JOIN (
+               SELECT min(lat) AS lat_min, max(lat) AS lat_max, min(lon) AS lon_min, max(lon) AS lon_max
+               FROM split_roots
+            ) AS e
+         ) AS cells
+      ) AS g
+      WHERE r.root_type = g.root_type AND r.root_id = g.root_id;
+   ELSE
+      -- Roots in spatial order, so that the neighbours of a root (and the elements they
+      -- share) mostly land in its part
+      UPDATE split_roots AS r
+      SET seq = o.seq
+      FROM (
+         SELECT root_type, root_id,
+                row_number() OVER (
+                   ORDER BY ST_GeoHash(ST_SetSRID(ST_MakePoint(COALESCE(lon, 0) / 10000000.0, COALESCE(lat, 0) / 10000000.0), 4326), 12),
+                            root_type, root_id
+                ) AS seq
+         FROM split_roots
+      ) AS o
+      WHERE r.root_type = o.root_type AND r.root_id = o.root_id;
+
+      -- A new part starts where the next root would exceed the cap. A root costs the
+      -- elements of its closure the part does not hold yet; in a new part, all of them.
+      -- The start and end of the file count too (bytes)
+      IF split_mode = 'bytes' THEN
+         v_file := (element_sizes->>'file')::BIGINT;
+      END IF;
+      v_total := v_file;
+      FOR v_root IN SELECT root_type, root_id, weight FROM split_roots ORDER BY seq LOOP
+         SELECT COALESCE(sum(s.size), 0)
+         INTO v_weight
+         FROM split_closure AS c
+         JOIN split_sizes AS s ON s.element_type = c.element_type AND s.element_id = c.element_id
+         WHERE c.root_type = v_root.root_type AND c.root_id = v_root.root_id
+           AND NOT EXISTS (
+              SELECT 1 FROM split_held AS h
+              WHERE h.element_type = c.element_type AND h.element_id = c.element_id
+           );
+         IF v_roots > 0 AND v_total + v_weight > split_size THEN
+            v_part := v_part + 1;
+            v_roots := 0;
+            v_total := v_file;
+            v_weight := v_root.weight;
+            DELETE FROM split_held;
+         END IF;
+         v_roots := v_roots + 1;
+         v_total := v_total + v_weight;
+
+         INSERT INTO split_held (element_type, element_id)
+         SELECT c.element_type, c.element_id
+         FROM split_closure AS c
+         WHERE c.root_type = v_root.root_type AND c.root_id = v_root.root_id
+         ON CONFLICT DO NOTHING;
+         UPDATE split_roots SET part = v_part
+         WHERE root_type = v_root.root_type AND root_id = v_root.root_id;
+      END LOOP;
+   END IF;
+
+   INSERT INTO postgis_to_osm.output_parts (part, element_type, element_id)
+   SELECT DISTINCT r.part, c.element_type, c.element_id
+   FROM split_closure AS c
+   JOIN split_roots AS r ON r.root_type = c.root_type AND r.root_id = c.root_id;
+
+   TRUNCATE split_refs, split_closure, split_sizes, split_roots, split_held;
+
+   RETURN QUERY
+   SELECT p.part,
+          count(*) FILTER (WHERE p.element_type = 'node'),
+          count(*) FILTER (WHERE p.element_type = 'way'),
+          count(*) FILTER (WHERE p.element_type = 'relation'),
+          min(n.lat), min(n.lon), max(n.lat), max(n.lon)
+   FROM postgis_to_osm.output_parts AS p
+   LEFT JOIN postgis_to_osm.nodes AS n ON p.element_type = 'node' AND n.id = p.element_id
+   GROUP BY p.part
+   ORDER BY p.part;
+END;
+$$;
+
+
+-- Test zone
+/*
+SELECT * FROM postgis_to_osm.split_output('elements', 100000);
+SELECT * FROM postgis_to_osm.split_output('bytes', 1048576,
+   '{"file": 99, "nodes": 78, "ways": 45, "relations": 53, "nd_refs": 27, "members": 52, "tags": 22, "tagged_nodes": 8}');
+SELECT * FROM postgis_to_osm.split_output('grid', 4);
+SELECT part, element_type, count(*) FROM postgis_to_osm.output_parts GROUP BY 1, 2 ORDER BY 1, 2;
+*/
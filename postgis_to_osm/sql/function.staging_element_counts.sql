@@ -0,0 +1,48 @@
+-- Created and used elements of the staging tables, per table (see run_metrics.py)
+--   created : rows of the table, one per distinct node, way or relation
+--   used    : references from ways (nds) and relations (members), plus one for every
+--             element nothing refers to (the element of a source row)
+-- used - created (extra_uses) approximates what deduplication saved, the elements found
+-- again instead of created. It is inferred from the references, not counted where the
+-- lookups hit: a closed way lists its first node twice, a way or relation may refer to an
+-- element several times, and elements found again by an earlier incremental run or
+-- removed since do not show
+DROP FUNCTION IF EXISTS postgis_to_osm.staging_element_counts;
+CREATE OR REPLACE FUNCTION postgis_to_osm.staging_element_counts()
+RETURNS TABLE (element_type TEXT, created BIGINT, used BIGINT)
+LANGUAGE sql STABLE AS $$
+  WITH refs AS (
+    SELECT ref_type, id, count(*) AS uses
+    FROM (
+      SELECT 'node'::TEXT AS ref_type, nd AS id
+      FROM postgis_to_osm.ways
+      CROSS JOIN LATERAL unnest(nds) AS nd
+      UNION ALL
+      SELECT m.member_type, m.ref
+      FROM postgis_to_osm.relations
+      CROSS JOIN LATERAL unnest(member_types, member_refs) AS m(member_type, ref)
+    ) AS all_refs
+    GROUP BY ref_type, id
+  ),
+  elements AS (
+    SELECT 'nodes'::TEXT AS element_type, 'node'::TEXT AS ref_type, id FROM postgis_to_osm.nodes
+    UNION ALL
+    SELECT 'ways', 'way', id FROM postgis_to_osm.ways
+    UNION ALL
+    SELECT 'relations', 'relation', id FROM postgis_to_osm.relations
+  )
+  SELECT t.element_type,
+         count(e.id),
+         COALESCE(sum(COALESCE(r.uses, 1)) FILTER (WHERE e.id IS NOT NULL), 0)::BIGINT
+  FROM (VALUES ('nodes', 1), ('ways', 2), ('relations', 3)) AS t(element_type, position)
+  LEFT JOIN elements AS e ON e.element_type = t.element_type
+  LEFT JOIN refs AS r ON r.ref_type = e.ref_type AND r.id = e.id
+  -- Raises when the search_path does not start with a staging schema
+  WHERE postgis_to_osm.staging_schema() IS NOT NULL
+  GROUP BY t.element_type, t.position
+  ORDER BY t.position;
+$$;
+
+
+-- Test zone
+--SELECT * FROM postgis_to_osm.staging_element_counts();
@@ -0,0 +1,40 @@
+
+-- Start (or resume) the chunked conversion of a table
+-- Returns the number of rows already converted by a previous, interrupted run
+-- keep_staging: add the table to what staging already holds (batch with a shared node space)
+DROP FUNCTION IF EXISTS postgis_to_osm.start_table_conversion;
+CREATE OR REPLACE FUNCTION postgis_to_osm.start_table_conversion(
+   psql_table TEXT,
+   keep_staging BOOLEAN DEFAULT FALSE
+)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_rows_done BIGINT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Staging holds another (or an already finished) conversion: start over
+   IF NOT keep_staging AND EXISTS (
+       SELECT 1
+       FROM postgis_to_osm.checkpoints
+       WHERE source_table <> psql_table OR finished
+   ) THEN
+       PERFORM postgis_to_osm.reset_staging();
+   END IF;
+
+   -- Settings, geometry column and fields of the table, resolved once for every chunk
+   PERFORM postgis_to_osm.plan_table(psql_table);
+
+   SELECT rows_done INTO v_rows_done
+   FROM postgis_to_osm.checkpoints
+   WHERE source_table = psql_table;
+
+   IF NOT FOUND THEN
+       INSERT INTO postgis_to_osm.checkpoints (source_table, key_column)
+       VALUES (psql_table, postgis_to_osm.table_key_column(psql_table));
+       v_rows_done := 0;
+   END IF;
+
+   RETURN v_rows_done;
+END;
+$$;
@@ -0,0 +1,384 @@
+-- Element type geometry_to_osm returns for a geometry of a source query (node, way or
+-- relation); the geometry is already simplified (or not), see plan_table
+DROP FUNCTION IF EXISTS postgis_to_osm.geometry_element_type;
+CREATE OR REPLACE FUNCTION postgis_to_osm.geometry_element_type(
+  geom GEOMETRY
+)
+RETURNS TEXT
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF geom IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  RETURN CASE ST_GeometryType(geom)
+    WHEN 'ST_Point' THEN 'node'
+    WHEN 'ST_LineString' THEN 'way'
+    WHEN 'ST_Polygon' THEN CASE WHEN ST_NumInteriorRings(geom) = 0 THEN 'way' ELSE 'relation' END
+    ELSE 'relation'
+  END;
+END;
+$$;
+
+
+-- Incremental conversion of a table (config: incremental)
+-- Staging is kept between runs. Every source row is remembered in postgis_to_osm.source_rows
+-- with its version (xmin, and a hash of the plan of the table) and the element it produced.
+-- A run converts only:
+--   * added rows and rows whose version changed (updated, or the plan changed)
+--   * unchanged rows that produced the same element as a changed or deleted row (the tags
+--     of that element are rebuilt from the rows that still produce it)
+-- Elements of changed and deleted rows that no row leads to anymore are deleted. Created,
+-- modified and deleted elements are recorded in postgis_to_osm.changes (osmChange output).
+-- Only the elements of changed, deleted and converted rows are looked at: the cost of a run
+-- follows the size of the change, not the size of the table
+-- Returns the number of added, changed and deleted source rows
+DROP FUNCTION IF EXISTS postgis_to_osm.sync_table_changes;
+CREATE OR REPLACE FUNCTION postgis_to_osm.sync_table_changes(
+   psql_table TEXT
+)
+RETURNS TABLE (rows_added BIGINT, rows_changed BIGINT, rows_deleted BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_query TEXT;
+   v_plan_hash TEXT;
+   v_row RECORD;
+   v_id BIGINT;
+   v_node_min BIGINT;
+   v_way_min BIGINT;
+   v_relation_min BIGINT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Plan the table again: the config may have changed since the last run
+   PERFORM postgis_to_osm.plan_table(psql_table);
+   v_query := postgis_to_osm.table_source_query(psql_table);
+   -- A different plan (fields, geometry, filters) changes every row
+   v_plan_hash := left(md5(v_query), 8);
+
+   -- Elements are looked up by id below
+   PERFORM postgis_to_osm.create_staging_indexes();
+
+   CREATE TEMP TABLE IF NOT EXISTS sync_rows (row_key TEXT PRIMARY KEY, row_hash TEXT);
+   CREATE TEMP TABLE IF NOT EXISTS sync_keys (row_key TEXT PRIMARY KEY, status TEXT);
+   CREATE TEMP TABLE IF NOT EXISTS sync_tops (element_type TEXT, element_id BIGINT);
+   CREATE TEMP TABLE IF NOT EXISTS sync_tags (element_type TEXT, element_id BIGINT, tags_md5 TEXT);
+   CREATE TEMP TABLE IF NOT EXISTS sync_candidates (element_type TEXT, element_id BIGINT, PRIMARY KEY (element_type, element_id));
+   CREATE TEMP TABLE IF NOT EXISTS sync_touched (element_type TEXT, element_id BIGINT, PRIMARY KEY (element_type, element_id));
+   CREATE TEMP TABLE IF NOT EXISTS sync_alive (element_type TEXT, element_id BIGINT, PRIMARY KEY (element_type, element_id));
+   TRUNCATE sync_rows, sync_keys, sync_tops, sync_tags, sync_candidates, sync_touched, sync_alive;
+
+   -- Rejected rows are tried again
+   DELETE FROM postgis_to_osm.rejects WHERE source_table = psql_table;
+
+   -- Current rows and their versions: xmin, read without the geometry (only the columns
+   -- used here are computed). Views and foreign tables have no xmin: their geometry and
+   -- fields are hashed instead
+   EXECUTE format(
+      'INSERT INTO sync_rows (row_key, row_hash)
+       SELECT row_key, %L || COALESCE(row_version, md5(COALESCE(ST_AsEWKB(geom)::TEXT, '''') || fields::TEXT))
+       FROM (%s) AS src',
+      v_plan_hash || ':', v_query
+   );
+
+   -- Added, changed and deleted rows
+   INSERT INTO sync_keys (row_key, status)
+   SELECT c.row_key, CASE WHEN s.row_key IS NULL THEN 'added' ELSE 'changed' END
+   FROM sync_rows AS c
+   LEFT JOIN postgis_to_osm.source_rows AS s
+     ON s.source_table = psql_table AND s.row_key = c.row_key
+   WHERE s.row_hash IS DISTINCT FROM c.row_hash;
+
+   INSERT INTO sync_keys (row_key, status)
+   SELECT s.row_key, 'deleted'
+   FROM postgis_to_osm.source_rows AS s
+   WHERE s.source_table = psql_table
+     AND NOT EXISTS (SELECT 1 FROM sync_rows AS c WHERE c.row_key = s.row_key);
+
+   SELECT count(*) FILTER (WHERE status = 'added'),
+          count(*) FILTER (WHERE status = 'changed'),
+          count(*) FILTER (WHERE status = 'deleted')
+   INTO rows_added, rows_changed, rows_deleted
+   FROM sync_keys;
+
+   IF rows_added + rows_changed + rows_deleted = 0 THEN
+      RETURN NEXT;
+      RETURN;
+   END IF;
+
+   -- Elements of changed and deleted rows, and the unchanged rows sharing them
+   INSERT INTO sync_tops (element_type, element_id)
+   SELECT DISTINCT s.element_type, s.element_id
+   FROM postgis_to_osm.source_rows AS s
+   JOIN sync_keys AS k ON k.row_key = s.row_key
+   WHERE s.source_table = psql_table
+     AND s.element_id IS NOT NULL;
+
+   INSERT INTO sync_keys (row_key, status)
+   SELECT s.row_key, 'shared'
+   FROM postgis_to_osm.source_rows AS s
+   JOIN sync_tops AS t ON t.element_type = s.element_type AND t.element_id = s.element_id
+   WHERE s.source_table = psql_table
+   ON CONFLICT (row_key) DO NOTHING;
+
+   -- Elements that may be left without row: those of the changed and deleted rows, the
+   -- members of their relations (recursively) and the nodes of all of these ways
+   INSERT INTO sync_candidates (element_type, element_id)
+   WITH RECURSIVE candidate_relations(id) AS (
+      SELECT element_id FROM sync_tops WHERE element_type = 'relation'
+      UNION
+      SELECT m.ref
+      FROM candidate_relations AS cr
+      JOIN postgis_to_osm.relations AS r ON r.id = cr.id
+      CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+      WHERE m.member_type = 'relation'
+   )
+   SELECT 'relation', id FROM candidate_relations;
+
+   INSERT INTO sync_candidates (element_type, element_id)
+   SELECT element_type, element_id FROM sync_tops WHERE element_type IN ('way', 'node')
+   UNION
+   SELECT m.member_type, m.ref
+   FROM sync_candidates AS c
+   JOIN postgis_to_osm.relations AS r ON r.id = c.element_id
+   CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+   WHERE c.element_type = 'relation' AND m.member_type IN ('way', 'node')
+   ON CONFLICT DO NOTHING;
+
+   INSERT INTO sync_candidates (element_type, element_id)
+   SELECT DISTINCT 'node', nd
+   FROM sync_candidates AS c
+   JOIN postgis_to_osm.ways AS w ON w.id = c.element_id
+   CROSS JOIN LATERAL unnest(w.nds) AS nd
+   WHERE c.element_type = 'way'
+   ON CONFLICT DO NOTHING;
+
+   -- State before the conversion: tags of the ways and relations of the changed and deleted
+   -- rows, lowest IDs (new ones go below)
+   INSERT INTO sync_tags (element_type, element_id, tags_md5)
+   SELECT 'way', w.id, md5(COALESCE(w.tags::TEXT, ''))
+   FROM sync_candidates AS c
+   JOIN postgis_to_osm.ways AS w ON c.element_type = 'way' AND w.id = c.element_id
+   UNION ALL
+   SELECT 'relation', r.id, md5(COALESCE(r.tags::TEXT, ''))
+   FROM sync_candidates AS c
+   JOIN postgis_to_osm.relations AS r ON c.element_type = 'relation' AND r.id = c.element_id;
+
+   v_node_min := COALESCE((SELECT min(id) FROM postgis_to_osm.nodes), 0);
+   v_way_min := COALESCE((SELECT min(id) FROM postgis_to_osm.ways), 0);
+   v_relation_min := COALESCE((SELECT min(id) FROM postgis_to_osm.relations), 0);
+
+   -- The tags of these elements are rebuilt by the rows converted below
+   -- (unless rows of another table of a batch also lead to them)
+   UPDATE postgis_to_osm.ways AS w
+   SET tags = NULL
+   FROM sync_tops AS t
+   WHERE t.element_type = 'way' AND t.element_id = w.id
+     AND NOT EXISTS (
+        SELECT 1 FROM postgis_to_osm.source_rows AS s
+        WHERE s.element_type = 'way' AND s.element_id = w.id AND s.source_table <> psql_table
+     );
+   UPDATE postgis_to_osm.relations AS r
+   SET tags = NULL
+   FROM sync_tops AS t
+   WHERE t.element_type = 'relation' AND t.element_id = r.id
+     AND NOT EXISTS (
+        SELECT 1 FROM postgis_to_osm.source_rows AS s
+        WHERE s.element_type = 'relation' AND s.element_id = r.id AND s.source_table <> psql_table
+     );
+
+   DELETE FROM postgis_to_osm.source_rows AS s
+   USING sync_keys AS k
+   WHERE s.source_table = psql_table AND s.row_key = k.row_key;
+
+   -- Convert the rows again
+   FOR v_row IN EXECUTE format(
+      'SELECT src.geom, src.fields, src.row_key, c.row_hash
+       FROM (%s) AS src
+       JOIN sync_keys AS k ON k.row_key = src.row_key
+       JOIN sync_rows AS c ON c.row_key = src.row_key',
+      v_query
+   )
+   LOOP
+      BEGIN
+         v_id := postgis_to_osm.geometry_to_osm(v_row.geom, v_row.fields, TRUE);
+         INSERT INTO postgis_to_osm.source_rows (source_table, row_key, row_hash, element_type, element_id)
+         VALUES (
+            psql_table, v_row.row_key, v_row.row_hash,
+            CASE WHEN v_id IS NULL THEN NULL ELSE postgis_to_osm.geometry_element_type(v_row.geom) END,
+            v_id
+         );
+      EXCEPTION
+         WHEN OTHERS THEN
+            INSERT INTO postgis_to_osm.rejects (source_table, row_key, error)
+            VALUES (psql_table, v_row.row_key, SQLERRM);
+      END;
+   END LOOP;
+
+   -- Ways and relations the tags may have changed of: those of the changed and deleted rows,
+   -- and those the converted rows lead to (their elements and the members of their relations,
+   -- recursively), into which they may have merged tags
+   INSERT INTO sync_touched (element_type, element_id)
+   WITH RECURSIVE touched_relations(id) AS (
+      SELECT s.element_id
+      FROM postgis_to_osm.source_rows AS s
+      JOIN sync_keys AS k ON k.row_key = s.row_key
+      WHERE s.source_table = psql_table AND s.element_type = 'relation'
+      UNION
+      SELECT m.ref
+      FROM touched_relations AS tr
+      JOIN postgis_to_osm.relations AS r ON r.id = tr.id
+      CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+      WHERE m.member_type = 'relation'
+   )
+   SELECT 'relation', id FROM touched_relations;
+
+   INSERT INTO sync_touched (element_type, element_id)
+   SELECT s.element_type, s.element_id
+   FROM postgis_to_osm.source_rows AS s
+   JOIN sync_keys AS k ON k.row_key = s.row_key
+   WHERE s.source_table = psql_table AND s.element_type = 'way'
+   UNION
+   SELECT 'way', m.ref
+   FROM sync_touched AS t
+   JOIN postgis_to_osm.relations AS r ON r.id = t.element_id
+   CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+   WHERE t.element_type = 'relation' AND m.member_type = 'way'
+   UNION
+   SELECT element_type, element_id FROM sync_tags
+   ON CONFLICT DO NOTHING;
+
+   -- Reverse lookups of the candidates below (ways of a node, relations of a member): built
+   -- once the first run has loaded the table, maintained by the next ones
+   EXECUTE format('CREATE INDEX IF NOT EXISTS ways_nds_idx ON %I.ways USING gin (nds)', postgis_to_osm.staging_schema());
+   EXECUTE format(
+      'CREATE INDEX IF NOT EXISTS relations_member_refs_idx ON %I.relations USING gin (member_refs)',
+      postgis_to_osm.staging_schema()
+   );
+
+   -- Candidates still in use: led to by a source row, member of an element that is no
+   -- candidate (the rows that did not change still lead to it), or member of a candidate
+   -- in use
+   INSERT INTO sync_alive (element_type, element_id)
+   WITH RECURSIVE alive(element_type, element_id) AS (
+      SELECT c.element_type, c.element_id
+      FROM sync_candidates AS c
+      WHERE EXISTS (
+            SELECT 1 FROM postgis_to_osm.source_rows AS s
+            WHERE s.element_type = c.element_type AND s.element_id = c.element_id
+         )
+         OR (c.element_type = 'node' AND EXISTS (
+            SELECT 1 FROM postgis_to_osm.ways AS w
+            WHERE w.nds @> ARRAY[c.element_id]
+              AND NOT EXISTS (
+                 SELECT 1 FROM sync_candidates AS o WHERE o.element_type = 'way' AND o.element_id = w.id
+              )
+         ))
+         OR EXISTS (
+            SELECT 1
+            FROM postgis_to_osm.relations AS r
+            CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+            WHERE r.member_refs @> ARRAY[c.element_id]
+              AND m.member_type = c.element_type AND m.ref = c.element_id
+              AND NOT EXISTS (
+                 SELECT 1 FROM sync_candidates AS o WHERE o.element_type = 'relation' AND o.element_id = r.id
+              )
+         )
+      UNION
+      SELECT x.element_type, x.element_id
+      FROM alive AS a
+      CROSS JOIN LATERAL (
+         SELECT m.member_type, m.ref
+         FROM postgis_to_osm.relations AS r
+         CROSS JOIN LATERAL unnest(r.member_types, r.member_refs) AS m(member_type, ref)
+         WHERE a.element_type = 'relation' AND r.id = a.element_id
+         UNION ALL
+         SELECT 'node', nd
+         FROM postgis_to_osm.ways AS w
+         CROSS JOIN LATERAL unnest(w.nds) AS nd
+         WHERE a.element_type = 'way' AND w.id = a.element_id
+      ) AS x(element_type, element_id)
+      JOIN sync_candidates AS c ON c.element_type = x.element_type AND c.element_id = x.element_id
+   )
+   SELECT element_type, element_id FROM alive;
+
+   -- Record the changes: created (IDs below the previous lowest), modified (tags), deleted
+   INSERT INTO postgis_to_osm.changes (element_type, element_id, change)
+   SELECT 'node', id, 'create' FROM postgis_to_osm.nodes WHERE id < v_node_min
+   UNION ALL
+   SELECT 'way', id, 'create' FROM postgis_to_osm.ways WHERE id < v_way_min
+   UNION ALL
+   SELECT 'relation', id, 'create' FROM postgis_to_osm.relations WHERE id < v_relation_min
+   ON CONFLICT DO NOTHING;
+
+   -- Modified: tags that differ from the state before the conversion. The elements without
+   -- that state only changed when this run wrote them (xmin of this transaction: age <= 0)
+   INSERT INTO postgis_to_osm.changes (element_type, element_id, change)
+   SELECT t.element_type, t.element_id, 'modify'
+   FROM sync_touched AS t
+   JOIN postgis_to_osm.ways AS w ON t.element_type = 'way' AND w.id = t.element_id
+   LEFT JOIN sync_tags AS b ON b.element_type = 'way' AND b.element_id = w.id
+   WHERE w.id >= v_way_min
+     AND age(w.xmin) <= 0
+     AND (b.element_id IS NULL OR md5(COALESCE(w.tags::TEXT, '')) <> b.tags_md5)
+   UNION ALL
+   SELECT t.element_type, t.element_id, 'modify'
+   FROM sync_touched AS t
+   JOIN postgis_to_osm.relations AS r ON t.element_type = 'relation' AND r.id = t.element_id
+   LEFT JOIN sync_tags AS b ON b.element_type = 'relation' AND b.element_id = r.id
+   WHERE r.id >= v_relation_min
+     AND age(r.xmin) <= 0
+     AND (b.element_id IS NULL OR md5(COALESCE(r.tags::TEXT, '')) <> b.tags_md5)
+   ON CONFLICT DO NOTHING;
+
+   WITH deleted AS (
+      DELETE FROM postgis_to_osm.relations AS r
+      USING sync_candidates AS c
+      WHERE c.element_type = 'relation' AND c.element_id = r.id
+        AND NOT EXISTS (
+           SELECT 1 FROM sync_alive AS a WHERE a.element_type = 'relation' AND a.element_id = r.id
+        )
+      RETURNING 'relation'::TEXT AS element_type, r.id
+   )
+   INSERT INTO postgis_to_osm.changes (element_type, element_id, change)
+   SELECT element_type, id, 'delete' FROM deleted
+   ON CONFLICT (element_type, element_id) DO UPDATE
+      SET change = CASE WHEN changes.change = 'create' THEN 'forget' ELSE 'delete' END;
+
+   WITH deleted AS (
+      DELETE FROM postgis_to_osm.ways AS w
+      USING sync_candidates AS c
+      WHERE c.element_type = 'way' AND c.element_id = w.id
+        AND NOT EXISTS (
+           SELECT 1 FROM sync_alive AS a WHERE a.element_type = 'way' AND a.element_id = w.id
+        )
+      RETURNING 'way'::TEXT AS element_type, w.id
+   )
+   INSERT INTO postgis_to_osm.changes (element_type, element_id, change)
+   SELECT element_type, id, 'delete' FROM deleted
+   ON CONFLICT (element_type, element_id) DO UPDATE
+      SET change = CASE WHEN changes.change = 'create' THEN 'forget' ELSE 'delete' END;
+
+   WITH deleted AS (
+      DELETE FROM postgis_to_osm.nodes AS n
+      USING sync_candidates AS c
+      WHERE c.element_type = 'node' AND c.element_id = n.id
+        AND NOT EXISTS (
+           SELECT 1 FROM sync_alive AS a WHERE a.element_type = 'node' AND a.element_id = n.id
+        )
+      RETURNING 'node'::TEXT AS element_type, n.id
+   )
+   INSERT INTO postgis_to_osm.changes (element_type, element_id, change)
+   SELECT element_type, id, 'delete' FROM deleted
+   ON CONFLICT (element_type, element_id) DO UPDATE
+      SET change = CASE WHEN changes.change = 'create' THEN 'forget' ELSE 'delete' END;
+
+   -- Created and deleted in between two files: nothing to tell
+   DELETE FROM postgis_to_osm.changes WHERE change = 'forget';
+
+   RETURN NEXT;
+END;
+$$;
+
+
+-- Test zone
+--SELECT * FROM postgis_to_osm.sync_table_changes('public._recorte_faces_de_logradouros');
@@ -0,0 +1,39 @@
+
+-- Single column primary key of a table (NULL when there is none)
+-- Used to order conversion chunks and to identify rejected rows
+DROP FUNCTION IF EXISTS postgis_to_osm.table_key_column;
+CREATE OR REPLACE FUNCTION postgis_to_osm.table_key_column(
+   psql_table TEXT
+)
+RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT;
+   v_table  TEXT;
+   v_key    TEXT;
+BEGIN
+   -- Split schema and table
+   IF strpos(psql_table, '.') > 0 THEN
+       v_schema := split_part(psql_table, '.', 1);
+       v_table  := split_part(psql_table, '.', 2);
+   ELSE
+       v_schema := 'public';
+       v_table  := psql_table;
+   END IF;
+
+   SELECT a.attname INTO v_key
+   FROM pg_index AS i
+   JOIN pg_attribute AS a
+     ON a.attrelid = i.indrelid
+    AND a.attnum = i.indkey[0]
+   WHERE i.indrelid = format('%I.%I', v_schema, v_table)::regclass
+     AND i.indisprimary
+     AND i.indnatts = 1;
+
+   RETURN v_key;
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.table_key_column('public._recorte_faces_de_logradouros');
@@ -0,0 +1,84 @@
+-- Build the source query of a table from its plan (see plan_table): one row per source row with
+--   geom     : the geometry column, simplified (or not) and in 4326
+--   fields   : TEXT[][] of [column, value] for every planned field with a value
+--   row_key  : primary key (or ctid) of the row, as TEXT
+--   row_version : xmin of the row (changes with every UPDATE), NULL for views and foreign
+--                 tables, which have none (see sync_table_changes)
+-- Only the planned rows are read (source_filter, bbox). source_filter is an optional,
+-- additional WHERE condition (used for chunks and tiles)
+DROP FUNCTION IF EXISTS postgis_to_osm.table_source_query;
+CREATE OR REPLACE FUNCTION postgis_to_osm.table_source_query(
+   psql_table TEXT,
+   source_filter TEXT DEFAULT NULL
+)
+RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT;
+   v_table  TEXT;
+   v_plan postgis_to_osm.plan;
+   v_values_list TEXT;
+   v_filters TEXT[];
+   v_row_version TEXT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Split schema and table
+   IF strpos(psql_table, '.') > 0 THEN
+       v_schema := split_part(psql_table, '.', 1);
+       v_table  := split_part(psql_table, '.', 2);
+   ELSE
+       v_schema := 'public';
+       v_table  := psql_table;
+   END IF;
+
+   v_plan := postgis_to_osm.table_plan(psql_table);
+
+   -- Build the VALUES part from the planned fields
+   SELECT string_agg(format('(%L, %I::TEXT)', f, f), ', ' ORDER BY n)
+   INTO v_values_list
+   FROM unnest(v_plan.field_columns) WITH ORDINALITY AS u(f, n);
+
+   v_filters := array_remove(ARRAY[v_plan.source_filter, source_filter], NULL);
+
+   -- Only tables (plain, partitioned, materialized views) have xmin
+   SELECT CASE WHEN c.relkind IN ('r', 'p', 'm') THEN 'xmin::TEXT' ELSE 'NULL::TEXT' END
+   INTO v_row_version
+   FROM pg_class AS c
+   WHERE c.oid = format('%I.%I', v_schema, v_table)::regclass;
+
+   -- Construct the source query
+   RETURN format(
+      'SELECT %s AS geom,
+          %s AS fields,
+          %s::TEXT AS row_key,
+          %s AS row_version
+      FROM %I.%I%s',
+    v_plan.geom_expression,
+    CASE
+       WHEN v_values_list IS NULL THEN 'ARRAY[]::TEXT[][]'
+       ELSE format(
+          'ARRAY(
+              SELECT ARRAY[field, value]
+              FROM (
+                  VALUES
+                  %s
+              ) AS fields(field, value)
+              WHERE value IS NOT NULL AND value <> ''''
+          )',
+          v_values_list
+       )
+    END,
+    CASE WHEN v_plan.key_column IS NULL THEN 'ctid' ELSE quote_ident(v_plan.key_column) END,
+    v_row_version,
+    v_schema, v_table,
+    CASE
+       WHEN cardinality(v_filters) = 0 THEN ''
+       ELSE ' WHERE ' || array_to_string(v_filters, ' AND ')
+    END
+   );
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.table_source_query('public._recorte_faces_de_logradouros');
@@ -0,0 +1,112 @@
+-- Split a table into `tiles` spatial tiles over the extent of its planned rows (geometry
+-- column and filter of plan_table): ceil(sqrt(tiles)) rows of equal height, each split into
+-- equal cells, the first rows taking one cell more when the tiles do not fill a square
+-- Returns one WHERE condition (see table_source_query) per tile. Every row belongs to exactly
+-- one tile, chosen by the center of its bounding box; rows without a bounding box (NULL or
+-- empty geometries) go to the first tile. Each condition starts with a bounding box test
+-- against the cell of the tile (a row whose center is in the cell overlaps it), so that every
+-- tile reads its rows through the spatial index of the table instead of scanning all of it
+DROP FUNCTION IF EXISTS postgis_to_osm.table_tiles;
+CREATE OR REPLACE FUNCTION postgis_to_osm.table_tiles(
+   psql_table TEXT,
+   tiles INT
+)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+   v_schema TEXT;
+   v_table  TEXT;
+   v_plan postgis_to_osm.plan;
+   v_geom TEXT;
+   v_xmin DOUBLE PRECISION;
+   v_ymin DOUBLE PRECISION;
+   v_xmax DOUBLE PRECISION;
+   v_ymax DOUBLE PRECISION;
+   v_srid INT;
+   v_margin_x DOUBLE PRECISION;
+   v_margin_y DOUBLE PRECISION;
+   v_envelope TEXT;
+   v_columns INT;
+   v_rows INT;
+   v_column_expression TEXT;
+   v_row_expression TEXT := '0';
+   v_filter TEXT;
+BEGIN
+   PERFORM postgis_to_osm.staging_schema();
+   -- Split schema and table
+   IF strpos(psql_table, '.') > 0 THEN
+       v_schema := split_part(psql_table, '.', 1);
+       v_table  := split_part(psql_table, '.', 2);
+   ELSE
+       v_schema := 'public';
+       v_table  := psql_table;
+   END IF;
+
+   v_plan := postgis_to_osm.table_plan(psql_table);
+   v_geom := quote_ident(v_plan.geom_column);
+
+   EXECUTE format(
+      'SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e), srid FROM ('
+      '   SELECT ST_Extent(%1$s) AS e, max(ST_SRID(%1$s)) AS srid FROM %2$I.%3$I WHERE %4$s'
+      ') AS extent',
+      v_geom, v_schema, v_table, COALESCE(v_plan.source_filter, 'TRUE')
+   ) INTO v_xmin, v_ymin, v_xmax, v_ymax, v_srid;
+
+   -- Empty table (or a single tile asked): one tile with every row
+   IF v_xmin IS NULL OR tiles <= 1 THEN
+      RETURN NEXT 'TRUE';
+      RETURN;
+   END IF;
+
+   v_rows := ceil(sqrt(tiles));
+
+   -- Row of the center of the bounding box (the last row includes the max edge)
+   IF v_ymax > v_ymin THEN
+      v_row_expression := format(
+         'LEAST(floor(((ST_YMin(%1$s) + ST_YMax(%1$s)) / 2 - %2$s) * %3$s / %4$s)::INT, %5$s)',
+         v_geom, v_ymin, v_rows, v_ymax - v_ymin, v_rows - 1
+      );
+   END IF;
+
+   -- Cells are widened by a hundredth of their size (at least 1e-6, for flat extents), so
+   -- that a center rounded onto the border of a cell still passes the bounding box test of
+   -- its tile. The first tile also takes the rows without bounding box, which the index
+   -- does not hold: it is the only one that scans the table
+   v_margin_y := GREATEST((v_ymax - v_ymin) / v_rows / 100, 1e-6);
+
+   FOR r IN 0 .. v_rows - 1 LOOP
+      -- Cells of the row: the tiles shared among the rows, the remainder to the first ones
+      v_columns := tiles / v_rows + CASE WHEN r < tiles % v_rows THEN 1 ELSE 0 END;
+      v_margin_x := GREATEST((v_xmax - v_xmin) / v_columns / 100, 1e-6);
+      -- Column of the center of the bounding box in the row (the last one includes the max edge)
+      v_column_expression := '0';
+      IF v_xmax > v_xmin THEN
+         v_column_expression := format(
+            'LEAST(floor(((ST_XMin(%1$s) + ST_XMax(%1$s)) / 2 - %2$s) * %3$s / %4$s)::INT, %5$s)',
+            v_geom, v_xmin, v_columns, v_xmax - v_xmin, v_columns - 1
+         );
+      END IF;
+      FOR c IN 0 .. v_columns - 1 LOOP
+         v_envelope := format(
+            'ST_MakeEnvelope(%s, %s, %s, %s, %s)',
+            v_xmin + (v_xmax - v_xmin) * c / v_columns - v_margin_x,
+            v_ymin + (v_ymax - v_ymin) * r / v_rows - v_margin_y,
+            v_xmin + (v_xmax - v_xmin) * (c + 1) / v_columns + v_margin_x,
+            v_ymin + (v_ymax - v_ymin) * (r + 1) / v_rows + v_margin_y,
+            v_srid
+         );
+         v_filter := format(
+            '%s && %s AND %s = %s AND %s = %s', v_geom, v_envelope, v_row_expression, r, v_column_expression, c
+         );
+         IF r = 0 AND c = 0 THEN
+            v_filter := format('((%s) OR Box2D(%s) IS NULL)', v_filter, v_geom);
+         END IF;
+         RETURN NEXT v_filter;
+      END LOOP;
+   END LOOP;
+END;
+$$;
+
+
+-- Test zone
+--SELECT postgis_to_osm.table_tiles('public._recorte_faces_de_logradouros', 4);
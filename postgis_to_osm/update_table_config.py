@@ -0,0 +1,138 @@
+import configparser
+import psycopg2
+from psycopg2 import sql
+import sys
+import os
+
+from . import run_context
+
+# Staging schema of the run (see build_environment.py)
+STAGING_SCHEMA = 'postgis_to_osm'
+
+def load_config(filename='my_preferences.config'):
+    # my_preferences.config of the current folder (the one the databases/ output folder
+    # goes to, see build_osm_file.prepare_output_folder), else the one of the checkout the
+    # package is in (the folder above it)
+    config_path = filename
+    if not os.path.isfile(config_path):
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        config_path = os.path.join(package_dir, '..', filename)
+
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config
+
+def get_osm_file_config(config):
+    # Defaults for every setting missing (or the whole section, see osm_elements.py)
+    osm_config = config['osm_file_config'] if 'osm_file_config' in config else {}
+    return {
+        'version': osm_config.get('version', '0.6'),
+        'download': osm_config.get('download', 'true'),
+        'upload': osm_config.get('upload', 'true'),
+        'locked': osm_config.get('locked', 'false'),
+        'generator': osm_config.get('generator', 'postgis_to_osm'),
+        'simplify_geometry_type': osm_config.get('simplify_geometry_type', 'no'),
+        'conversion_engine': osm_config.get('conversion_engine', 'row'),
+        'chunk_size': osm_config.get('chunk_size', '10000'),
+        'tiles': osm_config.get('tiles', '1'),
+        'incremental': osm_config.get('incremental', 'no'),
+        'itersize': osm_config.get('itersize', '10000'),
+        'render_mode': osm_config.get('render_mode', 'python'),
+        'workers': osm_config.get('workers', '1'),
+        'output_format': osm_config.get('output_format', 'xml'),
+        'compression': osm_config.get('compression', 'none'),
+        'compression_threads': osm_config.get('compression_threads', '1'),
+        'keep_environment': osm_config.get('keep_environment', 'no'),
+        'verbosity': osm_config.get('verbosity', '1'),
+        'metrics_report': osm_config.get('metrics_report', 'no'),
+        'function_stats': osm_config.get('function_stats', 'no'),
+        'var_geom': osm_config.get('var_geom', 'geom'),
+        'var_fields': osm_config.get('var_fields', '-'),
+        'source_filter': osm_config.get('source_filter', ''),
+        'bbox': osm_config.get('bbox', ''),
+        'split_output': osm_config.get('split_output', 'no'),
+        'split_size': osm_config.get('split_size', '0')
+    }
+
+def get_batch_config(config):
+    # [batch] job: tables (comma separated, globs allowed) converted in one run
+    batch_config = config['batch'] if 'batch' in config else {}
+    return {
+        'tables': [table.strip() for table in batch_config.get('tables', '').split(',') if table.strip()],
+        'output': batch_config.get('output', 'combined'),
+        'name': batch_config.get('name', 'batch')
+    }
+
+def get_cache_config(config):
+    # [cache]: output files reused while the source tables, the config and the code do not change
+    cache_config = config['cache'] if 'cache' in config else {}
+    return {
+        'enabled': cache_config.get('enabled', 'yes'),
+        'max_size_mb': cache_config.get('max_size_mb', '1024'),
+        'fingerprint': cache_config.get('fingerprint', 'stats')
+    }
+
+def connect_database(config, database_name):
+    return psycopg2.connect(
+        host=config['server_connection']['host'],
+        user=config['server_connection']['user'],
+        password=config['server_connection']['password'],
+        dbname=database_name
+    )
+
+def update_table(conn, osm_config_data, staging_schema=STAGING_SCHEMA):
+    config_table = sql.Identifier(staging_schema, 'config')
+    with conn.cursor() as cur:
+        # Delete all rows
+        cur.execute(sql.SQL("DELETE FROM {};").format(config_table))
+        
+        # Insert new values
+        cur.execute(sql.SQL("""
+            INSERT INTO {} (
+                version, download, upload, locked, generator, simplify_geometry_type,
+                conversion_engine, chunk_size, tiles, incremental, itersize, render_mode, workers, output_format,
+                compression, compression_threads, var_geom, var_fields, source_filter, bbox,
+                split_output, split_size
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+        """).format(config_table), (
+            osm_config_data['version'],
+            osm_config_data['download'],
+            osm_config_data['upload'],
+            osm_config_data['locked'],
+            osm_config_data['generator'],
+            osm_config_data['simplify_geometry_type'],
+            osm_config_data['conversion_engine'],
+            int(osm_config_data['chunk_size']),
+            int(osm_config_data['tiles']),
+            osm_config_data['incremental'],
+            int(osm_config_data['itersize']),
+            osm_config_data['render_mode'],
+            int(osm_config_data['workers']),
+            osm_config_data['output_format'],
+            osm_config_data['compression'],
+            int(osm_config_data['compression_threads']),
+            osm_config_data['var_geom'],
+            osm_config_data['var_fields'],
+            osm_config_data['source_filter'],
+            osm_config_data['bbox'],
+            osm_config_data['split_output'],
+            int(osm_config_data['split_size'] or 0)
+        ))
+    conn.commit()
+
+def run(context, staging_schema=STAGING_SCHEMA):
+    # Stage of a run (see run_context.py): [osm_file_config] as parsed once for the run
+    try:
+        update_table(context.connection(), context.osm_config, staging_schema)
+        #print("Table postgis_to_osm.config updated successfully!")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def main(databasename, staging_schema=STAGING_SCHEMA):
+    #print(f"Updating table config for {databasename}")
+    with run_context.RunContext(databasename) as context:
+        run(context, staging_schema)
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1])  # Run main if executed directly
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from postgis_to_osm import build_environment
+from postgis_to_osm import convert_table_to_osm_structure
+from postgis_to_osm import update_table_config
+
+# Database the SQL side of the tests runs on (a PostGIS database the function bundle can be
+# installed in, see build_environment.install_functions), on the [server_connection] of
+# my_preferences.config. Unset: only the Python side runs
+TEST_DATABASE = os.environ.get('POSTGIS_TO_OSM_TEST_DATABASE')
+
+# (existing tags, incoming tags, merged tags) of a way
+MERGE_WAY_TAGS_CASES = [
+    # First tags of a way: kept as they are
+    (None, [['name', 'A'], ['highway', 'primary']], [['name', 'A'], ['highway', 'primary']]),
+    ([['highway', 'residential'], ['name', 'Sample Street']],
+     [['name', 'Other Street'], ['surface', 'unpaved']],
+     [['highway', 'residential'], ['name', 'Sample Street;Other Street'], ['surface', 'unpaved']]),
+    # Contained, whatever the case
+    ([['name', 'Sample Street']], [['name', 'sample']], [['name', 'Sample Street']]),
+    # Incoming values are ILIKE patterns: _ is any one character, % any characters
+    ([['name', 'Main Street']], [['name', 'St_']], [['name', 'Main Street']]),
+    ([['name', 'Main St']], [['name', 'St_']], [['name', 'Main St;St_']]),
+    ([['ref', '1005']], [['ref', '100%']], [['ref', '1005']]),
+    ([['ref', 'a%b']], [['ref', 'a\\%']], [['ref', 'a%b']]),
+    ([['ref', 'ab']], [['ref', 'a\\%']], [['ref', 'ab;a\\%']]),
+    # Later duplicates of an existing key win
+    ([['name', 'A'], ['name', 'B']], [['ref', '1']], [['name', 'B'], ['ref', '1']]),
+    # A repeated incoming pair is added once
+    ([['ref', '1']], [['name', 'A'], ['name', 'A']], [['name', 'A'], ['ref', '1']]),
+    # Keys ordered by code point
+    ([['b', '1'], ['A', '2']], [['a', '3']], [['A', '2'], ['a', '3'], ['b', '1']]),
+    # NULL values: never contained nor containing, left out when appended
+    ([['name', None]], [['name', 'A']], [['name', None]]),
+    ([['name', 'A']], [['name', None]], [['name', 'A']]),
+    ([['name', 'A']], [['ref', None]], [['name', 'A'], ['ref', None]]),
+    ([], [['name', 'A']], [['name', 'A']]),
+    ([], [], None),
+]
+
+@pytest.mark.parametrize('existing_tags, new_tags, merged_tags', MERGE_WAY_TAGS_CASES)
+def test_merge_way_tags(existing_tags, new_tags, merged_tags):
+    assert convert_table_to_osm_structure.merge_way_tags(existing_tags, new_tags) == merged_tags
+
+@pytest.fixture(scope='module')
+def function_schema():
+    if not TEST_DATABASE:
+        pytest.skip("POSTGIS_TO_OSM_TEST_DATABASE is not set")
+    connection = update_table_config.connect_database(update_table_config.load_config(), TEST_DATABASE)
+    try:
+        yield connection, build_environment.install_functions(connection, build_environment.find_sql_files())
+    finally:
+        connection.close()
+
+@pytest.mark.parametrize('existing_tags, new_tags, merged_tags', MERGE_WAY_TAGS_CASES)
+def test_merge_way_tags_matches_sql(function_schema, existing_tags, new_tags, merged_tags):
+    # The client engine (convert_table_to_osm_structure.py) merges as the server does
+    connection, schema = function_schema
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT "{schema}".merge_way_tags(%s::TEXT[], %s::TEXT[]);', (existing_tags, new_tags)
+        )
+        sql_tags = cursor.fetchone()[0]
+    connection.commit()
+    assert convert_table_to_osm_structure.merge_way_tags(existing_tags, new_tags) == sql_tags